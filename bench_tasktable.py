@@ -0,0 +1,56 @@
+# Copyright Jean-Paul Calderone.  See LICENSE file for details.
+
+"""
+Compare the time it takes to create the tasks for a large crop plan as
+L{ITask} providers and as a L{TaskTable}.
+
+Run it like::
+
+    python bench_tasktable.py '2012 Crop Plan.csv' \\
+        '2012 Crop Plan - Varieties.csv' [copies]
+
+The seed varieties of the plan are repeated C{copies} times (100 by default)
+to make the plan larger.
+"""
+
+from sys import argv
+from time import time
+
+from twisted.python.filepath import FilePath
+
+from cropplan import load_crops, load_seeds, create_tasks
+from tasktable import create_task_table
+
+
+def measure(f, *args):
+    """
+    Call C{f} a few times and return the shortest time it took.
+    """
+    times = []
+    for i in range(3):
+        before = time()
+        f(*args)
+        times.append(time() - before)
+    return min(times)
+
+
+
+def main(crop, seed, copies='100'):
+    crops = load_crops(FilePath(crop))
+    seeds = load_seeds(FilePath(seed), crops) * int(copies)
+
+    tasks = create_tasks(crops, seeds)
+    print '%d seed varieties, %d tasks' % (len(seeds), len(tasks))
+
+    results = [
+        ('create_tasks', measure(create_tasks, crops, seeds)),
+        ('create_task_table', measure(create_task_table, seeds)),
+        ('create_task_table + tasks',
+         measure(lambda: create_task_table(seeds).tasks())),
+        ]
+    for (name, seconds) in results:
+        print '%-28s %8.3f seconds' % (name, seconds)
+
+
+if __name__ == '__main__':
+    main(*argv[1:])
@@ -20,33 +20,53 @@ TODO: Describe yield estimation
 TODO: Clean up extra text output on stdout
 """
 
+import sys
+
+from os.path import expanduser
 from uuid import uuid4
+from copy import copy, deepcopy
 from csv import reader, writer
-from sys import argv, stdout
-from math import ceil
-from itertools import groupby
+from sys import argv
+from StringIO import StringIO
+from math import ceil, exp
+from time import time
+from random import Random
+from itertools import chain, dropwhile, groupby, islice, takewhile
 from datetime import date, datetime, timedelta
-from collections import defaultdict
+from bisect import bisect_left, bisect_right, insort
+from heapq import heapify, heappop, heappush, merge
+from collections import defaultdict, deque
 
 from zope.interface import Attribute, Interface, implements
 
 from pytz import timezone
 
-from dateutil.rrule import SU
+from dateutil.rrule import SU, rrulestr
 
-from vobject import iCalendar
+from vobject import iCalendar, newFromBehavior
+from vobject.icalendar import TimezoneComponent
 
 import ephem
 
-from twisted.python.log import msg
+from twisted.python.log import err, msg
 from twisted.python.filepath import FilePath
-from twisted.python.usage import Options
+from twisted.python.usage import Options, UsageError
 from twisted.python.util import FancyEqMixin
 
 from epsilon.structlike import record
 
 YEAR = 2012
 
+# Somewhere around Bangor
+LATITUDE = 44.8011
+
+# Where the day lengths computed for each latitude and year are kept, so that
+# every process planning for the same place can share them.
+DAYLIGHT_CACHE = FilePath(expanduser('~/.cropplan-daylight'))
+
+# The vendor the prices in the seed variety CSV are from.
+SEED_VENDOR = "Johnny's"
+
 
 class UnsplittableTask(Exception):
     """
@@ -80,6 +100,14 @@ class ITask(Interface):
         """)
 
 
+    dependents = Attribute(
+        """
+        A sequence of the L{ITask} providers which cannot be done until this
+        task is done.  If this task is postponed, they are postponed by at least
+        as much.
+        """)
+
+
     def split(duration):
         """
         Divide this task up into two new tasks which are identical except for
@@ -108,6 +136,43 @@ def make_coercer(valid):
 
 
 
+def parse_years(string):
+    """
+    Parse a year (C{"2013"}) or an inclusive range of years (C{"2013-2032"})
+    into a C{list} of years.
+    """
+    first, sep, last = string.partition('-')
+    if not sep:
+        last = first
+    years = range(int(first), int(last) + 1)
+    if not years:
+        raise ValueError("%r does not include any years" % (string,))
+    return years
+
+
+
+def parse_rule(string):
+    """
+    Check that C{string} is a recurrence rule (eg C{"FREQ=WEEKLY"}).
+
+    @raise ValueError: If it is not.
+
+    @return: C{string}.
+    """
+    rrulestr(string, dtstart=datetime(YEAR, 1, 1))
+    return string
+
+
+
+def parse_day(string):
+    """
+    Parse a single I{month/day/year} date into a L{datetime.date}.
+    """
+    [day] = parse_dates(string)
+    return day
+
+
+
 def display_nothing(*args, **kwargs):
     pass
 
@@ -122,21 +187,27 @@ def schedule_plaintext(schedule):
 
 def schedule_ical(schedule):
     tz = timezone('US/Eastern')
+    # Write the calendar out one event at a time, so that a schedule which is
+    # produced lazily (see iter_schedule) is written as it goes.
     cal = iCalendar()
+    cal.add(TimezoneComponent(tz))
+    footer = 'END:VCALENDAR\r\n'
+    sys.stdout.write(cal.serialize()[:-len(footer)])
     for event in schedule:
         when = event.when.replace(tzinfo=tz)
-        vevent = cal.add('vevent')
+        vevent = newFromBehavior('vevent')
 
         # Generate our own event UID, because vobject's UIDs are not very unique.
         # XXX Would be nice to generate this with a stable value based on the
         # inputs, so that re-generating the output with only minor changes would
         # preserve the majority of the event UIDs.
-        vevent.add('uid').value = uuid4()
+        vevent.add('uid').value = str(uuid4())
         vevent.add('dtstart').value = when
         vevent.add('dtend').value = when + event.duration
 
         vevent.add('summary').value = event.summarize()
-    print cal.serialize()
+        sys.stdout.write(vevent.serialize())
+    print footer
 
 
 def _compute_weekly_schedule(schedule):
@@ -176,7 +247,7 @@ def _compute_weekly_schedule(schedule):
 def schedule_csv(schedule):
     weeks, eventsPerWeekPerVariety = _compute_weekly_schedule(schedule)
 
-    w = writer(stdout)
+    w = writer(sys.stdout)
     w.writerow(['variety'] + list('%02d/%02d' % (w.month, w.day) for w in weeks))
     for variety in sorted(eventsPerWeekPerVariety):
         w.writerow(
@@ -359,7 +430,8 @@ def summarize_seedlings_graph(schedule):
     import matplotlib.pyplot as plt
     import matplotlib.dates as mdates
 
-    dates = [date(YEAR, 1, 1)]
+    years = [event.when.year for event in schedule] or [YEAR]
+    dates = [date(min(years), 1, 1)]
     flats = [0]
     for event in schedule:
         if isinstance(event, (SeedFlats, Transplant)):
@@ -391,25 +463,154 @@ def summarize_seedlings_graph(schedule):
     plt.show()
 
 
+SCHEDULE_FORMATS = dict(
+    text=schedule_plaintext, ical=schedule_ical, table=schedule_table,
+    csv=schedule_csv)
+
+
+
+def render_schedule(display, schedule):
+    """
+    Capture the output of one of the schedule display functions (for example,
+    L{schedule_ical}) as a string instead of writing it to stdout.
+    """
+    output = StringIO()
+    stdout = sys.stdout
+    try:
+        sys.stdout = output
+        display(schedule)
+    finally:
+        sys.stdout = stdout
+    return output.getvalue()
+
+
+
 class CropPlanOptions(Options):
     optParameters = [
         ('schedule', None, None,
          'Summarize the labor schedule (text or ical).',
-         make_coercer(dict(text=schedule_plaintext, ical=schedule_ical,
-                           table=schedule_table, csv=schedule_csv))),
+         make_coercer(SCHEDULE_FORMATS)),
         ('crops', None, None,
          'Summarize the crops being planted (text or graph).',
          make_coercer(dict(text=summarize_crops, graph=summarize_crops_graph))),
         ('order', None, None,
          'Summarize the seed order (text or graph).',
          make_coercer(dict(text=summarize_order))),
+        ('offers', None, None,
+         'Summarize the cheapest seed order from the vendors offering seeds in '
+         'the given CSV file as well as ' + SEED_VENDOR + '.',
+         FilePath),
+        ('vendors', None, None,
+         'Take the minimum orders and shipping charges of the vendors for '
+         '--offers from the given CSV file.',
+         lambda path: load_vendors(FilePath(path))),
         ('flats', None, None, 'Summarize flats usage.',
          make_coercer(dict(text=summarize_seedlings, graph=summarize_seedlings_graph))),
+        ('forecast', None, None,
+         'Forecast the pounds of each crop harvested each week, with each '
+         'harvest spread over its harvest window (text, csv or json).',
+         make_coercer(dict(text='text', csv='csv', json='json'))),
+        ('calendar', None, None,
+         'Schedule using the hours available on each day given in the given '
+         'CSV file.',
+         FilePath),
+        ('crew', None, None,
+         'Schedule work amongst the workers described in the given CSV file '
+         'and print the schedule of each of them.',
+         lambda path: load_workers(FilePath(path))),
+        ('bed-feet', None, None,
+         'Move plantings later so that no more than the given number of bed '
+         'feet are in use at once.',
+         float),
+        ('bed-map', None, None,
+         'Assign plantings to the beds described in the given CSV file and '
+         'print what is in each bed over time.',
+         lambda path: load_beds(FilePath(path))),
+        ('greenhouse', None, None,
+         'Schedule flat seeding so that no more than the given number of '
+         'flats are in use at once.',
+         int),
+        ('optimize', None, None,
+         'Spend up to the given number of seconds improving the labor '
+         'schedule.',
+         float),
+        ('scenarios', None, None,
+         'Compare the variations on the plan described in the given CSV '
+         'file, instead of summarizing the plan itself.',
+         lambda path: load_scenarios(FilePath(path))),
+        ('simulate', None, None,
+         'Simulate the given number of seasons with varying maturity, '
+         'germination and yield, and summarize the harvest and labor in each '
+         'week, instead of summarizing the plan itself.',
+         int),
+        ('random-seed', None, 0,
+         'The seed for the random numbers used by --simulate.',
+         int),
+        ('maturity-spread', None, None,
+         'The standard deviation in days of the time plantings take to '
+         'mature, for --simulate.',
+         float),
+        ('failure-rate', None, None,
+         'The probability that a planting fails, for --simulate.',
+         float),
+        ('yield-spread', None, None,
+         'The standard deviation of the multiplier of the expected yield of '
+         'plantings, for --simulate.',
+         float),
+        ('max-generations', None, 12,
+         'The most fresh eating generations of a variety to consider for '
+         '--successions.',
+         int),
+        ('temperatures', None, None,
+         'Work out when crops with a base temperature mature from the daily '
+         'low and high temperatures in the given CSV file.',
+         lambda path: load_temperatures(FilePath(path))),
+        ('latitude', None, LATITUDE,
+         'The latitude of the farm, in degrees north, for working out day '
+         'lengths.',
+         float),
+        ('daylight-cache', None, DAYLIGHT_CACHE.path,
+         'The directory to keep day lengths in once they are worked out.'),
+        ('weeding', None, None,
+         'Weed each planting on the days matching the given recurrence rule '
+         '(for example, FREQ=WEEKLY) until it is ready to harvest.',
+         parse_rule),
+        ('picking', None, None,
+         'Harvest each planting on the days matching the given recurrence '
+         'rule (for example, FREQ=WEEKLY;BYDAY=MO,TH) over its harvest '
+         'duration, instead of all at once.',
+         parse_rule),
+        ('years', None, [YEAR],
+         'The year to plan, or a range of years (for example, 2013-2032).',
+         parse_years),
+        ('horizon', None, None,
+         'Schedule only the given number of weeks in detail, and estimate the '
+         'work in each week after that.',
+         int),
+        ('start', None, None,
+         'The first day to schedule with --horizon (month/day/year), instead '
+         'of today.  Tasks planned before it are taken to be done.',
+         parse_day),
         ]
 
     optFlags = [
         ('beds', None, 'Summarize beds usage.'),
         ('yields', None, 'Summarize yield.'),
+        ('stream', None,
+         'Write out the labor schedule a day at a time as it is made.'),
+        ('deadlines', None,
+         'Schedule the task with the earliest deadline first, and leave out '
+         'and report tasks which cannot be done in time.'),
+        ('coalesce', None,
+         'Merge the pieces of a split up task which are done one after another '
+         'on the same day, and leave out pieces with nothing to do.'),
+        ('successions', None,
+         'Search for the number of fresh eating generations of each variety, '
+         'and the weeks between them, which best give the pounds of each crop '
+         'wanted each week, instead of summarizing the plan itself.'),
+        ('simulate-schedules', None,
+         'Schedule the tasks of every season simulated by --simulate, rather '
+         'than only moving their harvests.'),
         ]
 
     def __init__(self):
@@ -427,6 +628,57 @@ class CropPlanOptions(Options):
 
 
 
+    def postOptions(self):
+        if self['calendar'] is not None:
+            self['calendar'] = load_calendar(
+                self['calendar'], years=self['years'])
+        if self['stream']:
+            if (self['optimize'] is not None or self['crew'] is not None or
+                self['beds'] or self['yields'] or
+                self['forecast'] is not None or
+                self['bed-feet'] is not None or
+                self['bed-map'] is not None or
+                self['flats'] is not display_nothing):
+                raise UsageError(
+                    "--stream cannot be combined with options which need "
+                    "the whole schedule.")
+        if self['simulate'] is not None and (
+            self['weeding'] is not None or self['picking'] is not None):
+            raise UsageError(
+                "--weeding and --picking cannot be combined with --simulate; "
+                "simulations only harvest each planting once.")
+        if self['vendors'] is not None and self['offers'] is None:
+            raise UsageError("--vendors is only used with --offers.")
+        if self['coalesce'] and self['crew'] is not None:
+            raise UsageError("--coalesce cannot be combined with --crew.")
+        if self['calendar'] is not None and self['crew'] is not None:
+            raise UsageError(
+                "--calendar cannot be combined with --crew; each worker's "
+                "hours come from the crew file.")
+        if self['greenhouse'] is not None and self['crew'] is not None:
+            raise UsageError("--greenhouse cannot be combined with --crew.")
+        if self['horizon'] is not None:
+            if (self['stream'] or self['deadlines'] or
+                self['optimize'] is not None or self['crew'] is not None):
+                raise UsageError(
+                    "--horizon cannot be combined with --stream, "
+                    "--deadlines, --optimize or --crew.")
+            if (self['beds'] or self['yields'] or
+                self['forecast'] is not None or
+                self['flats'] is not display_nothing):
+                raise UsageError(
+                    "--horizon only schedules the first weeks in detail, so "
+                    "it cannot be combined with --flats, --beds, --yields "
+                    "or --forecast.")
+        if self['deadlines']:
+            if (self['stream'] or self['optimize'] is not None or
+                self['crew'] is not None or self['greenhouse'] is not None):
+                raise UsageError(
+                    "--deadlines cannot be combined with --stream, "
+                    "--optimize, --crew or --greenhouse.")
+
+
+
 class MissingInformation(object):
     def __init__(self, message):
         self.message = message
@@ -438,7 +690,8 @@ class Crop(record(
         'fresh_eating_lbs fresh_eating_weeks '
         'storage_eating_lbs storage_eating_weeks '
         'variety harvest_weeks row_feet_per_oz_seed '
-        'yield_lbs_per_bed_foot rows_per_bed in_row_spacing _bed_feet'),
+        'yield_lbs_per_bed_foot rows_per_bed in_row_spacing _bed_feet '
+        'base_temperature', base_temperature=None),
            ComparableRecord):
     """
     @ivar name: The general name of this crop (eg carrots, beets)
@@ -471,6 +724,10 @@ class Crop(record(
         (feet).
 
     @ivar _bed_feet: Number of bed feet to plant in this crop.
+
+    @ivar base_temperature: The temperature below which this crop does not
+        grow, for counting growing degree days, or C{None} if maturity is not
+        worked out from temperatures for this crop.
     """
     def __init__(self, *args, **kwargs):
         super(Crop, self).__init__(*args, **kwargs)
@@ -576,6 +833,109 @@ class _PriceComputer(object):
 
 
 
+class Daylight(object):
+    """
+    The length of the day on each day of the year at one latitude.
+
+    The day lengths for a year are computed the first time any of them is
+    needed.  If there is a cache directory, they are also written there, named
+    for the latitude and the year, and are read from there instead of being
+    computed again by any process which later needs them.  Day length hardly
+    depends on longitude, so it is not part of the key.
+
+    @ivar latitude: The latitude, in degrees north.
+    @type latitude: C{float}
+
+    @ivar cache: A L{FilePath} for the cache directory, or C{None} to keep day
+        lengths in memory only.
+    """
+    def __init__(self, latitude=LATITUDE, cache=None):
+        self.latitude = latitude
+        self.cache = cache
+        self._years = {}
+
+
+    def __deepcopy__(self, memo):
+        # Day lengths are the same for every copy of a plan.
+        return self
+
+
+    def _compute(self, year):
+        """
+        Compute the number of seconds from sunrise to sunset on each day of
+        C{year}.
+        """
+        location = ephem.Observer()
+        location.lat = str(self.latitude)
+        # At longitude 0, midnight UTC is local midnight, so the next sunrise
+        # and sunset are both on the same day.
+        location.long = '0'
+        sun = ephem.Sun()
+
+        lengths = []
+        day = datetime(year, 1, 1)
+        while day.year == year:
+            location.date = day
+            try:
+                rising = location.next_rising(sun)
+                setting = location.next_setting(sun)
+            except ephem.AlwaysUpError:
+                lengths.append(24 * 60 * 60.0)
+            except ephem.NeverUpError:
+                lengths.append(0.0)
+            else:
+                lengths.append((setting - rising) * 24 * 60 * 60)
+            day += timedelta(days=1)
+        return lengths
+
+
+    def _lengths(self, year):
+        lengths = self._years.get(year)
+        if lengths is None:
+            path = None
+            if self.cache is not None:
+                path = self.cache.child(
+                    'daylight-%.4f-%d' % (self.latitude, year))
+            if path is not None and path.exists():
+                lengths = map(float, path.getContent().split())
+            else:
+                lengths = self._compute(year)
+                if path is not None:
+                    if not self.cache.exists():
+                        try:
+                            self.cache.makedirs()
+                        except OSError:
+                            # Perhaps another process just made it.
+                            if not self.cache.isdir():
+                                raise
+                    # setContent writes to a temporary file and renames it
+                    # into place, so other processes never read part of it.
+                    path.setContent(
+                        ''.join(['%r\n' % (length,) for length in lengths]))
+            self._years[year] = lengths
+        return lengths
+
+
+    def on(self, when):
+        """
+        Find the length of the day on C{when}.
+
+        @type when: L{datetime.date} or L{datetime.datetime}
+
+        @return: A L{datetime.timedelta}.
+        """
+        lengths = self._lengths(when.year)
+        return timedelta(seconds=lengths[when.timetuple().tm_yday - 1])
+
+
+
+# The day lengths at LATITUDE, shared by every plan which does not say
+# otherwise.
+DAYLIGHT = Daylight(LATITUDE, DAYLIGHT_CACHE)
+
+
+
+
 class Seed(record(
         'crop variety parts_per_crop product_id greenhouse_days beginning_of_season maturity_days '
         'end_of_season seeds_per_packet row_foot_per_packet seeds_per_oz '
@@ -584,8 +944,10 @@ class Seed(record(
         'dollars_per_half_oz dollars_per_oz dollars_per_eighth_lb dollars_per_quarter_lb '
         'dollars_per_half_lb dollars_per_lb row_foot_per_oz dollars_per_mini '
         'seeds_per_mini row_foot_per_mini harvest_duration notes intergenerational_weeks '
-        'fresh_generations storage_generations', intergenerational_weeks=None, fresh_generations=None,
-        storage_generations=None),
+        'fresh_generations storage_generations lifetime_years maturity_degree_days',
+        intergenerational_weeks=None, fresh_generations=None,
+        storage_generations=None, lifetime_years=None,
+        maturity_degree_days=None),
            ComparableRecord):
     """
     @ivar crop: The name of the crop - matches the name of one of the L{Crop}
@@ -704,48 +1066,47 @@ class Seed(record(
         variety which will be planted to produce storage produce, or C{None} if
         no succession planting will be done (ie, if a single planting will be
         done for the variety).
+
+    @ivar lifetime_years: For a perennial, the number of years a planting of
+        this variety keeps producing before it is replanted.  C{None} for an
+        annual, which is planted again every year.
+
+    @ivar maturity_degree_days: The number of growing degree days this
+        variety needs outdoors to mature, or C{None} to work it out from
+        C{maturity_days} (see L{days_outside_from}).
+
+    @ivar degree_days: The L{DegreeDays} to work out maturity with, or
+        C{None} to use C{maturity_days} as it is.  This is not part of the
+        seed data, so it is not compared.
+
+    @ivar daylight: The L{Daylight} for the place this variety is grown, to
+        work out maturity by hours of sunlight with.  Like C{degree_days},
+        this is not part of the seed data.
     """
     def __init__(self, *args, **kwargs):
         super(Seed, self).__init__(*args, **kwargs)
         self.crop.varieties.append(self)
-
-
-    def _get_ephemerals(self):
-        """
-        Construct objects for computing day length.
-        """
-        location = ephem.Observer()
-        # Somewhere around Bangor
-        location.lat = '44.8011'
-        # Longitude doesn't really matter
-        location.long = '-68.7783'
-
-        sun = ephem.Sun()
-        return location, sun
+        self.degree_days = None
+        self.daylight = DAYLIGHT
 
 
     @property
     def maturity_sunlight_duration(self):
         """
         Compute the number of sunlight hours between C{self.beginning_of_season}
-        and a date falling C{self.maturity_days} later.  Assume 45 degrees
-        latitude.
+        and a date falling C{self.maturity_days} later, at the latitude of
+        C{self.daylight}.
 
         @return: A L{datetime.timedelta} giving the amount of sunlight required
             for this crop to mature.
         """
-        location, sun = self._get_ephemerals()
-
         epoch = datetime(
             year=YEAR, month=1, day=1, hour=0, minute=0, second=0)
-        start = epoch + timedelta(days=self.beginning_of_season, hours=3)
+        start = epoch + timedelta(days=self.beginning_of_season)
 
         daylight_hours = timedelta()
         for i in range(self.maturity_days):
-            location.date = start + timedelta(days=i)
-            rising = location.next_rising(sun).datetime()
-            setting = location.next_setting(sun).datetime()
-            daylight_hours += setting - rising
+            daylight_hours += self.daylight.on(start + timedelta(days=i))
         return daylight_hours
 
 
@@ -755,22 +1116,44 @@ class Seed(record(
         received sunlight for C{self.maturity_sunlight_duration}, taking into
         account the varying day lengths at different times of the year.
         """
-        location, sun = self._get_ephemerals()
         sunlight_hours = self.maturity_sunlight_duration
 
-        when = when.replace(hour=3)
-
         days = 0
         zero = timedelta()
         while sunlight_hours > zero:
-            location.date = when + timedelta(days=days)
-            rising = location.next_rising(sun).datetime()
-            setting = location.next_setting(sun).datetime()
-            sunlight_hours -= setting - rising
+            sunlight_hours -= self.daylight.on(when + timedelta(days=days))
             days += 1
         return days
 
 
+    def days_outside_from(self, when):
+        """
+        Determine how many days a planting of this variety put outside at
+        C{when} takes to mature.
+
+        Without L{DegreeDays} or a base temperature for the crop, this is
+        simply C{maturity_days} less C{greenhouse_days}.  Otherwise it is the
+        number of days it takes to accumulate C{maturity_degree_days}, or if
+        that is not given, as many growing degree days as a planting put
+        outside at C{beginning_of_season} would in that many days.
+        """
+        days = self.maturity_days - self.greenhouse_days
+        base = self.crop.base_temperature
+        if self.degree_days is None or base is None:
+            return days
+
+        required = self.maturity_degree_days
+        if required is None:
+            start = datetime(when.year, 1, 1) + timedelta(
+                days=self.beginning_of_season)
+            required = self.degree_days.accumulated(base, start, days)
+        outside = self.degree_days.days_to(base, when, required)
+        if outside is None:
+            # Too cold to ever mature, as far as the temperatures go.
+            return days
+        return outside
+
+
     def _count_to_feet(self, count):
         if self.row_foot_per_thousand is None:
             return None
@@ -824,42 +1207,26 @@ class Seed(record(
         return actual
 
 
-    def order(self, bed_feet):
+    def order(self, bed_feet, minimum_overrun=0.3):
+        """
+        Choose the cheapest combination of the available packet sizes to plant
+        C{bed_feet}.
+
+        @param minimum_overrun: How much excess to build in to the order, as a
+            fraction of the seed needed.
+        """
         prices = self.prices
         if not prices:
             return MissingInformation("Prices for %s/%s unavailable" % (
                     self.crop.name, self.variety))
 
-        # Get rid of anything without a known length, we can't meaningfully
-        # select these for the order.
-        known_prices = [
-            p for p in prices if p.row_foot_increment is not None]
-
-        # How much excess to build in to the order
-        minimum_overrun = 0.3
-
         required_row_feet = self.crop.rows_per_bed * bed_feet
         required_row_feet *= (1 + minimum_overrun)
 
-        order_prices = {}
-        remaining_row_feet = required_row_feet
-
-        while remaining_row_feet > 0:
-
-            # Sort the prices by the price per row foot, accounting for the
-            # effective price increase incurred by wasted seed.
-            known_prices.sort(key=lambda p: p.dollars / min(p.row_foot_increment, remaining_row_feet))
-
-            # Select the cheapest thing according to that scheme
-            the_price = known_prices[0]
-
-            order_prices[the_price] = order_prices.get(the_price, 0) + 1
-            remaining_row_feet -= the_price.row_foot_increment
-
         return [
             Order(self, price.row_foot_increment * count, price)
             for (price, count)
-            in order_prices.items()]
+            in choose_packages(prices, required_row_feet).items()]
 
 
     @property
@@ -920,12 +1287,14 @@ def load_crops(path):
         "Yield Pounds Per Foot": "yield_lbs_per_bed_foot",
         "Rows / Bed": "rows_per_bed",
         "Spacing (inches)": "in_row_spacing",
-        "Bed Feet": "_bed_feet"}
+        "Bed Feet": "_bed_feet",
+        "Base Temperature": "base_temperature"}
 
     defaults = defaultdict(float)
     defaults['yield_lbs_per_bed_foot'] = None
     defaults['variety'] = ''
     defaults['_bed_feet'] = None
+    defaults['base_temperature'] = None
 
     parsers = defaultdict(lambda: float)
     parsers['name'] = str
@@ -950,17 +1319,24 @@ def parse_or_default(parser, string, default):
 
 
 
-def parse_date(string):
-    month, day, year = map(int, string.split('/'))
+def parse_date(string, year=YEAR):
+    """
+    Parse a I{month/day/year} date into a day of C{year}, counting from C{0}.
+    """
+    month, day, ignored = map(int, string.split('/'))
     # The year in the data is irrelevant garbage.  This data is cyclic with a
-    # periodicity of 1 year.  If you want to plan perennials you have some work
-    # cut out for you.
-    when = date(YEAR, month, day)
+    # periodicity of 1 year; perennials say how many of those years they last
+    # with lifetime_years.
+    when = date(year, month, day)
     return int(when.strftime('%j')) - 1
 
 
 
-def load_seeds(path, crops):
+def load_seeds(path, crops, year=YEAR):
+    """
+    Load L{Seed} instances from a CSV file, with the dates in it taken as days
+    of C{year}.
+    """
     known_columns = {
         "Type": "crop",
         "Variety": "variety",
@@ -994,7 +1370,9 @@ def load_seeds(path, crops):
         "Notes": "notes",
         "Fresh Eating Generations": "fresh_generations",
         "Storage Generations": "storage_generations",
-        "time between generations": "intergenerational_weeks"}
+        "time between generations": "intergenerational_weeks",
+        "Lifetime (years)": "lifetime_years",
+        "Maturity (GDD)": "maturity_degree_days"}
 
     defaults = defaultdict(lambda: None)
     defaults['parts_per_crop'] = 1
@@ -1005,9 +1383,9 @@ def load_seeds(path, crops):
     parsers["product_id"] = str
     parsers["parts_per_crop"] = int
     parsers["greenhouse_days"] = int
-    parsers["beginning_of_season"] = parse_date
+    parsers["beginning_of_season"] = lambda s: parse_date(s, year)
     parsers["maturity_days"] = int
-    parsers["end_of_season"] = parse_date
+    parsers["end_of_season"] = lambda s: parse_date(s, year)
     parsers["seeds_per_packet"] = int
     parsers["dollars_per_five_thousand"] = lambda s: float(s) * 5
     parsers["seeds_per_mini"] = int
@@ -1016,17 +1394,207 @@ def load_seeds(path, crops):
     parsers["intergenerational_weeks"] = int
     parsers["fresh_generations"] = int
     parsers["storage_generations"] = int
+    parsers["lifetime_years"] = int
 
     data = reader(path.open())
     return load_csv(data, known_columns, defaults, parsers, Seed)
 
 
 
-class Order(record('seed row_feet price'), ComparableRecord):
+WEEKDAYS = dict(
+    (name, number) for (number, name)
+    in enumerate(['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']))
+
+
+
+def parse_weekdays(string):
+    """
+    Parse a space separated list of weekday abbreviations (eg C{"Sat Sun"})
+    into a C{frozenset} of weekday numbers.
+    """
+    return frozenset([
+            make_coercer(WEEKDAYS)(name[:3].lower())
+            for name in string.split()])
+
+
+
+def parse_dates(string):
+    """
+    Parse a space separated list of I{month/day/year} dates into a
+    C{frozenset} of L{datetime.date} instances.
+    """
+    dates = []
+    for when in string.split():
+        month, day, year = map(int, when.split('/'))
+        if year < 100:
+            year += 2000
+        dates.append(date(year, month, day))
+    return frozenset(dates)
+
+
+
+def load_workers(path):
+    known_columns = {
+        "Name": "name",
+        "Hours": "hours",
+        "Days Off": "days_off",
+        "Unavailable": "unavailable"}
+
+    defaults = defaultdict(frozenset)
+    defaults['hours'] = timedelta()
+
+    parsers = {
+        "name": str,
+        "hours": lambda hours: timedelta(hours=float(hours)),
+        "days_off": parse_weekdays,
+        "unavailable": parse_dates}
+
+    data = reader(path.open())
+    return load_csv(data, known_columns, defaults, parsers, Worker)
+
+
+
+def parse_generations(string):
+    """
+    Parse the generations of seed varieties to plant in a scenario, given as
+    I{variety=fresh/storage} separated by semicolons (the storage generations
+    may be left out).
+
+    @return: A C{dict} mapping variety names to two-tuples of fresh and
+        storage generations.
+    """
+    generations = {}
+    for part in string.split(';'):
+        variety, counts = part.rsplit('=', 1)
+        fresh, sep, storage = counts.partition('/')
+        generations[variety.strip()] = (int(fresh), int(storage or 0))
+    return generations
+
+
+
+def load_scenarios(path):
+    known_columns = {
+        "Name": "name",
+        "Hours": "hours",
+        "Overrun": "overrun",
+        "Generations": "generations"}
+
+    defaults = defaultdict(lambda: None)
+    defaults['generations'] = {}
+
+    parsers = {
+        "name": str,
+        "hours": lambda hours: timedelta(hours=float(hours)),
+        "overrun": float,
+        "generations": parse_generations}
+
+    data = reader(path.open())
+    return load_csv(data, known_columns, defaults, parsers, Scenario)
+
+
+
+def load_vendors(path):
+    """
+    Load the terms of the seed vendors from a CSV file.
+
+    @return: A C{dict} mapping vendor names to L{Vendor} instances.
+    """
+    known_columns = {
+        "Vendor": "name",
+        "Minimum Order": "minimum",
+        "Shipping": "shipping",
+        "Free Shipping Over": "free_shipping"}
+
+    defaults = defaultdict(float)
+    defaults['free_shipping'] = None
+
+    parsers = defaultdict(lambda: float)
+    parsers['name'] = str
+
+    data = reader(path.open())
+    vendors = load_csv(data, known_columns, defaults, parsers, Vendor)
+    return dict([(vendor.name, vendor) for vendor in vendors])
+
+
+
+def load_offers(path, seeds):
+    """
+    Load the packet sizes of seed varieties sold by other vendors from a CSV
+    file, with a row for each vendor, variety and packet size.  The packet
+    size is given in row feet, or in seeds to be converted to row feet as the
+    seed variety CSV's prices are.
+
+    @param seeds: The L{Seed} instances the offers are for, found by their crop
+        name and variety.  Rows for any other variety are logged and skipped.
+
+    @return: A C{list} of L{Offer} instances.
+    """
+    known_columns = {
+        "Vendor": "vendor",
+        "Type": "crop",
+        "Variety": "variety",
+        "Product ID": "product_id",
+        "Packet": "kind",
+        "Price": "dollars",
+        "Row Feet": "row_feet",
+        "Seeds": "seeds"}
+
+    defaults = defaultdict(lambda: None)
+
+    parsers = defaultdict(lambda: float)
+    for name in ['vendor', 'crop', 'variety', 'product_id', 'kind']:
+        parsers[name] = str
+
+    varieties = dict(((seed.crop.name, seed.variety), seed) for seed in seeds)
+
+    def offer(vendor, crop, variety, product_id, kind, dollars, row_feet=None,
+              seeds=None):
+        seed = varieties.get((crop, variety))
+        if seed is None:
+            msg("No variety %s/%s for %s's offer %s" % (
+                    crop, variety, vendor, product_id))
+            return None
+        if row_feet is None and seeds is not None:
+            row_feet = seed._count_to_feet(seeds)
+        return Offer(vendor, seed, product_id, Price(kind, dollars, row_feet))
+
+    data = reader(path.open())
+    return [
+        loaded for loaded
+        in load_csv(data, known_columns, defaults, parsers, offer)
+        if loaded is not None]
+
+
+
+def load_beds(path):
+    known_columns = {
+        "Name": "name",
+        "Length": "length"}
+
+    defaults = {}
+
+    parsers = {
+        "name": str,
+        "length": float}
+
+    data = reader(path.open())
+    return load_csv(data, known_columns, defaults, parsers, Bed)
+
+
+
+class Order(record('seed row_feet price vendor product_id',
+                   vendor=None, product_id=None),
+            ComparableRecord):
     """
     @ivar row_feet: The number of row feet of planting this order is intended to
         satisfy.  Note that the order may be for more seeds than are needed to
         plant this area.
+
+    @ivar vendor: The name of the vendor to buy from, or C{None} for the one
+        the prices of C{seed} are from.
+
+    @ivar product_id: The vendor's product ID, or C{None} for the
+        C{product_id} of C{seed}.
     """
     @property
     def count(self):
@@ -1047,13 +1615,87 @@ class Order(record('seed row_feet price'), ComparableRecord):
 
 
 
-def make_order(crops, seeds):
+def choose_packages(prices, row_feet):
+    """
+    Choose a combination of the packet sizes in C{prices} to plant
+    C{row_feet}, by repeatedly buying whichever is cheapest per row foot of
+    what is still needed.
+
+    @param prices: A C{list} of L{Price} instances.  Those without a known
+        C{row_foot_increment} are ignored.
+
+    @return: A C{dict} mapping L{Price} instances to the number of each to buy.
+    """
+    # Get rid of anything without a known length, we can't meaningfully
+    # select these for the order.
+    known_prices = [
+        p for p in prices if p.row_foot_increment is not None]
+
+    order_prices = {}
+    remaining_row_feet = row_feet
+
+    while remaining_row_feet > 0:
+
+        # Sort the prices by the price per row foot, accounting for the
+        # effective price increase incurred by wasted seed.
+        known_prices.sort(key=lambda p: p.dollars / min(p.row_foot_increment, remaining_row_feet))
+
+        # Select the cheapest thing according to that scheme
+        the_price = known_prices[0]
+
+        order_prices[the_price] = order_prices.get(the_price, 0) + 1
+        remaining_row_feet -= the_price.row_foot_increment
+
+    return order_prices
+
+
+
+class Vendor(record('name minimum shipping free_shipping',
+                    minimum=0.0, shipping=0.0, free_shipping=None),
+             ComparableRecord):
+    """
+    The terms a seed vendor sells on.
+
+    @ivar minimum: The smallest order, in dollars, the vendor accepts.  A
+        smaller order has to be made up to it.
+
+    @ivar shipping: The shipping charge, in dollars, for an order.
+
+    @ivar free_shipping: The order total, in dollars, at which shipping is
+        free, or C{None} if it never is.
+    """
+    def fees(self, subtotal):
+        """
+        Find what an order of C{subtotal} dollars of seeds costs on top of the
+        seeds themselves.
+        """
+        if not subtotal:
+            return 0.0
+        fees = max(0.0, self.minimum - subtotal)
+        if self.free_shipping is None or subtotal < self.free_shipping:
+            fees += self.shipping
+        return fees
+
+
+
+class Offer(record('vendor seed product_id price'), ComparableRecord):
+    """
+    One packet size of a seed variety sold by a vendor.
+
+    @ivar vendor: The name of the vendor.
+    @ivar seed: The L{Seed} sold.
+    @ivar price: A L{Price} for the packet size.
+    """
+
+
+
+def make_order(crops, seeds, minimum_overrun=0.3):
     key = lambda seed: seed.crop
     for (crop, varieties) in groupby(sorted(seeds, key=key), key):
         for seed in varieties:
             bed_feet = seed.bed_feet
             if bed_feet > 0:
-                order = seed.order(bed_feet)
+                order = seed.order(bed_feet, minimum_overrun)
                 if isinstance(order, MissingInformation):
                     msg(order.message)
                 else:
@@ -1067,6 +1709,288 @@ def make_order(crops, seeds):
 
 
 
+def make_vendor_order(seeds, offers, vendors, minimum_overrun=0.3,
+                      limit=200000):
+    """
+    Choose the vendor to buy each seed variety from which makes the whole
+    order cheapest, counting the minimum order and shipping of each vendor.
+
+    The packet sizes to buy from each vendor are chosen as L{Seed.order}
+    does.  Each variety is bought from only one vendor, and the varieties
+    are offered by the vendor of the seed variety CSV (L{SEED_VENDOR}) as
+    well as by the vendors of C{offers}.
+
+    @param offers: A C{list} of L{Offer} instances.
+
+    @param vendors: A C{dict} mapping vendor names to L{Vendor} instances.
+        Vendors missing from it have no minimum or shipping charge.
+
+    @param limit: The most steps to take searching for the cheapest order;
+        see L{_choose_vendors}.
+
+    @return: A three-tuple of a C{list} of L{Order} instances, a C{dict}
+        mapping the name of each vendor bought from to its fees, and C{True}
+        if the order is known to be the cheapest or C{False} if the search
+        for it was cut short at C{limit}.
+    """
+    offered = defaultdict(lambda: defaultdict(list))
+    for offer in offers:
+        offered[id(offer.seed)][offer.vendor].append(offer)
+
+    choices = []
+    for seed in seeds:
+        bed_feet = seed.bed_feet
+        if bed_feet <= 0:
+            continue
+        row_feet = seed.crop.rows_per_bed * bed_feet * (1 + minimum_overrun)
+        options = {}
+        sources = dict(
+            (vendor, ([offer.price for offer in sold], sold[0].product_id))
+            for (vendor, sold) in offered[id(seed)].iteritems())
+        sources.setdefault(SEED_VENDOR, (seed.prices, seed.product_id))
+        for (vendor, (prices, product_id)) in sources.iteritems():
+            if not [p for p in prices if p.row_foot_increment is not None]:
+                continue
+            packages = choose_packages(prices, row_feet)
+            options[vendor] = (
+                sum(price.dollars * count
+                    for (price, count) in packages.iteritems()),
+                [Order(seed, price.row_foot_increment * count, price, vendor,
+                       product_id)
+                 for (price, count) in packages.iteritems()])
+        if options:
+            choices.append(options)
+        else:
+            msg("Prices for %s/%s unavailable" % (
+                    seed.crop.name, seed.variety))
+
+    chosen, complete = _choose_vendors(
+        [dict((vendor, cost) for (vendor, (cost, orders))
+              in options.iteritems())
+         for options in choices],
+        vendors, limit)
+
+    orders = []
+    subtotals = defaultdict(float)
+    for (options, vendor) in zip(choices, chosen):
+        cost, bought = options[vendor]
+        orders.extend(bought)
+        subtotals[vendor] += cost
+    fees = dict(
+        (vendor, vendors.get(vendor, Vendor(vendor)).fees(subtotal))
+        for (vendor, subtotal) in subtotals.iteritems())
+    return orders, fees, complete
+
+
+
+def _choose_vendors(costs, vendors, limit=200000):
+    """
+    Choose a vendor for each item so that the total of the items and the
+    vendors' fees is as low as possible, with a branch and bound search.
+
+    The items are tried in order of how much more it costs to buy them from
+    their second cheapest vendor instead of the cheapest, and each one from
+    its cheaper vendors first.  A branch is given up on once its lower
+    bound, the cost of the items chosen so far, the least the rest could
+    cost, and the fees each vendor must be charged however much more is
+    bought from it, is no better than the cheapest choice found so far.  The
+    search starts from the cheapest choice found by moving single items, or
+    every item from one vendor, to other vendors.
+
+    @param costs: A C{list} of C{dict}s, one for each item, mapping the name
+        of each vendor which sells it to the cost of buying it there.
+
+    @param vendors: A C{dict} mapping vendor names to L{Vendor} instances.
+
+    @param limit: The most branches to explore.  Past that, the cheapest
+        choice found so far is used, which may not be the cheapest there is.
+
+    @return: A two-tuple of a C{list} giving the vendor chosen for each item,
+        and C{True} if the search was finished (so the choice is the cheapest
+        there is) or C{False} if it was cut short at C{limit}.
+    """
+    names = sorted(set(name for item in costs for name in item))
+    terms = [vendors.get(name, Vendor(name)) for name in names]
+    index = dict((name, position) for (position, name) in enumerate(names))
+
+    def regret(item):
+        ordered = sorted(item.values())
+        if len(ordered) == 1:
+            return float('inf')
+        return ordered[1] - ordered[0]
+    order = sorted(range(len(costs)), key=lambda i: -regret(costs[i]))
+    # The vendors of each item, in the order searched, as (vendor index,
+    # cost), cheapest first.
+    options = [
+        sorted([(index[name], cost) for (name, cost) in costs[i].iteritems()],
+               key=lambda option: option[1])
+        for i in order]
+
+    # For the items from each position on: the least they could cost; the
+    # most each vendor could sell of them; how much of them each vendor could
+    # sell without any costing more than elsewhere; and the least more than
+    # elsewhere any of the rest costs from each vendor.
+    cheapest = [0.0]
+    most = [[0.0] * len(names)]
+    free = [[0.0] * len(names)]
+    premium = [[float('inf')] * len(names)]
+    for choices in reversed(options):
+        low = choices[0][1]
+        cheapest.insert(0, cheapest[0] + low)
+        most.insert(0, list(most[0]))
+        free.insert(0, list(free[0]))
+        premium.insert(0, list(premium[0]))
+        for (vendor, cost) in choices:
+            most[0][vendor] += cost
+            if cost <= low:
+                free[0][vendor] += cost
+            else:
+                premium[0][vendor] = min(premium[0][vendor], cost - low)
+
+    def total(chosen):
+        subtotals = [0.0] * len(names)
+        for (choices, vendor) in zip(options, chosen):
+            subtotals[vendor] += dict(choices)[vendor]
+        return sum(subtotals) + sum(
+            vendor.fees(subtotal)
+            for (vendor, subtotal) in zip(terms, subtotals))
+
+    best = [option[0][0] for option in options]
+    bestCost = _improve_vendors(options, best, total)
+
+    # The cost of and number of items chosen from each vendor so far.  Only
+    # vendors with items chosen from them charge fees.
+    subtotals = [0.0] * len(names)
+    counts = [0] * len(names)
+    chosen = []
+
+    def fees(position):
+        # The fees of each vendor in use are no less than if it sold all it
+        # could, and no less than if it sold only what costs no more there,
+        # unless it sells something which does, paying the premium for it.
+        bound = 0.0
+        for vendor in range(len(names)):
+            if counts[vendor]:
+                subtotal = subtotals[vendor]
+                bound += min(
+                    terms[vendor].fees(subtotal + free[position][vendor]),
+                    terms[vendor].fees(subtotal + most[position][vendor]) +
+                    premium[position][vendor])
+        return bound
+
+    # The next option to try at each position of the branch being searched,
+    # and the cost of the items chosen before each position.
+    tried = [0]
+    spent = [0.0]
+    steps = 0
+    while tried and steps < limit:
+        position = len(tried) - 1
+        if position == len(options) or tried[-1] == len(options[position]):
+            if position == len(options):
+                cost = spent[-1] + fees(position)
+                if cost < bestCost - 1e-9:
+                    bestCost = cost
+                    best = list(chosen)
+            # Back up to the previous position and undo the choice there.
+            tried.pop()
+            spent.pop()
+            if chosen:
+                vendor = chosen.pop()
+                counts[vendor] -= 1
+                subtotals[vendor] -= options[position - 1][tried[-1] - 1][1]
+            continue
+
+        vendor, cost = options[position][tried[-1]]
+        tried[-1] += 1
+        steps += 1
+        subtotals[vendor] += cost
+        counts[vendor] += 1
+        bound = spent[-1] + cost + cheapest[position + 1] + fees(position + 1)
+        if bound < bestCost - 1e-9:
+            chosen.append(vendor)
+            tried.append(0)
+            spent.append(spent[-1] + cost)
+        else:
+            counts[vendor] -= 1
+            subtotals[vendor] -= cost
+
+    result = [None] * len(costs)
+    for (i, vendor) in zip(order, best):
+        result[i] = names[vendor]
+    return result, not tried
+
+
+
+def _improve_vendors(options, chosen, total):
+    """
+    Improve a choice of vendors for L{_choose_vendors} by moving single items,
+    or every item bought from one vendor, to other vendors for as long as
+    that makes the total cheaper.
+
+    @param chosen: A C{list} of the vendor chosen for each item, changed in
+        place.
+
+    @return: The total cost of C{chosen}.
+    """
+    cost = total(chosen)
+    improved = True
+    while improved:
+        improved = False
+        for (position, choices) in enumerate(options):
+            current = chosen[position]
+            for (vendor, price) in choices:
+                if vendor == current:
+                    continue
+                chosen[position] = vendor
+                moved = total(chosen)
+                if moved < cost - 1e-9:
+                    cost, current, improved = moved, vendor, True
+                chosen[position] = current
+        for vendor in set(chosen):
+            moved = list(chosen)
+            for (position, choices) in enumerate(options):
+                if moved[position] == vendor:
+                    others = [
+                        other for (other, price) in choices
+                        if other != vendor]
+                    if not others:
+                        break
+                    moved[position] = others[0]
+            else:
+                moved_cost = total(moved)
+                if moved_cost < cost - 1e-9:
+                    chosen[:] = moved
+                    cost, improved = moved_cost, True
+    return cost
+
+
+
+def summarize_vendor_order(result):
+    """
+    Print the seeds to buy from each vendor and what each vendor's order
+    costs, as chosen by L{make_vendor_order}.
+    """
+    orders, fees, complete = result
+    total = 0.0
+    for vendor in sorted(fees):
+        print vendor
+        subtotal = 0.0
+        for item in orders:
+            if item.vendor == vendor:
+                subtotal += item.cost()
+                print '\t$%(cost)5.2f %(count)d %(kind)s of %(variety)s (%(crop)s - Product ID %(product_id)s)' % dict(
+                    cost=item.cost(), count=item.count, kind=item.price.kind,
+                    variety=item.seed.variety, crop=item.seed.crop.name,
+                    product_id=item.product_id)
+        print '\tSeeds $%(seeds)5.2f, fees $%(fees)5.2f' % dict(
+            seeds=subtotal, fees=fees[vendor])
+        total += subtotal + fees[vendor]
+    print 'Total\t$%(total)5.2f' % dict(total=total)
+    if not complete:
+        print 'The search was cut short; a cheaper order may be possible.'
+
+
+
 class _ByTheFootTask(object):
     @property
     def duration(self):
@@ -1083,14 +2007,18 @@ class _ByTheFootTask(object):
         ratio = duration.total_seconds() / self.duration.total_seconds()
         quantity = int(ratio * self.quantity)
         remaining = self.quantity - quantity
-        return (
-            self.__class__(self.when, self.seed, quantity),
-            self.__class__(self.when, self.seed, remaining),
-            )
+        # Copies keep anything else set on this task, such as its dependents.
+        first = copy(self)
+        first.quantity = quantity
+        second = copy(self)
+        second.quantity = remaining
+        return first, second
 
 
 
 class _DayTask(object):
+    dependents = ()
+
     @property
     def date(self):
         return self.when.date()
@@ -1102,11 +2030,11 @@ class _Pretty(object):
 
 
 # record needs better support for inheritance
-class FinishPlanning(record('seed'), _DayTask, _Pretty, ComparableRecord):
+class FinishPlanning(record('seed when', when=datetime(YEAR, 1, 1, 0, 0, 0)),
+                     _DayTask, _Pretty, ComparableRecord):
     implements(ITask)
 
-    # Get this to sort first
-    when = datetime(YEAR, 1, 1, 0, 0, 0)
+    # when defaults to the start of the year to get this to sort first
 
     # Amount of time an event of this type takes to complete
     duration = timedelta(minutes=30)
@@ -1204,190 +2132,2912 @@ class Harvest(record('when seed quantity'), _ByTheFootTask, _DayTask, _Pretty, C
 
     _time_cost = timedelta(minutes=2)
 
+    # For one of several pickings of a planting (see Recurrence), the number of
+    # days until the next picking, which is how long what it picks lasts.
+    pick_days = None
+
     def summarize(self):
         return 'Harvest %(variety)s (%(crop)s)' % dict(
             variety=self.seed.variety, crop=self.seed.crop.name)
 
 
 
-def create_tasks(crops, seeds):
-    # naive approach - schedule everything as early as possible
-    tasks = []
-    epoch = datetime(year=YEAR, month=1, day=1, hour=0, minute=0, second=0)
-    for seed in seeds:
-        if seed.beginning_of_season is None or seed.greenhouse_days is None:
-            tasks.append(FinishPlanning(seed))
-            continue
+def create_tasks(crops, seeds, years=None, recurrence=None):
+    """
+    Create all of the tasks for every seed variety.
 
-        # Avoid creating tasks for things that are not actually being planted
-        if seed.bed_feet == 0:
+    @param years: The C{list} of years to plan, or C{None} for just L{YEAR}.
+
+    @param recurrence: A L{Recurrence} giving the tasks to repeat for each
+        planting, or C{None} to weed never and harvest once.
+
+    @return: A C{list} of L{ITask} providers ordered by C{when}.
+    """
+    # naive approach - schedule everything as early as possible
+    return list(iter_tasks(seeds, years, recurrence))
+
+
+
+def iter_tasks(seeds, years=None, recurrence=None):
+    """
+    Lazily create all of the tasks for every seed variety.
+
+    Each seed variety's tasks are generated in chronological order and the
+    generators for all of the varieties are merged, so only a few tasks per
+    variety exist before they are consumed (for example, by L{Schedule}).
+    Recurring tasks (see L{Recurrence}) are only created as they are reached.
+
+    @param years: The C{list} of years to plan, or C{None} for just L{YEAR}.
+
+    @param recurrence: A L{Recurrence}, as accepted by L{create_tasks}.
+
+    @return: An iterator of L{ITask} providers ordered by C{when}.  Tasks with
+        the same C{when} come in the order of C{seeds}.
+    """
+    if years is None:
+        years = [YEAR]
+    streams = [
+        _seed_ordered(index, seed, years, recurrence)
+        for (index, seed) in enumerate(seeds)]
+    for key in merge(*streams):
+        yield key[-1]
+
+
+
+def _seed_ordered(index, seed, years, recurrence=None):
+    """
+    Generate the keyed tasks of one seed variety with C{index} put after the
+    C{when} of each key, so that ties between varieties are broken by their
+    order.
+    """
+    for key in _keyed_horizon_tasks(seed, years, recurrence):
+        yield (key[0], index) + key[1:]
+
+
+
+def _keyed_horizon_tasks(seed, years, recurrence=None):
+    """
+    Generate the tasks of a seed variety for every year in C{years} in
+    chronological order.
+
+    The tasks for each year are created from that year's own season, as they
+    are needed, so only a few of them exist at once however many years there
+    are.  A perennial (see L{Seed.lifetime_years}) is only planted again once
+    its planting has reached the end of its life; in the years between, only
+    its harvest is repeated.  Planting is only finished once, in the first
+    year.
+
+    @return: An iterator of C{tuple}s like those of L{_keyed_seed_tasks}, with
+        the position of the year in C{years} put after the C{when}.
+    """
+    years = sorted(years)
+    lifetime = seed.lifetime_years or 1
+    return merge(*[
+            _keyed_year_tasks(
+                seed, index, year, year - years[0], lifetime, recurrence)
+            for (index, year) in enumerate(years)])
+
+
+
+def _keyed_year_tasks(seed, index, year, age, lifetime, recurrence=None):
+    """
+    Generate the tasks of a seed variety for the year C{age} years into a
+    horizon, keyed for L{_keyed_horizon_tasks} with C{index}.
+    """
+    for key in _keyed_seed_tasks(seed, year, recurrence):
+        task = key[-1]
+        if age == 0 or not isinstance(task, FinishPlanning) and (
+            age % lifetime == 0 or isinstance(task, Harvest)):
+            yield (key[0], index) + key[1:]
+
+
+
+def _create_seed_tasks(seed):
+    """
+    Create all of the tasks for every generation of a single seed variety.
+
+    @return: A C{list} of L{ITask} providers ordered by C{when}.
+    """
+    return [key[-1] for key in _keyed_seed_tasks(seed)]
+
+
+
+def _keyed_seed_tasks(seed, year=YEAR, recurrence=None):
+    """
+    Generate the tasks for every generation of a single seed variety in
+    chronological order, for the season of C{year}, with recurring tasks as
+    given by C{recurrence} (see L{create_tasks}).
+
+    Generations overlap, so the generation of each is merged with the others.
+    The generations are ordered the same way as the tasks within one
+    generation, so without keys the tasks could not be told apart.
+
+    @return: An iterator of C{tuple}s of the C{when} of a task, the number of
+        its generation, its position within its generation, and the L{ITask}
+        provider itself.
+    """
+    epoch = datetime(year=year, month=1, day=1, hour=0, minute=0, second=0)
+    if seed.beginning_of_season is None or seed.greenhouse_days is None:
+        task = FinishPlanning(seed, epoch)
+        return iter([(task.when, 0, 0, task)])
+
+    # Avoid creating tasks for things that are not actually being planted
+    if seed.bed_feet == 0:
+        return iter([])
+
+    # Handle succession planting
+    if seed.fresh_generations is None and seed.storage_generations is None:
+        fresh_generations = 1
+        storage_generations = 0
+    else:
+        fresh_generations = seed.fresh_generations
+        if fresh_generations is None:
+            fresh_generations = 0
+        storage_generations = seed.storage_generations
+        if storage_generations is None:
+            storage_generations = 0
+
+    intergenerational_days = seed.intergenerational_days
+    if intergenerational_days is None:
+        if fresh_generations > 1 or storage_generations > 1:
+            raise ValueError(
+                "Cannot have multiple generations without defining "
+                "intergenerational time.")
+        # Doesn't matter, just make it an integer
+        intergenerational_days = 0
+
+    generations = fresh_generations + storage_generations
+    if generations == 0:
+        return iter([])
+    quantity = seed.bed_feet / generations
+
+    # Fresh produce generations are pegged to the beginning of the season,
+    # storage produce generations to the end of it.
+    storage_epoch = epoch + _storage_offset(seed)
+    succession_offset = (storage_generations - 1) * intergenerational_days
+    storage_epoch -= timedelta(days=succession_offset)
+    epochs = [
+        epoch + timedelta(days=generation * intergenerational_days)
+        for generation in range(fresh_generations)]
+    epochs.extend([
+        storage_epoch + timedelta(days=generation * intergenerational_days)
+        for generation in range(storage_generations)])
+
+    return merge(*[
+        _keyed_planting_tasks(
+                generation, generation_epoch, seed, quantity, recurrence)
+        for (generation, generation_epoch) in enumerate(epochs)])
+
+
+
+def _keyed_planting_tasks(generation, epoch, seed, quantity, recurrence=None):
+    """
+    Generate the tasks for planting one generation of a seed variety in
+    chronological order, keyed for L{_keyed_seed_tasks}.
+
+    With a L{Recurrence}, the planting is weeded and picked on the days its
+    rules give.  Only the first weeding and picking are created up front; each
+    of the others is created when the one before it is reached.
+    """
+    tasks = _create_planting_tasks(epoch, seed, quantity)
+    if recurrence is None:
+        recurring = []
+    else:
+        recurring = recurrence.expand(tasks)
+    keyed = [
+        (task.when, generation, index, task)
+        for (index, task) in enumerate(tasks)]
+    keyed.sort()
+    if not recurring:
+        return iter(keyed)
+
+    streams = [keyed]
+    for (position, chained) in enumerate(recurring, len(keyed)):
+        streams.append(
+            (task.when, generation, position, task) for task in chained)
+    return merge(*streams)
+
+
+
+def _storage_offset(seed):
+    """
+    Compute the number of days between the first possible day of the season a
+    seed variety's first spring succession can be put outside and the last
+    possible day of the season that seed variety's first storage success can be
+    put outside.
+    """
+    last_harvest = seed.end_of_season
+    last_planting = last_harvest - seed.maturity_days
+    storage_offset = last_planting - seed.beginning_of_season
+    return timedelta(days=storage_offset)
+
+
+
+def _create_planting_tasks(epoch, seed, quantity):
+    """
+    Create the tasks for planting one generation of a seed variety, linked
+    together by their C{dependents}.
+
+    @param epoch: The start of the year the generation is pegged to.
+
+    @param quantity: The number of bed feet the generation is planted in.
+
+    @return: A C{list} of L{ITask} providers.
+    """
+    outside = epoch + timedelta(days=seed.beginning_of_season)
+    harvest = Harvest(
+        outside + timedelta(days=seed.days_outside_from(outside)),
+        seed, quantity)
+
+    # Prep the bed before planting in it
+    preparation = BedPreparation(
+        epoch + timedelta(days=seed.beginning_of_season - 14),
+        seed, quantity)
+
+    if seed.greenhouse_days != 0:
+        # It starts in the greenhouse
+        greenhouse_day = timedelta(
+            days=seed.beginning_of_season - seed.greenhouse_days)
+        flats = SeedFlats(epoch + greenhouse_day, seed, quantity)
+        planting = Transplant(
+            epoch + timedelta(days=seed.beginning_of_season), seed, quantity)
+        flats.dependents = (planting,)
+        tasks = [preparation, flats, planting, harvest]
+    else:
+        planting = DirectSeed(
+            epoch + timedelta(days=seed.beginning_of_season), seed, quantity)
+        tasks = [preparation, planting, harvest]
+
+    preparation.dependents = (planting,)
+    planting.dependents = (harvest,)
+    return tasks
+
+
+
+def _recurring(cls, rule, start, end, seed, quantity):
+    """
+    Lazily create a task on each day matching a recurrence rule from C{start}
+    until (but not including) C{end}, each of which is a dependent of the one
+    before it.
+
+    Each task is only generated once the next one has been created and made
+    its dependent, so a delay to one is passed on to the rest as they are
+    scheduled.
+
+    @param cls: The L{ITask} provider to create, such as L{Weed}.
+
+    @param rule: The recurrence rule, as a C{str}.
+
+    @return: An iterator of C{cls} instances.
+    """
+    previous = None
+    days = rrulestr(rule, dtstart=start)
+    for when in takewhile(lambda when: when < end, days):
+        task = cls(when, seed, quantity)
+        if previous is not None:
+            previous.dependents = (task,)
+            yield previous
+        previous = task
+    if previous is not None:
+        yield previous
+
+
+
+def _picked(harvests, end):
+    """
+    Set the C{pick_days} of each of a series of pickings from L{_recurring} to
+    the number of days until the next one, or until C{end} for the last.
+    """
+    for harvest in harvests:
+        if harvest.dependents:
+            following = harvest.dependents[0].when
+        else:
+            following = end
+        harvest.pick_days = max(1, (following - harvest.when).days)
+        yield harvest
+
+
+
+class Recurrence(record('weeding picking', weeding=None, picking=None),
+                 ComparableRecord):
+    """
+    Tasks done over and over for every planting, following recurrence rules
+    (as accepted by L{dateutil.rrule.rrulestr}, eg C{"FREQ=WEEKLY"} or
+    C{"FREQ=WEEKLY;BYDAY=MO,TH"}).
+
+    @ivar weeding: The rule for weeding each planting, from the day after it
+        is direct seeded or transplanted until the day before it is ready to
+        harvest, or C{None} not to weed.
+
+    @ivar picking: The rule for harvesting each planting over its
+        C{harvest_duration}, starting on the day it is ready, or C{None} to
+        harvest it all at once.  Each picking harvests an equal share of its
+        bed feet, so the total yield is unchanged, and has a C{pick_days} of
+        the days until the next picking (or the end of the harvest window), so
+        that a forecast spreads its yield over only those days.
+    """
+    def expand(self, tasks):
+        """
+        Add the recurring tasks for one planting.
+
+        @param tasks: The C{list} of tasks L{_create_planting_tasks} made for
+            the planting.  Its L{Harvest} is removed if it is picked instead,
+            and the planting task is made to depend on the first of the
+            recurring tasks.
+
+        @return: A C{list} of iterators of the recurring tasks, each in
+            chronological order.
+        """
+        planting, harvest = tasks[-2], tasks[-1]
+        seed = harvest.seed
+        streams = []
+        dependents = []
+
+        if self.weeding is not None:
+            weeds = _recurring(
+                Weed, self.weeding, planting.when + timedelta(days=1),
+                harvest.when, seed, planting.quantity)
+            first = next(weeds, None)
+            if first is not None:
+                dependents.append(first)
+                streams.append(chain([first], weeds))
+
+        if self.picking is not None:
+            end = harvest.when + timedelta(
+                days=max(1, seed.harvest_duration or 0))
+            days = rrulestr(self.picking, dtstart=harvest.when)
+            picks = sum(1 for when in takewhile(lambda when: when < end, days))
+            if picks:
+                # Counting the picks is cheap, and the share of each depends
+                # on how many there are.
+                tasks.remove(harvest)
+                harvests = _picked(_recurring(
+                        Harvest, self.picking, harvest.when, end, seed,
+                        harvest.quantity / picks), end)
+                harvest = next(harvests)
+                streams.append(chain([harvest], harvests))
+        dependents.append(harvest)
+        planting.dependents = tuple(dependents)
+        return streams
+
+
+
+class CapacityCalendar(object):
+    """
+    The amount of time available for work on each day.
+
+    Some days (Sundays, holidays, rain days) may have less time or none at all.
+    An index of the next day with any time available is computed up front, so
+    finding it takes constant time no matter how long a stretch of days has
+    no time available.
+
+    @ivar default: The amount of time available on days without their own
+        entry.
+    @type default: L{datetime.timedelta}
+    """
+    def __init__(self, default, hours=None):
+        """
+        @param hours: A C{dict} mapping L{datetime.date} instances to
+            L{datetime.timedelta} instances giving the time available on those
+            days.
+        """
+        self.default = default
+        if not hours:
+            hours = {}
+        self._hours = hours
+
+        zero = timedelta()
+        if hours:
+            self._first = min(hours)
+            self._last = max(hours)
+            length = (self._last - self._first).days + 1
+        else:
+            self._first = self._last = None
+            length = 0
+
+        # For each day in the range covered by hours, the offset from _first
+        # of the next day with time available, or None if there is no such
+        # day in the range.
+        following = None
+        self._next = [None] * length
+        for offset in xrange(length - 1, -1, -1):
+            if self.hours(self._first + timedelta(days=offset)) > zero:
+                following = offset
+            self._next[offset] = following
+
+
+    def hours(self, day):
+        """
+        @return: A L{datetime.timedelta} giving the time available on C{day}.
+        """
+        return self._hours.get(day, self.default)
+
+
+    def next_available(self, day):
+        """
+        Find the first day, starting with C{day}, with any time available.
+
+        @raise ValueError: If there is no such day.
+        """
+        zero = timedelta()
+        if self._first is not None:
+            if day < self._first and self.default == zero:
+                day = self._first
+            if self._first <= day <= self._last:
+                offset = self._next[(day - self._first).days]
+                if offset is not None:
+                    return self._first + timedelta(days=offset)
+                day = self._last + timedelta(days=1)
+        if self.default > zero:
+            return day
+        raise ValueError("No time available on or after %s" % (day,))
+
+
+
+def parse_calendar_rule(string, hours, years=None):
+    """
+    Expand a recurrence rule (eg C{"RRULE:FREQ=WEEKLY;BYDAY=SU"}) into a
+    C{dict} mapping each day it includes to C{hours}.  A rule without an end
+    (C{UNTIL} or C{COUNT}) covers every one of C{years} (by default, just
+    L{YEAR}).
+    """
+    if years is None:
+        years = [YEAR]
+    start = datetime(min(years), 1, 1)
+    rule = rrulestr(string, dtstart=start)
+    if 'UNTIL' in string.upper() or 'COUNT' in string.upper():
+        days = list(rule)
+    else:
+        days = rule.between(start, datetime(max(years) + 1, 1, 1), inc=True)
+    return dict.fromkeys([when.date() for when in days], hours)
+
+
+
+def load_calendar(path, default=timedelta(hours=5), years=None):
+    """
+    Load a L{CapacityCalendar} from a CSV file with a header row and then rows
+    giving a date (I{month/day/year}) or a recurrence rule and the number of
+    hours available on the matching days.  Later rows take precedence over
+    earlier ones.  Recurrence rules are expanded over C{years}, as
+    L{parse_calendar_rule} does.
+    """
+    data = reader(path.open())
+    headers = data.next()
+    hours = {}
+    for row in data:
+        fields = dict(zip(headers, row))
+        available = timedelta(hours=float(fields["Hours"]))
+        when = fields["Date"].strip()
+        if when.upper().startswith(('RRULE', 'FREQ')):
+            hours.update(parse_calendar_rule(when, available, years))
+        else:
+            hours.update(dict.fromkeys(parse_dates(when), available))
+    return CapacityCalendar(default, hours)
+
+
+
+class DegreeDays(object):
+    """
+    The growing degree days crops accumulate each day of a typical year.
+
+    Degree days are counted by the simple average method: each day
+    contributes however much the average of its low and high temperatures is
+    above the base temperature of a crop.  The totals accumulated by the start
+    of every day are computed once for each base temperature and year (and
+    the year after it, for plantings maturing late in the year), so finding
+    how long a planting takes to accumulate some number of degree days is a
+    binary search.
+
+    @ivar temperatures: A C{dict} mapping two-tuples of a month and a day of
+        the month to two-tuples of the typical low and high temperature that
+        day.  Days missing from it are taken to be like the last day before
+        them which is there.
+    """
+    def __init__(self, temperatures):
+        self.temperatures = temperatures
+        self._cumulative = {}
+
+
+    def _accumulated(self, base, year):
+        """
+        Find the degree days accumulated by the start of each day of C{year}
+        and the year after it.
+
+        @return: A C{list} with an element for each of those days, and one
+            more for the end of the last of them.
+        """
+        key = (base, year)
+        cumulative = self._cumulative.get(key)
+        if cumulative is None:
+            cumulative = [0.0]
+            low, high = self.temperatures[max(self.temperatures)]
+            day = date(year, 1, 1)
+            end = date(year + 2, 1, 1)
+            while day < end:
+                low, high = self.temperatures.get(
+                    (day.month, day.day), (low, high))
+                cumulative.append(
+                    cumulative[-1] + max(0, (low + high) / 2.0 - base))
+                day += timedelta(days=1)
+            self._cumulative[key] = cumulative
+        return cumulative
+
+
+    def accumulated(self, base, when, days):
+        """
+        Find the degree days accumulated over C{days} days starting at
+        C{when}, above C{base}.
+        """
+        cumulative = self._accumulated(base, when.year)
+        start = (when.date() - date(when.year, 1, 1)).days
+        return cumulative[start + days] - cumulative[start]
+
+
+    def days_to(self, base, when, degree_days):
+        """
+        Find the number of days it takes from C{when} to accumulate
+        C{degree_days} growing degree days above C{base}.
+
+        @return: The number of days, or C{None} if the degree days are not
+            accumulated by the end of the year after the year of C{when}.
+        """
+        cumulative = self._accumulated(base, when.year)
+        start = (when.date() - date(when.year, 1, 1)).days
+        # Allow for the rounding of degree days worked out by accumulated.
+        target = cumulative[start] + degree_days - 1e-9
+        end = bisect_left(cumulative, target, start)
+        if end == len(cumulative):
+            return None
+        return end - start
+
+
+
+def load_temperatures(path):
+    """
+    Load L{DegreeDays} from a CSV file with a header row and then rows giving
+    a date (I{month/day/year}) and the low and high temperatures on it.  The
+    temperatures of the same day in different years are averaged, to make a
+    typical year.
+    """
+    data = reader(path.open())
+    headers = data.next()
+    days = defaultdict(list)
+    for row in data:
+        fields = dict(zip(headers, row))
+        month, day, year = map(int, fields["Date"].strip().split('/'))
+        days[month, day].append(
+            (float(fields["Low"]), float(fields["High"])))
+
+    temperatures = {}
+    for (key, observations) in days.iteritems():
+        lows, highs = zip(*observations)
+        temperatures[key] = (
+            sum(lows) / len(lows), sum(highs) / len(highs))
+    return DegreeDays(temperatures)
+
+
+
+class Occupancy(object):
+    """
+    The amount of some resource (for example, greenhouse flats) in use on each
+    day.
+
+    The amounts are kept in a segment tree over the days, so adding an amount
+    to a range of days and finding the largest amount in use on any day of a
+    range both take time logarithmic in the number of days covered.  Days are
+    given as ordinals (see L{datetime.date.toordinal}) and ranges are
+    half-open.
+
+    @ivar first: The ordinal of the first day the tree covers, or C{None} if it
+        covers none yet.  It grows to cover more days as needed.
+    """
+    def __init__(self):
+        self.first = None
+        self._size = 0
+        self._intervals = []
+
+
+    def _cover(self, start, end):
+        """
+        Rebuild the tree, if necessary, so that it covers the days from
+        C{start} up to C{end}.
+        """
+        if self.first is not None:
+            if self.first <= start and end <= self.first + self._size:
+                return
+            start = min(start, self.first)
+            end = max(end, self.first + self._size)
+        size = max(1, self._size)
+        while size < end - start:
+            size *= 2
+        self.first = start
+        self._size = size
+        # For each node, the amount added to all of the days it covers, and the
+        # largest amount in use on any of those days.
+        self._added = [0] * (2 * size)
+        self._peak = [0] * (2 * size)
+        for (start, end, amount) in self._intervals:
+            self._add(1, 0, size, start - self.first, end - self.first, amount)
+
+
+    def _add(self, node, low, high, start, end, amount):
+        if end <= low or high <= start:
+            return
+        if start <= low and high <= end:
+            self._added[node] += amount
+            self._peak[node] += amount
+            return
+        middle = (low + high) // 2
+        self._add(2 * node, low, middle, start, end, amount)
+        self._add(2 * node + 1, middle, high, start, end, amount)
+        self._peak[node] = self._added[node] + max(
+            self._peak[2 * node], self._peak[2 * node + 1])
+
+
+    def _max(self, node, low, high, start, end):
+        if end <= low or high <= start:
+            return None
+        if start <= low and high <= end:
+            return self._peak[node]
+        middle = (low + high) // 2
+        peaks = [peak for peak in [
+                self._max(2 * node, low, middle, start, end),
+                self._max(2 * node + 1, middle, high, start, end)]
+                 if peak is not None]
+        return self._added[node] + max(peaks)
+
+
+    def copy(self):
+        """
+        @return: A new L{Occupancy} with the same amounts in use as this one,
+            which may be changed without changing this one.
+        """
+        result = Occupancy()
+        result.first = self.first
+        result._size = self._size
+        result._intervals = list(self._intervals)
+        if self.first is not None:
+            result._added = list(self._added)
+            result._peak = list(self._peak)
+        return result
+
+
+    def add(self, start, end, amount):
+        """
+        Use C{amount} more on each day from C{start} up to C{end}.
+        """
+        if start >= end:
+            return
+        self._cover(start, end)
+        self._intervals.append((start, end, amount))
+        self._add(
+            1, 0, self._size, start - self.first, end - self.first, amount)
+
+
+    def peak(self, start, end):
+        """
+        @return: The largest amount in use on any day from C{start} up to
+            C{end}, or C{0} if the range is empty.
+        """
+        if self.first is None:
+            return 0
+        start = max(start, self.first) - self.first
+        end = min(end, self.first + self._size) - self.first
+        if start >= end:
+            return 0
+        return max(0, self._max(1, 0, self._size, start, end))
+
+
+    def _over(self, node, low, high, start, end, limit, above):
+        # Find the first day from start up to end with more than limit in use,
+        # given that above is added to every day under node by its ancestors.
+        if end <= low or high <= start or above + self._peak[node] <= limit:
+            return None
+        if high - low == 1:
+            return low
+        above += self._added[node]
+        middle = (low + high) // 2
+        over = self._over(2 * node, low, middle, start, end, limit, above)
+        if over is None:
+            over = self._over(
+                2 * node + 1, middle, high, start, end, limit, above)
+        return over
+
+
+    def first_fit(self, start, length, limit):
+        """
+        Find the earliest day on or after C{start} which begins C{length} days
+        with no more than C{limit} in use on any of them.
+
+        Each day in the way is found in logarithmic time, and the search then
+        carries on from the day after it.
+
+        @raise ValueError: If C{limit} is negative, so no day will do.
+        """
+        if limit < 0:
+            raise ValueError("No room for a negative amount")
+        while self.first is not None:
+            low = max(start, self.first) - self.first
+            high = min(start + length, self.first + self._size) - self.first
+            if low >= high:
+                break
+            over = self._over(1, 0, self._size, low, high, limit, 0)
+            if over is None:
+                break
+            start = self.first + over + 1
+        return start
+
+
+
+class _Greenhouse(object):
+    """
+    The flats in use in a greenhouse which holds a limited number of them.
+
+    Flats are in use from the day they are seeded until the day the seedlings
+    in them are transplanted (inclusive).  When flats are seeded, they are
+    reserved until the day the transplanting is planned for (which is put off
+    by as much as the seeding is).  Until the transplanting is actually done,
+    the reservation is extended to cover each new day as it is scheduled, so
+    seeding on that day never counts on room the transplanting has not yet
+    made.
+
+    @ivar capacity: The number of flats the greenhouse holds.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._occupancy = Occupancy()
+        # Map the id of a task which will empty some flats to the ordinal of
+        # the day after the last day they are reserved for and the number of
+        # them.
+        self._reserved = {}
+        # Map the id of a transplanting task which has not been finished to
+        # the number of bed feet of it which are left.
+        self._waiting = {}
+
+
+    def _reserve(self, key, start, end, flats, seeded):
+        self._occupancy.add(start, end, flats)
+        until, total = self._reserved.get(key, (end, 0))
+        self._reserved[key] = (max(until, end), total + seeded)
+
+
+    def _expect(self, key, quantity):
+        self._waiting.setdefault(key, quantity)
+
+
+    def _transplanted(self, key, quantity):
+        if key in self._waiting:
+            self._waiting[key] -= quantity
+            if self._waiting[key] <= 0:
+                del self._waiting[key]
+
+
+    def _extend(self, key, end):
+        if key in self._reserved:
+            until, total = self._reserved[key]
+            if until < end:
+                self._reserve(key, until, end, total, 0)
+
+
+    def copy(self):
+        """
+        @return: A new L{_Greenhouse} with the same flats in use as this one,
+            which may be changed without changing this one.
+        """
+        result = _Greenhouse(self.capacity)
+        result._occupancy = self._occupancy.copy()
+        result._reserved = dict(self._reserved)
+        result._waiting = dict(self._waiting)
+        return result
+
+
+    def _span(self, source, day):
+        """
+        Find out how long flats seeded for C{source} on C{day} will be needed.
+
+        @return: A three-tuple of the id of the task which will empty them,
+            the ordinal of the day after the day it is expected to be done on,
+            and the transplanting task (or C{None} if there is none).
+        """
+        for dependent in source.dependents:
+            if isinstance(dependent, Transplant):
+                key = id(dependent)
+                end = day + (dependent.date - source.date).days + 1
+                break
+        else:
+            dependent = None
+            key = id(source)
+            end = day + source.seed.greenhouse_days
+        if key in self._reserved:
+            end = max(end, self._reserved[key][0])
+        return key, end, dependent
+
+
+    def free(self, source, day):
+        """
+        @return: The number of flats which may be seeded for C{source} on the
+            day with ordinal C{day}.
+        """
+        key, end, transplant = self._span(source, day)
+        until, total = self._reserved.get(key, (end, 0))
+        if until >= end:
+            return self.capacity - self._occupancy.peak(day, end)
+        # The flats already seeded for the same transplanting will be in use
+        # until end as well.
+        return min(
+            self.capacity - self._occupancy.peak(day, until),
+            self.capacity - total - self._occupancy.peak(until, end))
+
+
+    def room(self, source, day):
+        """
+        @return: The number of flats which could be seeded for C{source} on
+            the day with ordinal C{day} if nothing else were in the greenhouse.
+            Flats already seeded for the same transplanting still take up
+            room.
+        """
+        key, end, transplant = self._span(source, day)
+        return self.capacity - self._reserved.get(key, (end, 0))[1]
+
+
+    def seed(self, source, day, flats):
+        """
+        Reserve C{flats} flats seeded for C{source} on the day with ordinal
+        C{day}.
+        """
+        key, end, transplant = self._span(source, day)
+        self._extend(key, end)
+        self._reserve(key, day, end, flats, flats)
+        if transplant is not None:
+            self._expect(key, transplant.quantity)
+
+
+    def transplant(self, source, day, quantity):
+        """
+        Record that C{quantity} bed feet of the transplanting task C{source}
+        are being done on the day with ordinal C{day}.
+        """
+        key = id(source)
+        self._extend(key, day + 1)
+        self._transplanted(key, quantity)
+
+
+    def wait(self, day):
+        """
+        Keep the flats for every transplanting which has not been done yet in
+        use through the day with ordinal C{day}.
+        """
+        for key in list(self._waiting):
+            self._extend(key, day + 1)
+
+
+
+class BedSpace(object):
+    """
+    The bed feet in use on each day of the season, out of a fixed total.
+
+    @ivar total: The number of bed feet there are to plant in.
+    """
+    def __init__(self, total):
+        self.total = total
+        self._occupancy = Occupancy()
+
+
+    def free(self, start, end):
+        """
+        @return: The number of bed feet free on every day from the
+            L{datetime.date} C{start} up to the L{datetime.date} C{end}.
+        """
+        return self.total - self._occupancy.peak(
+            start.toordinal(), end.toordinal())
+
+
+    def earliest(self, start, days, feet):
+        """
+        @return: The earliest L{datetime.date} on or after C{start} on which
+            C{feet} bed feet are free for C{days} days.
+
+        @raise ValueError: If there are not that many bed feet at all.
+        """
+        if feet > self.total:
+            raise ValueError(
+                "Cannot fit %s bed feet in %s" % (feet, self.total))
+        return date.fromordinal(self._occupancy.first_fit(
+                start.toordinal(), days, self.total - feet))
+
+
+    def reserve(self, start, end, feet):
+        """
+        Use C{feet} bed feet from the L{datetime.date} C{start} up to the
+        L{datetime.date} C{end}.
+        """
+        self._occupancy.add(start.toordinal(), end.toordinal(), feet)
+
+
+
+def _plantings(tasks):
+    """
+    Group tasks which are linked, directly or not, by their C{dependents}
+    (such as the tasks L{create_tasks} makes for one generation of a seed
+    variety).
+
+    @return: A C{list} of C{list}s of tasks, each in the order the tasks
+        appear in C{tasks}.
+    """
+    parents = {}
+    def root(key):
+        while parents[key] != key:
+            parents[key] = parents[parents[key]]
+            key = parents[key]
+        return key
+
+    for task in tasks:
+        parents[id(task)] = id(task)
+    for task in tasks:
+        for dependent in task.dependents:
+            if id(dependent) in parents:
+                parents[root(id(dependent))] = root(id(task))
+
+    groups = defaultdict(list)
+    order = []
+    for task in tasks:
+        key = root(id(task))
+        if key not in groups:
+            order.append(key)
+        groups[key].append(task)
+    return [groups[key] for key in order]
+
+
+
+def _shifted(tasks, shift):
+    """
+    Make copies of C{tasks} which are to be done C{shift} later, with their
+    C{dependents} among C{tasks} replaced by the corresponding copies.
+    """
+    copies = dict(
+        (id(task), _rescheduled(task, task.when + shift)) for task in tasks)
+    for task in tasks:
+        if task.dependents:
+            copies[id(task)].dependents = tuple(
+                copies.get(id(dependent), dependent)
+                for dependent in task.dependents)
+    return [copies[id(task)] for task in tasks]
+
+
+
+def _planting_span(group):
+    """
+    Find when the planting made up of the tasks in C{group} is in the ground:
+    from the day it is direct seeded or transplanted until the end of its
+    harvest (C{harvest_duration} days from its L{Harvest}).
+
+    @return: A four-tuple of the L{DirectSeed} or L{Transplant} task, the
+        L{datetime.date} it goes in the ground, the L{datetime.date} after it
+        comes out, and the number of bed feet it needs; or C{None} if C{group}
+        is not a planting.
+    """
+    planted = [
+        task for task in group if isinstance(task, (DirectSeed, Transplant))]
+    harvested = [task for task in group if isinstance(task, Harvest)]
+    if not planted or not harvested:
+        return None
+    planting = min(planted, key=lambda task: task.when)
+    # A planting which is picked several times is done after the last picking
+    # or at the end of its harvest, whichever is later.
+    first = min(harvested, key=lambda task: task.when)
+    end = max(
+        [first.date + timedelta(days=max(1, first.seed.harvest_duration or 0))]
+        + [task.date + timedelta(days=1) for task in harvested])
+    feet = max(task.quantity for task in planted)
+    return planting, planting.date, end, feet
+
+
+
+def fit_beds(tasks, total):
+    """
+    Move plantings later, where necessary, so that no more than C{total} bed
+    feet are ever in use.
+
+    A planting is in the ground from the day it is direct seeded or
+    transplanted until the end of its harvest (C{harvest_duration} days from
+    its L{Harvest}).  All of the tasks for a planting are moved together, to
+    the earliest day on or after the one it was planned for on which there is
+    room for it for the whole of that time.  Plantings are placed in the order
+    they are planned to go in the ground.
+
+    A planting is only moved as far as still lets it be harvested by the
+    C{end_of_season} of its seed variety.  If there is no room for it by then
+    (or it needs more than C{total} bed feet), it is left out.
+
+    @param tasks: A C{list} of L{ITask} providers, as returned by
+        L{create_tasks}.  They are not changed.
+
+    @return: A two-tuple of a new C{list} of L{ITask} providers, sorted by the
+        time they may be done, and a C{list} of the L{DirectSeed} and
+        L{Transplant} tasks for the plantings left out.
+    """
+    result = []
+    plantings = []
+    for group in _plantings(tasks):
+        span = _planting_span(group)
+        if span is None:
+            result.extend(group)
+        else:
+            plantings.append((span, group))
+    plantings.sort(key=lambda ((planting, start, end, feet), group): start)
+
+    beds = BedSpace(total)
+    unfit = []
+    for (planting, start, end, feet), group in plantings:
+        if feet > total:
+            unfit.append(planting)
+            continue
+        days = (end - start).days
+        earliest = beds.earliest(start, days, feet)
+        if earliest != start:
+            seed = planting.seed
+            harvested = min(
+                task.date for task in group if isinstance(task, Harvest))
+            if seed.end_of_season is not None:
+                last = date(harvested.year, 1, 1) + timedelta(
+                    days=seed.end_of_season)
+                if harvested + (earliest - start) > last:
+                    unfit.append(planting)
+                    continue
+        beds.reserve(earliest, earliest + timedelta(days=days), feet)
+        if earliest == start:
+            result.extend(group)
+        else:
+            result.extend(_shifted(group, earliest - start))
+
+    result.sort(key=lambda task: task.when)
+    return result, unfit
+
+
+
+class Bed(record('name length'), ComparableRecord):
+    """
+    A bed in the garden.
+
+    @ivar name: A name for the bed (as on the garden map).
+
+    @ivar length: The number of bed feet long the bed is.
+    """
+
+
+
+class Placement(record('planting bed offset feet start end'),
+                ComparableRecord):
+    """
+    A planting, or part of one, put in a stretch of a particular bed.
+
+    @ivar planting: The L{DirectSeed} or L{Transplant} task which puts the
+        planting in the ground.
+
+    @ivar bed: The L{Bed} it is put in.
+
+    @ivar offset: The number of feet from the start of the bed to the start of
+        the stretch it is put in.
+
+    @ivar feet: The length of the stretch.
+
+    @ivar start: The L{datetime.date} it goes in the ground.
+
+    @ivar end: The L{datetime.date} after it comes out of the ground.
+    """
+
+
+
+class _FreeStretches(object):
+    """
+    The stretches of the beds in a garden which are free at some time.
+
+    The free stretches of each bed are kept sorted by offset, so neighbours
+    can be merged when a stretch is freed, and the free stretches of all the
+    beds are kept sorted by length, so the shortest one which is long enough
+    for a planting can be found by bisection.  The day since which each
+    stretch has been free is kept too, so that a planting can be moved into a
+    stretch which was already free when it went in the ground.
+    """
+    def __init__(self, beds):
+        self._beds = beds
+        self._byBed = [[(0, bed.length)] for bed in beds]
+        self._byLength = sorted(
+            (bed.length, index, 0) for (index, bed) in enumerate(beds))
+        self._since = dict(
+            ((index, 0), date.min) for (index, bed) in enumerate(beds))
+
+
+    def _remove(self, index, offset, length):
+        stretches = self._byBed[index]
+        del stretches[bisect_right(stretches, (offset, length)) - 1]
+        byLength = self._byLength
+        del byLength[bisect_right(byLength, (length, index, offset)) - 1]
+        return self._since.pop((index, offset))
+
+
+    def _add(self, index, offset, length, since):
+        insort(self._byBed[index], (offset, length))
+        insort(self._byLength, (length, index, offset))
+        self._since[index, offset] = since
+
+
+    def whole(self, feet):
+        """
+        @return: C{True} if some single free stretch is at least C{feet} feet
+            long, otherwise C{False}.
+        """
+        byLength = self._byLength
+        return bool(byLength) and byLength[-1][0] >= feet
+
+
+    def take(self, feet):
+        """
+        Take C{feet} feet of free stretches: the shortest single stretch long
+        enough if there is one, or else the longest stretches there are, as
+        many as it takes.
+
+        @return: A C{list} of three-tuples of a L{Bed}, an offset, and a
+            length; or C{None} if there are not C{feet} free feet in all.
+        """
+        byLength = self._byLength
+        position = bisect_left(byLength, (feet,))
+        if position < len(byLength):
+            chosen = [byLength[position]]
+        else:
+            chosen = []
+            total = 0
+            for stretch in reversed(byLength):
+                chosen.append(stretch)
+                total += stretch[0]
+                if total >= feet:
+                    break
+            else:
+                return None
+        return self._take(chosen, feet)
+
+
+    def _take(self, chosen, feet):
+        taken = []
+        for (length, index, offset) in chosen:
+            since = self._remove(index, offset, length)
+            used = min(length, feet)
+            if length > used:
+                self._add(index, offset + used, length - used, since)
+            taken.append((self._beds[index], offset, used))
+            feet -= used
+        return taken
+
+
+    def neighbours(self, index, offset, length):
+        """
+        @return: A C{list} of the free stretches of the bed at C{index} just
+            before and just after the one C{length} feet long at C{offset},
+            as two-tuples of their offsets and lengths.
+        """
+        stretches = self._byBed[index]
+        position = bisect_left(stretches, (offset,))
+        result = []
+        if position > 0:
+            before, beforeLength = stretches[position - 1]
+            if before + beforeLength == offset:
+                result.append((before, beforeLength))
+        if position < len(stretches):
+            after, afterLength = stretches[position]
+            if after == offset + length:
+                result.append((after, afterLength))
+        return result
+
+
+    def take_free_since(self, feet, since, exclude):
+        """
+        Take C{feet} feet from the shortest single stretch at least that long
+        which has been free since the L{datetime.date} C{since} or earlier.
+
+        @param exclude: A collection of two-tuples of bed indexes and offsets
+            of stretches not to use.
+
+        @return: A three-tuple like those L{take} gives, or C{None} if there
+            is no such stretch.
+        """
+        byLength = self._byLength
+        for position in xrange(bisect_left(byLength, (feet,)), len(byLength)):
+            length, index, offset = byLength[position]
+            if ((index, offset) not in exclude and
+                self._since[index, offset] <= since):
+                return self._take([byLength[position]], feet)[0]
+        return None
+
+
+    def free(self, index, offset, length, since):
+        """
+        Return a stretch of the bed at C{index} in the list of beds to the free
+        stretches, joining it up with any free stretches next to it.
+
+        @param since: The L{datetime.date} from which it is free.
+        """
+        for (other, otherLength) in self.neighbours(index, offset, length):
+            since = max(since, self._remove(index, other, otherLength))
+            offset = min(offset, other)
+            length += otherLength
+        self._add(index, offset, length, since)
+
+
+
+def _make_room(free, growing, placements, indexes, feet):
+    """
+    Try to move one of the placements still in the ground to another free
+    stretch of bed, so that the stretch it leaves, joined up with the free
+    stretches either side of it, makes room for C{feet} feet in one piece.
+
+    A placement is only moved to a stretch which has been free since it went
+    in the ground, so it is as if it had been put there in the first place.
+
+    @param free: The L{_FreeStretches} of the beds.
+
+    @param growing: The heap of placements still in the ground, as three-tuples
+        of the day each ends, one more than its index in C{placements}, and
+        the L{Placement}.  The moved placement is replaced in it and in
+        C{placements}.
+
+    @param indexes: A C{dict} mapping the C{id} of each L{Bed} to its index.
+
+    @return: C{True} if a placement was moved, otherwise C{False}.
+    """
+    for position, (end, order, placement) in enumerate(growing):
+        index = indexes[id(placement.bed)]
+        around = free.neighbours(index, placement.offset, placement.feet)
+        if placement.feet + sum(length for (offset, length) in around) < feet:
+            continue
+        moved = free.take_free_since(
+            placement.feet, placement.start,
+            set((index, offset) for (offset, length) in around))
+        if moved is None:
+            continue
+        bed, offset, length = moved
+        replacement = Placement(
+            placement.planting, bed, offset, length, placement.start,
+            placement.end)
+        placements[order - 1] = replacement
+        growing[position] = (end, order, replacement)
+        free.free(index, placement.offset, placement.feet, placement.start)
+        return True
+    return False
+
+
+
+def assign_beds(tasks, beds):
+    """
+    Assign each planting to stretches of particular beds, re-using a stretch
+    once the planting in it is out of the ground.
+
+    Plantings are assigned in the order they go in the ground (see
+    L{_planting_span}), skipping any which need no bed feet.  Each goes in the
+    shortest free stretch long enough for all of it, to leave long stretches
+    free for long plantings.  If there is no such stretch, one planting
+    already in the ground may be moved to another stretch (one which was free
+    when it went in) to make one; failing that, it is split up between the
+    longest free stretches.
+
+    @param tasks: A C{list} of L{ITask} providers, as returned by
+        L{create_tasks} or L{fit_beds}.
+
+    @param beds: A C{list} of L{Bed} instances.
+
+    @return: A two-tuple of a C{list} of L{Placement} instances, ordered by
+        when they start, and a C{list} of the L{DirectSeed} and L{Transplant}
+        tasks for plantings there was no room for.
+    """
+    plantings = filter(None, map(_planting_span, _plantings(tasks)))
+    plantings.sort(key=lambda (planting, start, end, feet): start)
+
+    free = _FreeStretches(beds)
+    indexes = dict((id(bed), index) for (index, bed) in enumerate(beds))
+    # The placements which are still in the ground, by the day they end.
+    growing = []
+    placements = []
+    unplaced = []
+    for planting, start, end, feet in plantings:
+        if not feet:
+            continue
+        while growing and growing[0][0] <= start:
+            placement = heappop(growing)[2]
+            free.free(
+                indexes[id(placement.bed)], placement.offset, placement.feet,
+                placement.end)
+
+        if not free.whole(feet):
+            _make_room(free, growing, placements, indexes, feet)
+        taken = free.take(feet)
+        if taken is None:
+            unplaced.append(planting)
+            continue
+        for bed, offset, length in taken:
+            placement = Placement(planting, bed, offset, length, start, end)
+            placements.append(placement)
+            heappush(growing, (end, len(placements), placement))
+    return placements, unplaced
+
+
+
+def bed_timeline(placements):
+    """
+    Print the plantings in each bed over time.
+    """
+    byBed = defaultdict(list)
+    beds = []
+    for placement in placements:
+        if placement.bed not in byBed:
+            beds.append(placement.bed)
+        byBed[placement.bed].append(placement)
+    for bed in beds:
+        print '%s (%d feet)' % (bed.name, bed.length)
+        byBed[bed].sort(
+            key=lambda placement: (placement.start, placement.offset))
+        for placement in byBed[bed]:
+            print '\t%(start)s to %(end)s, feet %(first)d-%(last)d: %(variety)s (%(crop)s)' % dict(
+                start=placement.start, end=placement.end,
+                first=placement.offset,
+                last=placement.offset + placement.feet,
+                variety=placement.planting.seed.variety,
+                crop=placement.planting.seed.crop.name)
+
+
+
+class _Waiting(object):
+    """
+    The tasks a scheduler has reached which may not be done yet, and how much
+    the tasks it has not reached yet are put off.
+
+    A task may not be done before the time it was planned for, put off by as
+    much as any task it depends on (directly or not) was put off, nor before
+    every task it depends on which has been reached is done.
+
+    @ivar delays: A C{dict} mapping the C{id} of a task which is held back to
+        a four-tuple of the L{datetime.timedelta} it is put off by, the task
+        itself (so that its C{id} cannot be re-used by another task while it
+        is recorded), the number of tasks it depends on which have been
+        reached but are not done yet, and its position amongst all of the
+        tasks if its time has come but it is waiting for those, or else
+        C{None}.
+
+    @ivar postponed: A heap of the tasks which have been reached but put off
+        past the day being scheduled, as three-tuples of the time they may be
+        done, their position amongst all of the tasks, and the task.  They are
+        kept aside here so they do not hold up the tasks after them.
+    """
+    _nothing = (timedelta(), None, 0, None)
+
+    def __init__(self):
+        self.delays = {}
+        self.postponed = []
+
+
+    def copy(self):
+        """
+        @return: A new L{_Waiting} in the same state as this one, which may be
+            changed without changing this one.
+        """
+        result = _Waiting()
+        result.delays = dict(self.delays)
+        result.postponed = list(self.postponed)
+        return result
+
+
+    def delay(self, task):
+        """
+        @return: The L{datetime.timedelta} C{task} is put off by.
+        """
+        return self.delays.get(id(task), self._nothing)[0]
+
+
+    def reach(self, task, position):
+        """
+        Set aside C{task}, at C{position} amongst all of the tasks, until the
+        day it may be done is scheduled.  Until it is done, the tasks which
+        depend on it wait for it.
+        """
+        for dependent in task.dependents:
+            key = id(dependent)
+            delay, ignored, waiting, held = self.delays.get(key, self._nothing)
+            self.delays[key] = (delay, dependent, waiting + 1, held)
+        heappush(
+            self.postponed, (task.when + self.delay(task), position, task))
+
+
+    def ready(self, day):
+        """
+        Take the tasks which have been set aside until C{day} or earlier and
+        are not waiting for any others.
+
+        @return: A C{list} of three-tuples of the time each of them may be
+            done, its position and the task, in order.
+        """
+        ready = []
+        postponed = self.postponed
+        while postponed and postponed[0][0].date() <= day:
+            when, index, task = heappop(postponed)
+            key = id(task)
+            delay, ignored, waiting, held = self.delays.get(key, self._nothing)
+            # It may have been put off further since it was set aside.
+            when = task.when + delay
+            if when.date() > day:
+                heappush(postponed, (when, index, task))
+            elif waiting:
+                self.delays[key] = (delay, task, waiting, index)
+            else:
+                # Nothing will hold it back further once it may be done.
+                if key in self.delays:
+                    del self.delays[key]
+                ready.append((when, index, task))
+        return ready
+
+
+    def put_off(self, task, delay):
+        """
+        Put off every task which depends on C{task}, directly or not, by at
+        least C{delay}.
+        """
+        pending = [task]
+        while pending:
+            for dependent in pending.pop().dependents:
+                key = id(dependent)
+                current, ignored, waiting, held = self.delays.get(
+                    key, self._nothing)
+                if current < delay:
+                    self.delays[key] = (delay, dependent, waiting, held)
+                    pending.append(dependent)
+
+
+    def done(self, task, day):
+        """
+        Record that C{task} is done, on C{day}, so the tasks which depend on it
+        no longer wait for it.
+
+        @return: A C{list} like the one L{ready} returns, of the tasks which
+            were only waiting for C{task} and may be done on C{day}.  Those
+            which may only be done later are set aside until then.
+        """
+        ready = []
+        for dependent in task.dependents:
+            key = id(dependent)
+            if key not in self.delays:
+                continue
+            delay, ignored, waiting, held = self.delays[key]
+            waiting = max(0, waiting - 1)
+            if waiting or held is None:
+                if waiting or delay:
+                    self.delays[key] = (delay, dependent, waiting, held)
+                else:
+                    del self.delays[key]
+            else:
+                when = dependent.when + delay
+                if when.date() > day:
+                    self.delays[key] = (delay, dependent, 0, None)
+                    heappush(self.postponed, (when, held, dependent))
+                else:
+                    del self.delays[key]
+                    ready.append((when, held, dependent))
+        ready.sort()
+        return ready
+
+
+
+def _rescheduled(task, when):
+    """
+    Make a copy of C{task} which is to be done at C{when} instead.
+    """
+    result = copy(task)
+    result.when = when
+    return result
+
+
+
+def _coalesced(scheduled):
+    """
+    Merge consecutive fragments of the same task scheduled on the same day,
+    and drop fragments with nothing to do.
+
+    @param scheduled: An iterable of two-tuples of scheduled L{ITask}
+        providers and the tasks they were made from, in order.
+
+    @return: An iterator of two-tuples like those in C{scheduled}.  Each merged
+        fragment is done at the time of the first of them, with all of their
+        footage.
+    """
+    previous = None
+    for (event, source) in scheduled:
+        if getattr(event, 'quantity', None) == 0:
             continue
+        if previous is not None:
+            if previous[1] is source and previous[0].date == event.date:
+                merged = _rescheduled(previous[0], previous[0].when)
+                merged.quantity += event.quantity
+                previous = (merged, source)
+                continue
+            yield previous
+        previous = (event, source)
+    if previous is not None:
+        yield previous
+
+
+
+def coalesce_fragments(events, sources):
+    """
+    Tidy up a schedule by merging the fragments of split up tasks which are
+    done one after another on the same day, and dropping fragments with no
+    footage left in them (splitting rounds the footage of the first fragment
+    down).
+
+    @param events: The C{list} of scheduled L{ITask} providers; see
+        L{Schedule.events}.
+
+    @param sources: The tasks each of C{events} was made from; see
+        L{Schedule.sources}.
+
+    @return: A new C{list} of L{ITask} providers.
+    """
+    return [event for (event, source) in _coalesced(zip(events, sources))]
+
+
+
+class Schedule(object):
+    """
+    The result of scheduling a list of tasks so that no more than a certain
+    amount of work is done on any day.
+
+    Along with the scheduled tasks, the state of the scheduler at the start of
+    each day is kept so that after a change to the tasks, scheduling only needs
+    to be redone from the first day the change affects.
+
+    @ivar tasks: The C{list} of L{ITask} providers being scheduled, ordered by
+        the time at which they may first be done.  These are never modified.
+
+    @ivar maxManHours: The maximum number of hours of work to schedule per day
+    @type maxManHours: L{datetime.timedelta}
+
+    @ivar calendar: A L{CapacityCalendar} giving the hours of work available
+        on each day.  If none is supplied, every day has C{maxManHours}.
+
+    @ivar flats: The number of flats the greenhouse holds, or C{None} if there
+        is no limit.  Flat seeding is put off so that no more than this many
+        flats are ever seeded and waiting to be transplanted.
+
+    @ivar years: The C{list} of years C{tasks} were created for, or C{None}
+        for just L{YEAR}, as accepted by L{create_tasks}.
+
+    @ivar recurrence: The L{Recurrence} C{tasks} were created with, or
+        C{None}, as accepted by L{create_tasks}.
+
+    @ivar events: The C{list} of L{ITask} providers making up the schedule, in
+        the order they are to be done.  These are new objects, some of them
+        parts of split up tasks.
+
+    @ivar sources: A C{list} parallel to C{events} giving the task from
+        C{tasks} each event was made from.
+    """
+    # The maximum amount of time to waste at the end of a day (in other words,
+    # the smallest piece of a larger task to break off and schedule at the end
+    # of a day instead of moving the entire task to the next day).
+    endOfDayWaste = timedelta(minutes=30)
+
+    # The time of day at which work starts
+    startOfDay = timedelta(hours=8)
+
+    def __init__(self, tasks, maxManHours=timedelta(hours=5), calendar=None,
+                 flats=None, years=None, recurrence=None):
+        self.tasks = list(tasks)
+        self.maxManHours = maxManHours
+        if calendar is None:
+            calendar = CapacityCalendar(maxManHours)
+        self.calendar = calendar
+        self.flats = flats
+        self.years = years
+        self.recurrence = recurrence
+        self.events = []
+        self.sources = []
+
+        if flats is None:
+            self._greenhouse = None
+        else:
+            self._greenhouse = _Greenhouse(flats)
+
+        # The days which have been scheduled, in order, and the state of the
+        # scheduler at the start of each of them.
+        self._days = []
+        self._checkpoints = []
+        self._waiting = _Waiting()
+
+        if self.tasks:
+            self._run(
+                calendar.next_available(self.tasks[0].date), 0, deque())
+
+
+    def _run(self, day, position, available):
+        """
+        Schedule tasks starting with C{day} and continuing until everything is
+        scheduled, keeping the events and a checkpoint for each day.
+
+        The parameters are those of L{_schedule_days}, with C{position} giving
+        the index in C{self.tasks} of the first task which has not yet been
+        made available for scheduling.
+        """
+        days = self._schedule_days(
+            day, position, islice(self.tasks, position, None), available,
+            self._waiting, self._checkpoint)
+        for (day, events, sources) in days:
+            self.events.extend(events)
+            self.sources.extend(sources)
+
+
+    def _checkpoint(self, day, position, available, waiting):
+        """
+        Remember the state of the scheduler at the start of C{day}, so that
+        L{change} can start over from there without going over the days
+        before it again.
+
+        Copies of C{waiting} and of the greenhouse are kept.  These only hold
+        the tasks which are waiting and the flats in use, so they stay small
+        however many days have been scheduled.
+        """
+        # The items in available are shared with this checkpoint, so they must
+        # not be changed from here on.
+        greenhouse = self._greenhouse
+        self._days.append(day)
+        self._checkpoints.append(
+            (position, tuple(available), waiting.copy(), len(self.events),
+             greenhouse and greenhouse.copy()))
+
+
+    def _schedule_days(self, day, position, tasks, available, waiting,
+                       checkpoint):
+        """
+        Schedule tasks starting with C{day} and continuing until everything is
+        scheduled, one day at a time.
+
+        @param position: The number of tasks which have already been made
+            available for scheduling.  It is used to keep tasks with the same
+            time in order.
+
+        @param tasks: An iterator of the L{ITask} providers which have not yet
+            been made available for scheduling, ordered by the time at which
+            they may first be done.  They are only taken from it as the days
+            they may be done on are reached.
+
+        @param available: A L{deque} of all the jobs which may be scheduled on
+            C{day}, ordered by the earliest time they may be done.  Preference
+            will be given to jobs which can be done earlier (based on the weak
+            heuristic that they probably _can't_ be done later; does that hold?
+            I don't know).  Each job is paired with the task in C{self.tasks}
+            it was made from.
+
+        @param waiting: A L{_Waiting} holding the tasks already taken from
+            C{tasks} which may not be done yet, and how much the rest are put
+            off because tasks they depend on have been.  A task's delay is
+            added to its time as it becomes available, rather than rewriting
+            the tasks.
+
+        @param checkpoint: A callable taking C{day}, C{position}, C{available}
+            and C{waiting} which is called at the start of each day, or
+            C{None}.
+
+        @return: An iterator of three-tuples of each day on which work is
+            scheduled, the L{ITask} providers scheduled on it, and the tasks
+            they were made from, produced as soon as the day is scheduled.
+        """
+        calendar = self.calendar
+        greenhouse = self._greenhouse
+        endOfDayWaste = self.endOfDayWaste
+        startOfDay = self.startOfDay
+
+        head = next(tasks, None)
+        while head is not None or available or waiting.postponed:
+            if checkpoint is not None:
+                checkpoint(day, position, available, waiting)
+
+            # First move any jobs out of tasks that may be done on or before
+            # the day being scheduled, setting aside those which have been
+            # postponed until later or are waiting for others to be done.
+            while head is not None and head.date <= day:
+                waiting.reach(head, position)
+                position += 1
+                head = next(tasks, None)
+
+            for (when, index, task) in waiting.ready(day):
+                available.append((_rescheduled(task, when), task))
+
+            # Now schedule some jobs for today.  This is naive, it just
+            # schedules jobs in order until one goes over the daily hour limit.
+            maxManHours = calendar.hours(day)
+            hours = timedelta(hours=0)
+            events = []
+            sources = []
+            # Flat seeding which must wait for room in the greenhouse.
+            deferred = []
+            while available:
+                if greenhouse is not None and isinstance(
+                    available[0][0], SeedFlats):
+                    if not self._makeRoom(available, deferred, day):
+                        continue
+
+                # Whether the job about to be scheduled is the last of its task.
+                finished = True
+                if hours + available[0][0].duration > maxManHours:
+                    # This task does not fit in this day as is.
+
+                    if maxManHours > hours + endOfDayWaste:
+                        # There is enough time left today to split the task
+                        # up.  Replace the original with the (two) split up
+                        # tasks.  Then fall through to the code for handling
+                        # available[0] below.
+                        task, source = available.popleft()
+                        first, second = task.split(maxManHours - hours)
+                        available.appendleft((second, source))
+                        available.appendleft((first, source))
+                        finished = False
+                    else:
+                        # There isn't enough time left today to bother, move
+                        # on to the next day.
+                        break
+
+                event, source = available.popleft()
+                schedDiff = day - event.date
+                events.append(_rescheduled(
+                        event, event.when + startOfDay + hours + schedDiff))
+                sources.append(source)
+                if greenhouse is not None:
+                    if isinstance(event, SeedFlats):
+                        greenhouse.seed(
+                            source, day.toordinal(), event.required_flats())
+                    elif isinstance(event, Transplant):
+                        greenhouse.transplant(
+                            source, day.toordinal(), event.quantity)
+                if day != source.date:
+                    # The event got moved from its originally scheduled time.
+                    # Push back the events that depend on it.
+                    waiting.put_off(source, day - source.date)
+                if finished:
+                    # Whatever was only waiting for this may be done next.
+                    available.extendleft(reversed([
+                                (_rescheduled(task, when), task)
+                                for (when, index, task)
+                                in waiting.done(source, day)]))
+
+                hours += event.duration
+
+            # Anything waiting for room in the greenhouse will be done
+            # tomorrow at the earliest, and so will be anything which depends
+            # on it.
+            for (task, source) in deferred:
+                waiting.put_off(source, day + timedelta(days=1) - source.date)
+            available.extendleft(reversed(deferred))
+
+            if events:
+                yield day, events, sources
+
+            # And move to the next day on which there is something to do.  If
+            # nothing is waiting, that is the day the next task may be done.
+            day += timedelta(days=1)
+            if not available:
+                upcoming = [
+                    when.date()
+                    for (when, index, task) in waiting.postponed[:1]]
+                if head is not None:
+                    upcoming.append(head.date)
+                if upcoming:
+                    day = max(day, min(upcoming))
+            if head is not None or available or waiting.postponed:
+                day = calendar.next_available(day)
+                if greenhouse is not None:
+                    greenhouse.wait(day.toordinal())
+
+
+    def _makeRoom(self, available, deferred, day):
+        """
+        Make sure the flats needed for the L{SeedFlats} task at the front of
+        C{available} fit in the greenhouse if it is seeded on C{day}, or else
+        move it to C{deferred}.
+
+        @return: C{True} if the task fits, C{False} if it was moved.
+
+        The task is not split up to use whatever room there is, since the
+        flats seeded first would only have to wait in the greenhouse for the
+        rest before they could all be transplanted.
+
+        @raise ValueError: If the task can never fit in the greenhouse.
+        """
+        task, source = available.popleft()
+        free = self._greenhouse.free(source, day.toordinal())
+        if task.required_flats() <= free:
+            available.appendleft((task, source))
+            return True
+
+        if free >= self._greenhouse.room(source, day.toordinal()):
+            raise ValueError(
+                "%s does not fit in a greenhouse of %d flats" % (
+                    task, self._greenhouse.capacity))
+        deferred.append((task, source))
+        return False
+
+
+    def change(self, removed=(), added=()):
+        """
+        Schedule a variation of C{self.tasks}, re-using the work already done
+        for the days before any of the differences matter.
+
+        @param removed: A sequence of L{ITask} providers from C{self.tasks}
+            which are no longer to be scheduled.
+
+        @param added: A sequence of new L{ITask} providers to be scheduled.
+
+        @return: A new L{Schedule} with the same result as scheduling the
+            changed tasks from scratch.
+        """
+        if not removed and not added:
+            return self
+
+        firstDay = min(task.date for task in chain(removed, added))
+        removed = set(map(id, removed))
+
+        index = bisect_right(self._days, firstDay) - 1
+        if index < 0:
+            tasks = [task for task in self.tasks if id(task) not in removed]
+            tasks.extend(added)
+            tasks.sort(key=lambda task: task.when)
+            return Schedule(
+                tasks, self.maxManHours, self.calendar, self.flats,
+                self.years, self.recurrence)
+
+        # Nothing which happened before this checkpoint depends on the changed
+        # tasks, and all of them come after the checkpoint's position.
+        (position, available, waiting, scheduled,
+         greenhouse) = self._checkpoints[index]
+        remaining = [
+            task for task in self.tasks[position:] if id(task) not in removed]
+        remaining.extend(added)
+        remaining.sort(key=lambda task: task.when)
+
+        result = Schedule(
+            [], self.maxManHours, self.calendar, self.flats, self.years,
+            self.recurrence)
+        if greenhouse is not None:
+            result._greenhouse = greenhouse.copy()
+        result.tasks = self.tasks[:position] + remaining
+        result.events = self.events[:scheduled]
+        result.sources = self.sources[:scheduled]
+        result._days = self._days[:index]
+        result._checkpoints = self._checkpoints[:index]
+        result._waiting = waiting.copy()
+        result._run(self._days[index], position, deque(available))
+        return result
+
+
+    def reschedule_seed(self, seed):
+        """
+        Re-create and schedule the tasks for a seed variety whose information
+        (for example, C{beginning_of_season}) has been changed.
+
+        The tasks are created for all of C{years}, with C{recurrence}, the
+        same way as the ones they replace.
+
+        @return: A new L{Schedule}.
+        """
+        removed = [task for task in self.tasks if task.seed is seed]
+        years = self.years
+        if years is None:
+            years = [YEAR]
+        added = [
+            key[-1] for key in _keyed_horizon_tasks(
+                seed, years, self.recurrence)]
+        return self.change(removed, added)
+
+
+    def complete(self, task):
+        """
+        Drop a task which has been completed and so needs no more time
+        allocated to it.
+
+        @param task: One of the L{ITask} providers in C{self.tasks}.
+
+        @return: A new L{Schedule}.
+        """
+        return self.change(removed=[task])
+
+
+
+def schedule_tasks(tasks, maxManHours=timedelta(hours=5), calendar=None,
+                   flats=None, coalesce=False):
+    """
+    Spread tasks out, if there is too much work being done on any particular
+    day.
+
+    @param maxManHours: The maximum number of hours of work to schedule per day
+    @type maxManHours: L{datetime.timedelta}
+
+    @param calendar: A L{CapacityCalendar} giving the hours available on each
+        day, or C{None} to use C{maxManHours} every day.
+
+    @param flats: The number of flats the greenhouse holds, or C{None} for no
+        limit.
+
+    @param coalesce: If C{True}, merge and drop fragments of split up tasks
+        with L{coalesce_fragments}.
+
+    @return: The C{list} of scheduled tasks; see L{Schedule.events}.
+    """
+    schedule = Schedule(tasks, maxManHours, calendar, flats)
+    if coalesce:
+        return coalesce_fragments(schedule.events, schedule.sources)
+    return schedule.events
+
+
+
+def iter_schedule(tasks, maxManHours=timedelta(hours=5), calendar=None,
+                  flats=None, coalesce=False):
+    """
+    Spread tasks out like L{schedule_tasks}, producing the work for each day
+    as soon as that day has been scheduled.
+
+    Unlike a L{Schedule}, nothing is kept for the days already produced, so
+    only the tasks which are waiting to be done are held in memory.
+
+    @param tasks: An iterable of L{ITask} providers ordered by C{when}, such
+        as L{iter_tasks} gives.  Tasks are only taken from it as the days they
+        may be done on are reached.
+
+    @param coalesce: If C{True}, merge and drop fragments of split up tasks
+        on each day with L{coalesce_fragments}.
+
+    @return: An iterator of two-tuples of a L{datetime.date} and the C{list}
+        of L{ITask} providers scheduled on it, in order.  Days without any
+        work are skipped.
+    """
+    scheduler = Schedule((), maxManHours, calendar, flats)
+    tasks = iter(tasks)
+    first = next(tasks, None)
+    if first is None:
+        return
+    days = scheduler._schedule_days(
+        scheduler.calendar.next_available(first.date), 0,
+        chain([first], tasks), deque(), _Waiting(), None)
+    for (day, events, sources) in days:
+        if coalesce:
+            events = coalesce_fragments(events, sources)
+            if not events:
+                continue
+        yield day, events
+
+
+
+def task_window(task):
+    """
+    Find the days on which a task, as it was planned, may be done.
+
+    Nothing is done before the day it was planned for.  The last day comes
+    from its seed variety:
+
+      - a planting must be done early enough for it to mature (in
+        C{maturity_days}) by C{end_of_season}, and seedlings cannot wait in
+        their flats for more than half as long again as their
+        C{greenhouse_days} before they are transplanted;
+
+      - flats must be seeded C{greenhouse_days} before the last day their
+        seedlings may be transplanted, and a bed must be prepared by the last
+        day it may be planted;
+
+      - a harvest must be done within the C{harvest_duration} of the variety
+        (if it is known) once it is ready, and by C{end_of_season}.
+
+    Other tasks, such as weeding, have no deadline.
+
+    @return: A two-tuple of the L{datetime} of the first and the last day
+        C{task} may be done on.  The last is C{None} if there is no deadline.
+    """
+    return task.when, _deadline(task)
+
+
+
+def _deadline(task, when=None):
+    """
+    Find the last day C{task} may be done on; see L{task_window}.
+
+    @param when: The first day C{task} may be done on now that the tasks it
+        depends on have been done, if they were put off.  The parts of the
+        window counted from the day a task is ready (such as the harvest
+        duration) are moved along with it.  C{None} for C{task.when}.
+    """
+    if when is None:
+        when = task.when
+    seed = task.seed
+    if isinstance(task, (BedPreparation, SeedFlats)):
+        limits = [
+            _deadline(dependent) for dependent in task.dependents
+            if isinstance(dependent, (DirectSeed, Transplant))]
+        limits = [limit for limit in limits if limit is not None]
+        if limits and isinstance(task, SeedFlats):
+            limits = [
+                limit - timedelta(days=seed.greenhouse_days)
+                for limit in limits]
+    else:
+        end = None
+        if seed.end_of_season is not None:
+            end = datetime(task.when.year, 1, 1) + timedelta(
+                days=seed.end_of_season)
+        if isinstance(task, (DirectSeed, Transplant)):
+            limits = []
+            if end is not None and seed.maturity_days is not None:
+                limits.append(end - timedelta(days=seed.maturity_days))
+            if isinstance(task, Transplant) and seed.greenhouse_days:
+                limits.append(when + timedelta(days=seed.greenhouse_days // 2))
+        elif isinstance(task, Harvest):
+            limits = []
+            if seed.harvest_duration:
+                limits.append(
+                    when + timedelta(days=seed.harvest_duration - 1))
+            if end is not None:
+                limits.append(end)
+        else:
+            limits = []
+    if not limits:
+        return None
+    return max(when, min(limits))
+
+
+
+class MissedDeadline(record('task latest cause', cause=None),
+                     ComparableRecord):
+    """
+    A task left out of a schedule because it could not be done in time.
+
+    @ivar task: The L{ITask} provider, as it was planned.
+
+    @ivar latest: The L{datetime} of the last day it could have been done
+        (see L{task_window}), or C{None} if it was left out because of
+        C{cause}.
+
+    @ivar cause: C{None} if the task itself could not be done in time, or
+        else the task it depends on (directly or not) which could not be, so
+        that there is no point doing this one (for example, the harvest of a
+        planting which was never transplanted).
+    """
+
+
+
+class DeadlineSchedule(object):
+    """
+    The result of scheduling tasks by their deadlines with
+    L{schedule_deadlines}.
+
+    @ivar events: The C{list} of L{ITask} providers making up the schedule, as
+        in L{Schedule.events}.
+
+    @ivar sources: A C{list} parallel to C{events} giving the task each event
+        was made from, as in L{Schedule.sources}.
+
+    @ivar missed: A C{list} of L{MissedDeadline} for each task left out of
+        the schedule, in the order they were given up on.
+    """
+    def __init__(self, events, sources, missed):
+        self.events = events
+        self.sources = sources
+        self.missed = missed
+
+
+
+def schedule_deadlines(tasks, maxManHours=timedelta(hours=5), calendar=None):
+    """
+    Spread tasks out like L{schedule_tasks}, but do the task with the earliest
+    deadline (see L{task_window}) first out of those which may be done on a
+    day, rather than the one planned earliest.
+
+    A task which cannot be done by its deadline is not put off any further.
+    It is left out of the schedule and reported, and so is every task which
+    depends on it.
+
+    @param tasks: An iterable of L{ITask} providers ordered by C{when}.
+
+    @param maxManHours: The maximum number of hours of work to schedule per day
+    @type maxManHours: L{datetime.timedelta}
+
+    @param calendar: A L{CapacityCalendar} giving the hours available on each
+        day, or C{None} to use C{maxManHours} every day.
+
+    @return: A L{DeadlineSchedule}.
+    """
+    if calendar is None:
+        calendar = CapacityCalendar(maxManHours)
+    endOfDayWaste = Schedule.endOfDayWaste
+    startOfDay = Schedule.startOfDay
+    never = datetime.max
+
+    events = []
+    sources = []
+    missed = []
+    # Map the id of each task depending on a task which was left out to that
+    # task, paired with the dependent itself so the id is not re-used.
+    ruined = {}
+    waiting = _Waiting()
+    # A heap of the tasks which may be done, by their deadlines and then by
+    # their position amongst all of the tasks.
+    available = []
+
+    def make_available(ready):
+        # The deadline is worked out from the time a task may be done now,
+        # so it moves along with the tasks it depends on.
+        for (when, index, task) in ready:
+            heappush(available, (
+                    _deadline(task, when) or never, index,
+                    _rescheduled(task, when), task))
+
+    def leave_out(task, latest, cause, day):
+        missed.append(MissedDeadline(task, latest, cause))
+        for dependent in task.dependents:
+            ruined[id(dependent)] = (cause or task, dependent)
+        # Nothing waits any longer for a task which will never be done.
+        make_available(waiting.done(task, day))
+
+    tasks = iter(tasks)
+    head = next(tasks, None)
+    if head is None:
+        return DeadlineSchedule(events, sources, missed)
+    day = calendar.next_available(head.date)
+    position = 0
+
+    while head is not None or available or waiting.postponed:
+        while head is not None and head.date <= day:
+            waiting.reach(head, position)
+            position += 1
+            head = next(tasks, None)
+
+        make_available(waiting.ready(day))
+
+        maxManHours = calendar.hours(day)
+        hours = timedelta(hours=0)
+        while available:
+            latest, index, event, source = available[0]
+            if id(source) in ruined:
+                heappop(available)
+                leave_out(source, None, ruined.pop(id(source))[0], day)
+                continue
+            if latest.date() < day:
+                heappop(available)
+                leave_out(source, latest, None, day)
+                continue
+
+            finished = True
+            if hours + event.duration > maxManHours:
+                if maxManHours > hours + endOfDayWaste:
+                    heappop(available)
+                    event, second = event.split(maxManHours - hours)
+                    heappush(available, (latest, index, second, source))
+                    finished = False
+                else:
+                    break
+            else:
+                heappop(available)
+
+            schedDiff = day - event.date
+            events.append(_rescheduled(
+                    event, event.when + startOfDay + hours + schedDiff))
+            sources.append(source)
+            if day != source.date:
+                waiting.put_off(source, day - source.date)
+            if finished:
+                make_available(waiting.done(source, day))
+            hours += event.duration
+
+        day += timedelta(days=1)
+        if not available:
+            upcoming = [
+                when.date() for (when, index, task) in waiting.postponed[:1]]
+            if head is not None:
+                upcoming.append(head.date)
+            if upcoming:
+                day = max(day, min(upcoming))
+        if head is not None or available or waiting.postponed:
+            day = calendar.next_available(day)
+
+    return DeadlineSchedule(events, sources, missed)
+
+
+
+def summarize_missed(missed):
+    """
+    Print the tasks left out of a schedule because they could not be done in
+    time.
+    """
+    for miss in missed:
+        if miss.cause is None:
+            print 'Missed %02d/%02d deadline: %s' % (
+                miss.latest.month, miss.latest.day, miss.task.summarize())
+        else:
+            print 'Left out: %s (after: %s)' % (
+                miss.task.summarize(), miss.cause.summarize())
+
+
+
+def summarize_overrun(schedule, years):
+    """
+    Warn about the events of a schedule which have been pushed past the end of
+    the last year planned (for example, by waiting for room in the
+    greenhouse).
+    """
+    late = [event for event in schedule if event.when.year > years[-1]]
+    if late:
+        print 'Warning: %d tasks run past the end of %d, the last on %s' % (
+            len(late), years[-1], max(event.when for event in late).date())
+
+
+
+class WeekEstimate(record('week planned done backlog'), ComparableRecord):
+    """
+    An estimate of the work done in one week past the horizon of a
+    L{HorizonSchedule}.
+
+    @ivar week: The L{datetime.date} of the first day of the week.
+
+    @ivar planned: A L{datetime.timedelta} giving the time taken by the tasks
+        which may first be done this week.
+
+    @ivar done: A L{datetime.timedelta} giving the time there is to work on
+        them, and on the backlog from earlier weeks, this week.
+
+    @ivar backlog: A L{datetime.timedelta} giving the time taken by the work
+        left over for later weeks.
+    """
+
+
+
+class HorizonSchedule(object):
+    """
+    A schedule worked out in detail for a few weeks, and only estimated after
+    that.
+
+    @ivar start: The L{datetime.date} of the first day scheduled.
+
+    @ivar end: The L{datetime.date} of the first day past the horizon.
+
+    @ivar events: The C{list} of L{ITask} providers scheduled before C{end},
+        as in L{Schedule.events}.
+
+    @ivar sources: A C{list} parallel to C{events} giving the task each event
+        was made from, as in L{Schedule.sources}.
+
+    @ivar estimate: A C{list} of L{WeekEstimate} for each week from C{end}
+        on, until all of the remaining work is estimated to be done.
+    """
+    def __init__(self, start, end, events, sources, estimate):
+        self.start = start
+        self.end = end
+        self.events = events
+        self.sources = sources
+        self.estimate = estimate
+
+
+
+def schedule_horizon(tasks, start, weeks, maxManHours=timedelta(hours=5),
+                     calendar=None, flats=None):
+    """
+    Spread tasks out like L{iter_schedule}, but only for C{weeks} from
+    C{start}, and estimate how the rest of the work will go from the hours
+    it takes and the hours available each week.
+
+    Tasks planned before C{start} are taken to be done already.  Only the
+    tasks which may be done before the horizon are scheduled, so the time
+    this takes depends on the number of weeks rather than the length of the
+    plan.
+
+    @param tasks: An iterable of L{ITask} providers ordered by C{when}.
+
+    @param start: The L{datetime.date} of the first day to schedule.
+
+    @param weeks: The number of weeks to schedule in detail.
+
+    @return: A L{HorizonSchedule}.
+    """
+    end = start + timedelta(weeks=weeks)
+    scheduler = Schedule((), maxManHours, calendar, flats)
+    calendar = scheduler.calendar
+    events = []
+    sources = []
+
+    # Keep the tasks taken from tasks, so that the ones the scheduler has
+    # taken but not yet made available can be found again at the horizon.
+    taken = []
+    def take(tasks):
+        for task in tasks:
+            taken.append(task)
+            yield task
+    tasks = dropwhile(lambda task: task.date < start, iter(tasks))
+    first = next(tasks, None)
+    if first is None:
+        return HorizonSchedule(start, end, events, sources, [])
+
+    # The state of the scheduler at the start of the first day past the
+    # horizon.
+    horizon = []
+    def checkpoint(day, position, available, waiting):
+        if day >= end and not horizon:
+            horizon.append((position, list(available), dict(waiting.delays),
+                            list(waiting.postponed)))
+
+    days = scheduler._schedule_days(
+        max(start, calendar.next_available(first.date)), 0,
+        take(chain([first], tasks)), deque(), _Waiting(), checkpoint)
+    for (day, scheduled, scheduledSources) in days:
+        if horizon:
+            break
+        events.extend(scheduled)
+        sources.extend(scheduledSources)
+    if not horizon:
+        return HorizonSchedule(start, end, events, sources, [])
+
+    position, available, delays, postponed = horizon[0]
+    noDelay = _Waiting._nothing
+    remaining = [event for (event, source) in available]
+    remaining.extend(task for (when, index, task) in postponed)
+    remaining.extend(
+        task for (delay, task, waiting, held) in delays.itervalues()
+        if held is not None)
+    remaining.extend(chain(taken[position:], tasks))
+    return HorizonSchedule(
+        start, end, events, sources,
+        _estimate_weeks(
+            end, calendar,
+            [((task.when + delays.get(id(task), noDelay)[0]).date(),
+              task.duration)
+             for task in remaining]))
+
+
+
+def _estimate_weeks(start, calendar, work):
+    """
+    Estimate the work done each week from C{start} on, if each week the work
+    which may be done that week or was left over from earlier weeks is done
+    until the hours available run out.
+
+    @param work: A C{list} of two-tuples of the L{datetime.date} on which
+        some work may first be done and the L{datetime.timedelta} it takes.
 
-        # Handle succession planting
-        if seed.fresh_generations is None and seed.storage_generations is None:
-            fresh_generations = 1
-            storage_generations = 0
+    @return: A C{list} of L{WeekEstimate}.  It stops once everything is done,
+        or a year after the last week with new work if it is never done.
+    """
+    planned = defaultdict(timedelta)
+    for (day, duration) in work:
+        planned[max(0, (day - start).days) // 7] += duration
+    if not planned:
+        return []
+    last = max(planned)
+
+    estimate = []
+    backlog = timedelta()
+    week = 0
+    while week <= last or (backlog and week <= last + 52):
+        first = start + timedelta(weeks=week)
+        hours = sum(
+            (calendar.hours(first + timedelta(days=offset))
+             for offset in range(7)), timedelta())
+        waiting = backlog + planned.get(week, timedelta())
+        done = min(waiting, hours)
+        backlog = waiting - done
+        estimate.append(
+            WeekEstimate(first, planned.get(week, timedelta()), done, backlog))
+        week += 1
+    return estimate
+
+
+
+def summarize_horizon(estimate):
+    """
+    Print the estimate of the work in each week past the horizon of a
+    L{HorizonSchedule}.
+    """
+    hours = lambda duration: duration.total_seconds() / 3600
+    print 'Week       Planned (hours)  Done (hours)  Backlog (hours)'
+    for week in estimate:
+        print '%s %15.1f %13.1f %16.1f' % (
+            week.week.isoformat(), hours(week.planned), hours(week.done),
+            hours(week.backlog))
+
+
+
+class ScheduleOptimizer(object):
+    """
+    Improve on a L{Schedule} by moving its events between days, using
+    simulated annealing.
+
+    The greedy scheduler only ever pushes work later and fills each day as
+    full as it can, so work piles up into peaks and harvests drift apart.  The
+    optimizer tries random moves of single events to other days, keeping the
+    cost of the schedule up to date as each move is made, and accepts moves
+    which make the schedule cheaper (and, early on, some which make it more
+    expensive so it can get out of local minima).
+
+    No event is moved before the day its task was planned for, before any
+    task it depends on, after any task which depends on it, or onto a day
+    without enough time left for it.  If the schedule limits the flats in use
+    (see L{Schedule.flats}), flat seeding and transplanting are not moved.
+
+    The cost is the sum of:
+
+      - C{delayWeight} times the hours of work done, times the number of days
+        it was done after it was planned for;
+
+      - C{laborWeight} times the sum of the squared differences between the
+        hours of work each day and the average day;
+
+      - C{gapWeight} times the sum of the squared differences between the
+        number of days between consecutive harvests of each crop and the
+        average number of days between them in the plan.
+
+    @ivar cost: The cost of the schedule as it currently stands.
+    """
+    delayWeight = 1.0
+    laborWeight = 1.0
+    gapWeight = 1.0
+
+    # The number of days past the latest of its current day and the first day
+    # it may be done that an event may be moved to.
+    window = 14
+
+    # The temperature at the start of the search.  It falls linearly to zero
+    # as the time budget is used up.
+    initialTemperature = 10.0
+
+    # The number of moves to try between looking at the clock.
+    movesPerCheck = 100
+
+    def __init__(self, schedule, random=None, clock=time):
+        """
+        @param schedule: The L{Schedule} to start from.
+
+        @param random: A L{random.Random} to choose moves with.
+
+        @param clock: A no-argument callable returning the current time in
+            seconds.
+        """
+        if random is None:
+            random = Random()
+        self.random = random
+        self.clock = clock
+        self.calendar = schedule.calendar
+        self.startOfDay = schedule.startOfDay
+
+        self._events = list(schedule.events)
+        self._sources = list(schedule.sources)
+        self._dates = [event.date.toordinal() for event in self._events]
+        self._planned = [source.date.toordinal() for source in self._sources]
+        self._hours = [
+            event.duration.total_seconds() / 3600 for event in self._events]
+        if schedule.flats is None:
+            self._fixed = frozenset()
         else:
-            fresh_generations = seed.fresh_generations
-            if fresh_generations is None:
-                fresh_generations = 0
-            storage_generations = seed.storage_generations
-            if storage_generations is None:
-                storage_generations = 0
-
-        intergenerational_days = seed.intergenerational_days
-        if intergenerational_days is None:
-            if fresh_generations > 1 or storage_generations > 1:
-                raise ValueError(
-                    "Cannot have multiple generations without defining "
-                    "intergenerational time.")
-            # Doesn't matter, just make it an integer
-            intergenerational_days = 0
-
-        generations = fresh_generations + storage_generations
-
-        # Fresh produce generations, pegged to the beginning of the season
-        for generation in range(fresh_generations):
-            generation_tasks = list(_create_planting_tasks(epoch, seed))
-            for t in generation_tasks:
-                t.when += timedelta(
-                    days=generation * intergenerational_days)
-                t.quantity /= generations
-            tasks.extend(generation_tasks)
-
-        # Storage produce generations, pegged to the end of the season
-        storage_epoch = epoch + _storage_offset(seed)
-        succession_offset = (storage_generations - 1) * intergenerational_days
-        storage_epoch -= timedelta(days=succession_offset)
-        for generation in range(storage_generations):
-            generation_tasks = list(_create_planting_tasks(storage_epoch, seed))
-            for t in generation_tasks:
-                t.when += timedelta(
-                    days=generation * intergenerational_days)
-                t.quantity /= generations
-            tasks.extend(generation_tasks)
-
-    tasks.sort(key=lambda event: event.when)
-    return tasks
+            self._fixed = frozenset(
+                index for (index, event) in enumerate(self._events)
+                if isinstance(event, (SeedFlats, Transplant)))
+
+        # Map the id of each source to the indexes of the events made from it,
+        # and the ids of the sources which must be done before it.
+        self._made = defaultdict(list)
+        for index, source in enumerate(self._sources):
+            self._made[id(source)].append(index)
+        self._predecessors = defaultdict(list)
+        for key, indexes in self._made.iteritems():
+            for dependent in self._sources[indexes[0]].dependents:
+                if id(dependent) in self._made:
+                    self._predecessors[id(dependent)].append(key)
+
+        if self._events:
+            self._first = min(self._planned + self._dates)
+            self._last = max(self._dates) + self.window
+            days = self._last - self._first + 1
+        else:
+            self._first = self._last = None
+            days = 0
+        self._capacity = [
+            self.calendar.hours(
+                date.fromordinal(self._first + offset)).total_seconds() / 3600
+            for offset in xrange(days)]
+        self._load = [0.0] * days
+        for day, hours in zip(self._dates, self._hours):
+            self._load[day - self._first] += hours
+
+        # The sorted harvest days of each crop, and the planned average number
+        # of days between them.
+        self._harvests = defaultdict(list)
+        self._spacing = {}
+        planned = defaultdict(list)
+        for index, event in enumerate(self._events):
+            if isinstance(event, Harvest):
+                name = event.seed.crop.name
+                self._harvests[name].append(self._dates[index])
+                planned[name].append(self._planned[index])
+        for name, days in self._harvests.iteritems():
+            days.sort()
+            span = max(planned[name]) - min(planned[name])
+            self._spacing[name] = float(span) / max(1, len(days) - 1)
+
+        self.cost = self._cost()
+
+        # The indexes of the events moved since the cheapest schedule found so
+        # far, or None if they are not being kept track of.
+        self._moved = None
+
+
+    def _cost(self):
+        """
+        Compute the cost of the current schedule from scratch.
+        """
+        delay = sum(
+            (day - planned) * hours for (day, planned, hours)
+            in zip(self._dates, self._planned, self._hours))
 
+        mean = sum(self._load) / max(1, len(self._load))
+        labor = sum((load - mean) ** 2 for load in self._load)
 
+        gaps = 0
+        for name, days in self._harvests.iteritems():
+            spacing = self._spacing[name]
+            for earlier, later in zip(days, days[1:]):
+                gaps += (later - earlier - spacing) ** 2
 
-def _storage_offset(seed):
+        return (
+            self.delayWeight * delay + self.laborWeight * labor
+            + self.gapWeight * gaps)
+
+
+    def _bounds(self, index):
+        """
+        Find the range of days to which the event at C{index} could be moved
+        without violating any of its dependencies.
+
+        @return: A two-tuple of the first and last day ordinals.
+        """
+        source = self._sources[index]
+        first = self._planned[index]
+        for key in self._predecessors[id(source)]:
+            for other in self._made[key]:
+                first = max(first, self._dates[other])
+        last = min(self._last, max(first, self._dates[index]) + self.window)
+        for dependent in source.dependents:
+            for other in self._made.get(id(dependent), ()):
+                last = min(last, self._dates[other])
+        return first, last
+
+
+    def _gapChange(self, name, old, new):
+        """
+        Move a harvest of the crop named C{name} from day C{old} to day C{new}
+        and return the change to the (unweighted) gap cost.
+        """
+        days = self._harvests[name]
+        spacing = self._spacing[name]
+
+        def around(position):
+            # The cost of the gaps either side of days[position], less the
+            # cost of the gap which would be left if it were not there.
+            day = days[position]
+            cost = 0
+            if position > 0:
+                cost += (day - days[position - 1] - spacing) ** 2
+            if position + 1 < len(days):
+                cost += (days[position + 1] - day - spacing) ** 2
+                if position > 0:
+                    cost -= (
+                        days[position + 1] - days[position - 1] - spacing) ** 2
+            return cost
+
+        change = -around(bisect_right(days, old) - 1)
+        del days[bisect_right(days, old) - 1]
+        position = bisect_right(days, new)
+        days.insert(position, new)
+        return change + around(position)
+
+
+    def _move(self, index, new):
+        """
+        Move the event at C{index} to the day with ordinal C{new}.
+
+        @return: The change in cost.
+        """
+        old = self._dates[index]
+        hours = self._hours[index]
+        load = self._load
+        before = load[old - self._first]
+        after = load[new - self._first]
+
+        # Moving work between days leaves the average load unchanged, so only
+        # the squared loads of the two days involved change.
+        change = self.laborWeight * (
+            (before - hours) ** 2 + (after + hours) ** 2
+            - before ** 2 - after ** 2)
+        change += self.delayWeight * (new - old) * hours
+
+        event = self._events[index]
+        if isinstance(event, Harvest):
+            change += self.gapWeight * self._gapChange(
+                event.seed.crop.name, old, new)
+
+        load[old - self._first] -= hours
+        load[new - self._first] += hours
+        self._dates[index] = new
+        self.cost += change
+        if self._moved is not None:
+            self._moved.add(index)
+        return change
+
+
+    def _step(self, temperature):
+        """
+        Try one random move, keeping it or undoing it.
+        """
+        random = self.random
+        index = random.randrange(len(self._events))
+        if index in self._fixed:
+            return
+        old = self._dates[index]
+        first, last = self._bounds(index)
+        if first > last:
+            return
+        new = random.randint(first, last)
+        hours = self._hours[index]
+        capacity = self._capacity[new - self._first]
+        if new == old or not capacity or (
+            self._load[new - self._first] + hours > capacity):
+            return
+
+        change = self._move(index, new)
+        if change > 0 and (
+            temperature <= 0 or random.random() >= exp(-change / temperature)):
+            self._move(index, old)
+
+
+    def run(self, budget, coalesce=False):
+        """
+        Search for a cheaper schedule for up to C{budget} seconds.
+
+        @param coalesce: If C{True}, merge fragments of a split up task which
+            end up one after another on the same day, and drop empty ones (see
+            L{coalesce_fragments}).
+
+        @return: The C{list} of scheduled tasks in the cheapest schedule found,
+            in the order they are to be done.
+        """
+        dates = self._dates
+        cost = self.cost
+        best = list(dates)
+        if self._events:
+            # Only the events moved since the cheapest schedule so far need to
+            # be updated in it when a cheaper one is found.
+            self._moved = moved = set()
+            start = self.clock()
+            elapsed = 0
+            while elapsed < budget:
+                temperature = self.initialTemperature * (1 - elapsed / budget)
+                for i in xrange(self.movesPerCheck):
+                    self._step(temperature)
+                    if self.cost < cost:
+                        cost = self.cost
+                        for index in moved:
+                            best[index] = dates[index]
+                        moved.clear()
+                elapsed = self.clock() - start
+            self._moved = None
+        return self._events_for(best, coalesce)
+
+
+    def _events_for(self, dates, coalesce=False):
+        """
+        Create the scheduled tasks for the events moved to C{dates}, done one
+        after another from the start of each day in the order they were
+        originally scheduled.
+
+        @param coalesce: If C{True}, merge and drop fragments of split up
+            tasks before working out when each event starts.
+        """
+        order = sorted(
+            xrange(len(dates)), key=lambda index: (dates[index], index))
+        events = []
+        for day, indexes in groupby(order, key=lambda index: dates[index]):
+            when = datetime.fromordinal(day) + self.startOfDay
+            scheduled = [
+                (_rescheduled(self._events[index], when),
+                 self._sources[index])
+                for index in indexes]
+            if coalesce:
+                scheduled = _coalesced(scheduled)
+            for (event, source) in scheduled:
+                event.when = when
+                events.append(event)
+                when += event.duration
+        return events
+
+
+
+def optimize_schedule(schedule, budget, coalesce=False):
     """
-    Compute the number of days between the first possible day of the season a
-    seed variety's first spring succession can be put outside and the last
-    possible day of the season that seed variety's first storage success can be
-    put outside.
+    Spend up to C{budget} seconds looking for a better version of
+    C{schedule}.  See L{ScheduleOptimizer}.
+
+    @param coalesce: If C{True}, merge and drop fragments of split up tasks;
+        see L{ScheduleOptimizer.run}.
+
+    @return: The C{list} of scheduled tasks.
     """
-    last_harvest = seed.end_of_season
-    last_planting = last_harvest - seed.maturity_days
-    storage_offset = last_planting - seed.beginning_of_season
-    return timedelta(days=storage_offset)
+    return ScheduleOptimizer(schedule).run(budget, coalesce)
 
 
 
-def _create_planting_tasks(epoch, seed):
-    # Prep the bed before planting in it
-    yield BedPreparation(
-        epoch + timedelta(days=seed.beginning_of_season - 14),
-        seed, seed.bed_feet)
+class Worker(record('name hours days_off unavailable',
+                   days_off=frozenset(), unavailable=frozenset()),
+             ComparableRecord):
+    """
+    A member of the crew who can be assigned tasks.
 
-    if seed.greenhouse_days != 0:
-        # It starts in the greenhouse
-        greenhouse_day = timedelta(
-            days=seed.beginning_of_season - seed.greenhouse_days)
-        yield SeedFlats(
-            epoch + greenhouse_day, seed, seed.bed_feet)
-        yield Transplant(
-            epoch + timedelta(days=seed.beginning_of_season), seed,
-            seed.bed_feet)
-    else:
-        yield DirectSeed(
-            epoch + timedelta(days=seed.beginning_of_season), seed,
-            seed.bed_feet)
+    @ivar name: A C{str} identifying this worker.
 
-    harvest_day = timedelta(
-        days=seed.beginning_of_season + seed.maturity_days - seed.greenhouse_days)
-    yield Harvest(epoch + harvest_day, seed, seed.bed_feet)
+    @ivar hours: The maximum amount of work to give this worker each day.
+    @type hours: L{datetime.timedelta}
 
+    @ivar days_off: A collection of weekday numbers (Monday is C{0}) on which
+        this worker never works.
 
-def schedule_tasks(tasks, maxManHours=timedelta(hours=5)):
+    @ivar unavailable: A collection of L{datetime.date} instances on which this
+        worker does not work.
     """
-    @param maxManHours: The maximum number of hours of work to schedule per day
-    @type maxManHours: L{datetime.timedelta}
+    def next_workday(self, day):
+        """
+        Find the first day, starting with C{day}, on which this worker works.
+        """
+        if len(self.days_off) >= 7:
+            raise ValueError("%s never works" % (self.name,))
+        while day.weekday() in self.days_off or day in self.unavailable:
+            day += timedelta(days=1)
+        return day
+
+
+
+class Assignment(record('worker task'), ComparableRecord):
     """
-    # Slightly less naive: now spread things out, if there is too much work
-    # being done on any particular day.
+    A scheduled task which has been given to a particular worker.
 
-    # The maximum amount of time to waste at the end of a day (in other words,
-    # the smallest piece of a larger task to break off and schedule at the end
-    # of a day instead of moving the entire task to the next day).
-    endOfDayWaste = timedelta(minutes=30)
+    @ivar worker: The L{Worker} who will do the task.
+    @ivar task: The L{ITask} provider giving what is to be done, and when.
+    """
 
-    # The time of day at which work starts
-    startOfDay = timedelta(hours=8)
 
-    # Walk forward, day by day, from the day of the first job.  For each day,
-    # gather up all of the new jobs that can be done from that day forward.
-    # Then try to allocate time to those jobs.
-    day = tasks[0].date
 
-    # Here are all the jobs which may be scheduled on the day we've gotten up
-    # to, ordered by the earliest time they may be done.  Preference will be
-    # given to jobs which can be done earlier (based on the weak heuristic that
-    # they probably _can't_ be done later; does that hold?  I don't know).
-    available = []
+def schedule_crew(tasks, workers):
+    """
+    Schedule tasks amongst several workers, each with their own hours and
+    days off.
 
-    # Here are all the jobs that have been scheduled according to the new,
-    # max-man-hours scheduler.
-    manHourLimitSchedule = []
+    Like L{Schedule}, tasks are considered in the order they become available
+    and those too large for the time a worker has left in a day are split up.
+    Each task goes to the worker who can start on it soonest, found using a
+    heap of the times at which each worker is next free.  A task which
+    depends on others is not started until they are finished, even by
+    another worker on the same day.
 
-    while tasks or available:
-        # First move any jobs out of schedule that may be done on or before the
-        # day being scheduled.
-        while tasks and tasks[0].date <= day:
-            available.append(tasks.pop(0))
+    @param tasks: A C{list} of L{ITask} providers ordered by the time they may
+        first be done.  These are not modified.
 
-        # Now schedule some jobs for today.  This is naive, it just schedules
-        # jobs in order until one goes over the daily hour limit.
-        hours = timedelta(hours=0)
-        while True:
-            if not available:
-                # All done
-                break
+    @param workers: A sequence of L{Worker} instances.
 
-            if hours + available[0].duration > maxManHours:
-                # This task does not fit in this day as is.
+    @return: A C{list} of L{Assignment} instances, ordered by the time of their
+        tasks.
+    """
+    endOfDayWaste = Schedule.endOfDayWaste
+    startOfDay = Schedule.startOfDay
+    noDelay = timedelta()
+    oneDay = timedelta(days=1)
+
+    if not tasks:
+        return []
+
+    # Each worker's entry gives the day they are working on and how much of
+    # that day's time they have used so far.  The index breaks ties so
+    # workers themselves are never compared.
+    start = tasks[0].date
+    free = []
+    for index, worker in enumerate(workers):
+        if worker.hours > noDelay:
+            free.append((worker.next_workday(start), noDelay, index, worker))
+    if not free:
+        raise ValueError("Cannot schedule tasks without any working hours")
+    heapify(free)
+
+    position = 0
+    # The jobs which may be done, each paired with the task it was made from
+    # and the time at which the last task it depended on will be finished (or
+    # None).
+    available = deque()
+    waiting = _Waiting()
+    assignments = []
+
+    while position < len(tasks) or available or waiting.postponed:
+        day, used, index, worker = heappop(free)
+
+        # Make available everything which may be done by the day this worker
+        # is on.
+        while position < len(tasks) and tasks[position].date <= day:
+            waiting.reach(tasks[position], position)
+            position += 1
+        for (when, ignored, task) in waiting.ready(day):
+            available.append((_rescheduled(task, when), task, None))
+
+        if not available:
+            # Nothing for this worker to do until some later day.
+            upcoming = [
+                when.date() for (when, ignored, task) in waiting.postponed[:1]]
+            if position < len(tasks):
+                upcoming.append(tasks[position].date)
+            later = max(day + oneDay, min(upcoming))
+            heappush(free, (worker.next_workday(later), noDelay, index, worker))
+            continue
 
-                if maxManHours > hours + endOfDayWaste:
-                    # There is enough time left today to split the task up.
-                    replacements = available[0].split(maxManHours - hours)
-                    # Replace the original with the (two) split up tasks.  Then
-                    # fall through to the code for handling available[0] below.
-                    available[:1] = replacements
-                else:
-                    # There isn't enough time left today to bother, move on to
-                    # the next day.
-                    break
+        after = available[0][2]
+        start = datetime.combine(day, datetime.min.time()) + startOfDay
+        if after is not None and start + used < after:
+            # Wait for the tasks it depends on to be finished first.
+            heappush(free, (day, after - start, index, worker))
+            continue
 
-            event = available.pop(0)
-            manHourLimitSchedule.append(event)
-            schedDiff = day - event.date
-            event.when += startOfDay + hours
-            if schedDiff:
-                # The event got moved from its originally scheduled time.  Push
-                # back any subsequent events that depend on it.
-                event.when += schedDiff
-                for dep in tasks:
-                    if dep.seed is event.seed:
-                        dep.when += schedDiff
+        remaining = worker.hours - used
+        if available[0][0].duration > remaining:
+            # A worker whose whole day is no more than the waste allowed at
+            # the end of one still takes a fragment to fill their day, or they
+            # would never get any work.
+            if remaining > endOfDayWaste or used == noDelay:
+                task, source, after = available.popleft()
+                first, second = task.split(remaining)
+                available.appendleft((second, source, after))
+                available.appendleft((first, source, after))
+                finished = False
+            else:
+                # Not worth starting on it today.
+                heappush(free, (
+                        worker.next_workday(day + oneDay), noDelay, index,
+                        worker))
+                continue
+        else:
+            finished = True
+
+        event, source, after = available.popleft()
+        schedDiff = day - event.date
+        assignments.append(Assignment(worker, _rescheduled(
+                    event, event.when + startOfDay + used + schedDiff)))
+        used += event.duration
+        if day != source.date:
+            waiting.put_off(source, day - source.date)
+        if finished:
+            available.extendleft(reversed([
+                        (_rescheduled(task, when), task, start + used)
+                        for (when, ignored, task)
+                        in waiting.done(source, day)]))
+        heappush(free, (day, used, index, worker))
+
+    assignments.sort(key=lambda assignment: assignment.task.when)
+    return assignments
 
-            hours += event.duration
 
-        # And move to the next day
-        day += timedelta(days=1)
 
-    return manHourLimitSchedule
+def schedule_crew_plaintext(assignments):
+    """
+    Print the schedule of each worker separately.
+    """
+    byWorker = defaultdict(list)
+    workers = []
+    for assignment in assignments:
+        if assignment.worker not in byWorker:
+            workers.append(assignment.worker)
+        byWorker[assignment.worker].append(assignment.task)
+
+    for worker in workers:
+        print '%s:' % (worker.name,)
+        for event in byWorker[worker]:
+            print '\t%(event)s on %(date)s' % dict(
+                event=event.summarize(), date=event.when)
 
 
 
@@ -1415,6 +5065,570 @@ def summarize_yields(schedule):
 
 
 
+class Scenario(record('name hours overrun generations',
+                     hours=None, overrun=None, generations={}),
+               ComparableRecord):
+    """
+    A variation on a crop plan to compare against others.
+
+    @ivar name: A C{str} identifying this scenario.
+
+    @ivar hours: The maximum amount of work to schedule per day, or C{None}
+        for the usual amount.
+    @type hours: L{datetime.timedelta}
+
+    @ivar overrun: How much extra seed to order, as a fraction of the seed
+        needed (see L{Seed.order}), or C{None} for the usual amount.
+
+    @ivar generations: A C{dict} mapping the names of seed varieties to
+        two-tuples of the number of fresh and storage generations of them to
+        plant instead of those in the plan.
+    """
+
+
+
+class ScenarioResult(record('scenario order_cost peak_day_hours '
+                            'peak_week_hours peak_flats harvest'),
+                     ComparableRecord):
+    """
+    The outcome of planning a L{Scenario}.
+
+    @ivar order_cost: The cost of the seed order in dollars.
+
+    @ivar peak_day_hours: The most work scheduled on any day.
+    @type peak_day_hours: L{datetime.timedelta}
+
+    @ivar peak_week_hours: The most work scheduled in any week (starting on
+        Monday).
+    @type peak_week_hours: L{datetime.timedelta}
+
+    @ivar peak_flats: The most flats in the greenhouse at once.
+
+    @ivar harvest: A C{list} of two-tuples of the L{datetime.date} of the
+        Monday starting each week and the pounds harvested that week, for
+        every week with a harvest.
+    """
+
+
+
+def evaluate_scenario(crops, seeds, scenario):
+    """
+    Plan the seed order and labor schedule for C{scenario}.
+
+    @param crops: The C{dict} of L{Crop} instances of the base plan.  It is not
+        changed.
+
+    @param seeds: The C{list} of L{Seed} instances of the base plan.  They are
+        not changed.
+
+    @return: A L{ScenarioResult}.
+    """
+    if scenario.generations:
+        # Change copies, so other scenarios still see the base plan.
+        crops, seeds = deepcopy((crops, seeds))
+        for seed in seeds:
+            if seed.variety in scenario.generations:
+                (seed.fresh_generations,
+                 seed.storage_generations) = scenario.generations[seed.variety]
+
+    overrun = scenario.overrun
+    if overrun is None:
+        overrun = 0.3
+    order_cost = sum(
+        item.cost() for item in make_order(crops, seeds, overrun))
+
+    hours = scenario.hours
+    if hours is None:
+        hours = timedelta(hours=5)
+    events = schedule_tasks(create_tasks(crops, seeds), hours)
+
+    daily = defaultdict(timedelta)
+    weekly = defaultdict(timedelta)
+    harvest = defaultdict(float)
+    flats = peak_flats = 0
+    for event in events:
+        day = event.when.date()
+        monday = day - timedelta(days=day.weekday())
+        daily[day] += event.duration
+        weekly[monday] += event.duration
+        if isinstance(event, (SeedFlats, Transplant)):
+            flats += event.required_flats()
+            peak_flats = max(peak_flats, flats)
+        elif isinstance(event, Harvest):
+            pounds = event.seed.crop.yield_lbs_per_bed_foot or 0
+            harvest[monday] += pounds * event.quantity
+
+    return ScenarioResult(
+        scenario, order_cost, max(daily.values() or [timedelta()]),
+        max(weekly.values() or [timedelta()]), peak_flats,
+        sorted(harvest.items()))
+
+
+
+# The base plan being compared against, set in the parent process before the
+# worker processes are started so that they share it rather than each being
+# sent a copy.
+_scenarioBase = None
+
+def _evaluate_base_scenario(scenario):
+    crops, seeds = _scenarioBase
+    return evaluate_scenario(crops, seeds, scenario)
+
+
+
+def compare_scenarios(crops, seeds, scenarios, processes=None):
+    """
+    Evaluate several scenarios in parallel.
+
+    Each scenario is evaluated in a worker process.  The workers are forked
+    after the base plan is loaded, so they share it copy-on-write; only the
+    scenarios and their results are sent between processes.
+
+    @param processes: The number of worker processes to use, C{None} for one
+        per CPU, or C{1} to evaluate the scenarios in this process.
+
+    @return: A C{list} of L{ScenarioResult}s, in the order of C{scenarios}.
+    """
+    global _scenarioBase
+    if processes == 1:
+        return [
+            evaluate_scenario(crops, seeds, scenario)
+            for scenario in scenarios]
+
+    from multiprocessing import Pool
+
+    _scenarioBase = (crops, seeds)
+    pool = Pool(processes)
+    try:
+        return pool.map(_evaluate_base_scenario, scenarios)
+    finally:
+        pool.close()
+        pool.join()
+        _scenarioBase = None
+
+
+
+def summarize_scenarios(results):
+    """
+    Print a table comparing the results of several scenarios, followed by the
+    harvest in each week for each of them.
+    """
+    print '%-20s %10s %8s %9s %6s %10s' % (
+        'Scenario', 'Order', 'Peak day', 'Peak week', 'Flats', 'Harvest')
+    for result in results:
+        print '%-20s %10s %8.1f %9.1f %6d %10.1f' % (
+            result.scenario.name[:20], '$%.2f' % (result.order_cost,),
+            result.peak_day_hours.total_seconds() / 3600,
+            result.peak_week_hours.total_seconds() / 3600,
+            result.peak_flats,
+            sum(pounds for (week, pounds) in result.harvest))
+
+    print
+    print 'Pounds harvested per week'
+    print '%-5s' % ('Week',) + ''.join([
+            ' %10s' % (result.scenario.name[:10],) for result in results])
+    harvests = [dict(result.harvest) for result in results]
+    weeks = sorted(set(chain(*harvests)))
+    for week in weeks:
+        print '%02d/%02d' % (week.month, week.day) + ''.join([
+                ' %10.1f' % (harvest.get(week, 0),) for harvest in harvests])
+
+
+
+class Succession(record('seed fresh_generations intergenerational_weeks '
+                        'error'),
+                 ComparableRecord):
+    """
+    A way to succession plant the fresh eating produce of a seed variety.
+
+    @ivar fresh_generations: The number of generations to plant for fresh
+        eating.
+
+    @ivar intergenerational_weeks: The number of weeks between the
+        generations, or C{None} for a single generation.
+
+    @ivar error: The sum of the squares of the differences between the pounds
+        harvested each week and the pounds wanted, or C{None} if it cannot be
+        worked out.
+    """
+
+
+
+class HarvestCurves(object):
+    """
+    The shapes of the harvests of successions of plantings, remembered so
+    that each is only worked out once, however many seed varieties share it.
+
+    Weeks are counted from the first day the first generation of a succession
+    can be harvested.  Generations are planted whole weeks apart, so the
+    harvest of a later generation is the harvest of the first one moved by a
+    whole number of weeks, and the curve of a succession is the curve of one
+    with a generation fewer plus that.
+    """
+    def __init__(self):
+        self._curves = {}
+
+
+    def curve(self, duration, weeks, generations):
+        """
+        Find the pounds harvested each week from a succession of plantings
+        each yielding one pound, harvested evenly over C{duration} days.
+
+        @param weeks: The number of weeks between generations.
+
+        @return: A C{tuple} of the pounds harvested each week.
+        """
+        key = (duration, weeks, generations)
+        curve = self._curves.get(key)
+        if curve is None:
+            if generations == 1:
+                curve = tuple([
+                    (min(duration, 7 * (week + 1)) - 7 * week) /
+                    float(duration)
+                    for week in range((duration + 6) // 7)])
+            else:
+                earlier = self.curve(duration, weeks, generations - 1)
+                latest = ((0.0,) * (weeks * (generations - 1)) +
+                          self.curve(duration, weeks, 1))
+                earlier += (0.0,) * (len(latest) - len(earlier))
+                curve = tuple([
+                    pounds + (latest[week] if week < len(latest) else 0.0)
+                    for (week, pounds) in enumerate(earlier)])
+            self._curves[key] = curve
+        return curve
+
+
+
+def _succession_error(curve, pounds, wanted, weeks):
+    """
+    Compare a harvest to the pounds wanted each week.
+
+    @param curve: A harvest curve from L{HarvestCurves.curve}.
+
+    @param pounds: The pounds harvested from each generation.
+
+    @param wanted: The pounds wanted each week.
+
+    @param weeks: The number of weeks they are wanted for.
+
+    @return: The sum of the squares of the differences between the pounds
+        harvested and wanted each week.
+    """
+    error = 0.0
+    for week in range(max(len(curve), weeks)):
+        harvested = 0.0
+        if week < len(curve):
+            harvested = pounds * curve[week]
+        if week < weeks:
+            harvested -= wanted
+        error += harvested ** 2
+    return error
+
+
+
+def optimize_succession(seed, curves, max_generations=12, max_weeks=8,
+                        improvement=0.1):
+    """
+    Search for the number of fresh eating generations of a seed variety, and
+    the number of weeks between them, which harvest closest to its share of
+    the pounds of its crop wanted each week it is eaten fresh.
+
+    Generations are put outside from C{beginning_of_season} on, and may only
+    be harvested before C{end_of_season}.  Each is harvested evenly over
+    C{harvest_duration} days.  Storage generations are left as they are, but
+    share the seed variety's bed feet with the fresh ones as usual.
+
+    @param curves: The L{HarvestCurves} to use.
+
+    @param improvement: How much, as a fraction of the error of the best
+        succession with fewer generations, a succession with more generations
+        must reduce the error by to be chosen instead.  Every generation is
+        more work, so fewer are better unless more are much better.
+
+    @return: A two-tuple of the L{Succession} the seed variety is planted with
+        now and the best L{Succession} found, or C{None} if the seed variety
+        is not planned well enough to search, or is only planted for storage.
+    """
+    crop = seed.crop
+    if (seed.beginning_of_season is None or seed.greenhouse_days is None or
+        seed.maturity_days is None or crop.yield_lbs_per_bed_foot is None or
+        not crop.fresh_eating_lbs or not crop.fresh_eating_weeks or
+        not seed.bed_feet):
+        return None
+    if seed.fresh_generations is None and seed.storage_generations is None:
+        generations = 1
+    else:
+        generations = seed.fresh_generations or 0
+        if generations == 0:
+            return None
+
+    share = float(seed.parts_per_crop) / sum(
+        variety.parts_per_crop for variety in crop.varieties)
+    wanted = crop.fresh_eating_lbs * share
+    weeks = int(round(crop.fresh_eating_weeks))
+    total = seed.bed_feet * crop.yield_lbs_per_bed_foot
+    storage = seed.storage_generations or 0
+    duration = int(seed.harvest_duration or 1)
+    first = seed.beginning_of_season + seed.maturity_days - seed.greenhouse_days
+
+    def error(generations, interval):
+        curve = curves.curve(duration, interval or 0, generations)
+        return _succession_error(
+            curve, total / (generations + storage), wanted, weeks)
+
+    interval = seed.intergenerational_weeks
+    if generations > 1 and interval is None:
+        current = Succession(seed, generations, interval, None)
+    else:
+        current = Succession(
+            seed, generations, interval, error(generations, interval))
+
+    best = Succession(seed, 1, None, error(1, None))
+    for generations in range(2, max_generations + 1):
+        candidate = None
+        for interval in range(1, max_weeks + 1):
+            last = first + 7 * interval * (generations - 1)
+            if (seed.end_of_season is not None and
+                last > seed.end_of_season):
+                break
+            succession = Succession(
+                seed, generations, interval, error(generations, interval))
+            if candidate is None or succession.error < candidate.error:
+                candidate = succession
+        if (candidate is not None and
+            candidate.error < best.error * (1 - improvement)):
+            best = candidate
+    return current, best
+
+
+
+def optimize_successions(seeds, max_generations=12, max_weeks=8):
+    """
+    Search for the best succession planting of each of several seed
+    varieties with L{optimize_succession}, sharing the harvest curves between
+    them.
+
+    @return: A C{list} of the two-tuples L{optimize_succession} gives, for the
+        seed varieties which could be searched.
+    """
+    curves = HarvestCurves()
+    results = []
+    for seed in seeds:
+        result = optimize_succession(
+            seed, curves, max_generations, max_weeks)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+
+def summarize_successions(results):
+    """
+    Print the succession planting of each seed variety now and the best one
+    found, with how far each is from the harvest wanted.
+    """
+    def describe(succession):
+        if (succession.intergenerational_weeks is None or
+            succession.fresh_generations == 1):
+            return '%d' % (succession.fresh_generations,)
+        return '%d every %d wk' % (
+            succession.fresh_generations,
+            succession.intergenerational_weeks)
+
+    def error(succession):
+        if succession.error is None:
+            return '?'
+        return '%.1f' % (succession.error,)
+
+    print '%-12s %-20s %-14s %10s %-14s %10s' % (
+        'Crop', 'Variety', 'Now', 'Error', 'Best', 'Error')
+    for (current, best) in results:
+        print '%-12s %-20s %-14s %10s %-14s %10s' % (
+            current.seed.crop.name[:12], current.seed.variety[:20],
+            describe(current), error(current), describe(best), error(best))
+
+
+
+class LivePlan(object):
+    """
+    A crop plan which stays loaded in memory, and is brought up to date when
+    its input files change, for use by long-running processes.
+
+    Only the tasks for seed varieties which actually changed are re-created,
+    and each rendering of the schedule is kept until the next change.
+
+    @ivar cropPath: A L{FilePath} for the crop CSV, as accepted by
+        L{load_crops}.
+    @ivar seedPath: A L{FilePath} for the seed variety CSV, as accepted by
+        L{load_seeds}.
+
+    @ivar crops: The C{dict} of L{Crop} instances most recently loaded.
+    @ivar seeds: The C{list} of L{Seed} instances most recently loaded.
+    @ivar schedule: The C{list} of scheduled L{ITask} providers for the most
+        recently loaded plan.
+
+    @ivar daylight: The L{Daylight} for the place the plan is grown.
+
+    @ivar horizon: C{None} to schedule the whole plan, or the number of weeks
+        from today to schedule in detail with L{schedule_horizon}.  Then
+        C{schedule} only covers those weeks, and is worked out again when the
+        day changes.
+
+    @ivar estimate: The C{list} of L{WeekEstimate} for the weeks past the
+        horizon, empty if the whole plan is scheduled.
+
+    @ivar today: A no-argument callable returning the current
+        L{datetime.date}.
+    """
+    def __init__(self, cropPath, seedPath, maxManHours=timedelta(hours=5),
+                 daylight=DAYLIGHT, horizon=None, today=date.today):
+        self.cropPath = cropPath
+        self.seedPath = seedPath
+        self.maxManHours = maxManHours
+        self.daylight = daylight
+        self.horizon = horizon
+        self.today = today
+        self.estimate = []
+        # The tasks of the plan ordered by when, and the day the horizon was
+        # last scheduled from, in horizon mode.
+        self._tasks = None
+        self._start = None
+        self._modificationTimes = None
+        # Map (crop name, variety, occurrence) to a tuple of the seed, its bed
+        # feet, and the tasks created for it.
+        self._seedTasks = {}
+        self._schedule = None
+        self._rendered = {}
+        self.poll()
+
+
+    def _getModificationTimes(self):
+        times = []
+        for path in [self.cropPath, self.seedPath]:
+            path.changed()
+            times.append(path.getModificationTime())
+        return times
+
+
+    def poll(self):
+        """
+        Check the input files for changes and reload the plan if there are any.
+
+        If the changed files cannot be loaded (for example, because they are
+        only half saved), the error is logged and the previous plan is kept.
+        Loading is tried again on the next poll.  The first load happens when
+        the plan is created, and its errors are raised, since there is no
+        previous plan to keep.
+
+        @return: C{True} if the plan was reloaded, C{False} otherwise.
+        """
+        times = self._getModificationTimes()
+        if times == self._modificationTimes:
+            return False
+        if self._modificationTimes is None:
+            self._reload()
+        else:
+            try:
+                self._reload()
+            except Exception:
+                err(None, "Could not reload the crop plan")
+                return False
+        self._modificationTimes = times
+        return True
+
+
+    def _reload(self):
+        crops = load_crops(self.cropPath)
+        seeds = load_seeds(self.seedPath, crops)
+        self.crops = crops
+        self.seeds = seeds
+        for seed in self.seeds:
+            seed.daylight = self.daylight
+
+        seedTasks = {}
+        occurrences = defaultdict(int)
+        added = []
+        for seed in self.seeds:
+            key = (seed.crop.name, seed.variety)
+            occurrences[key] += 1
+            key += (occurrences[key],)
+
+            # A seed's tasks depend on the seed itself, its crop, and (through
+            # bed_feet) on its sibling varieties.  Comparing the first two and
+            # bed_feet covers all of that.
+            bed_feet = seed.bed_feet
+            cached = self._seedTasks.get(key)
+            if cached is None or cached[0] != seed or cached[1] != bed_feet:
+                cached = (seed, bed_feet, _create_seed_tasks(seed))
+                added.extend(cached[2])
+            seedTasks[key] = cached
+
+        removed = []
+        for key, cached in self._seedTasks.iteritems():
+            if seedTasks.get(key) is not cached:
+                removed.extend(cached[2])
+        self._seedTasks = seedTasks
+
+        if self.horizon is not None:
+            # Scheduling the horizon is cheap, so there is no need to keep the
+            # full schedule up to date.
+            tasks = [
+                task for cached in seedTasks.itervalues()
+                for task in cached[2]]
+            tasks.sort(key=lambda task: task.when)
+            self._tasks = tasks
+            self._start = None
+            self._refresh()
+            return
+
+        if self._schedule is None:
+            added.sort(key=lambda event: event.when)
+            self._schedule = Schedule(added, self.maxManHours)
+        else:
+            # Only the days from the earliest changed task onward need to be
+            # scheduled again.
+            self._schedule = self._schedule.change(removed, added)
+        self.schedule = self._schedule.events
+        self._rendered = {}
+
+
+    def _refresh(self):
+        """
+        Schedule the weeks from today on again in horizon mode, if that has
+        not yet been done today.
+        """
+        if self.horizon is None:
+            return
+        today = self.today()
+        if today != self._start:
+            result = schedule_horizon(
+                self._tasks, today, self.horizon, self.maxManHours)
+            self._start = today
+            self.schedule = result.events
+            self.estimate = result.estimate
+            self._rendered = {}
+
+
+    def render(self, format):
+        """
+        Render the current schedule in one of the L{SCHEDULE_FORMATS}, or
+        render the estimate of the weeks past the horizon if C{format} is
+        C{"estimate"}.
+
+        @return: A C{str} giving the rendered schedule.
+        """
+        self._refresh()
+        if format not in self._rendered:
+            if format == 'estimate':
+                rendered = render_schedule(summarize_horizon, self.estimate)
+            else:
+                rendered = render_schedule(
+                    SCHEDULE_FORMATS[format], self.schedule)
+            self._rendered[format] = rendered
+        return self._rendered[format]
+
+
+
 SHORTENED = {
     SeedFlats: 'S',
     DirectSeed: 'D',
@@ -1434,25 +5648,120 @@ def main(args=None):
     options.parseOptions(args)
 
     crops = load_crops(options['crop-path'])
-    seeds = load_seeds(options['seed-path'], crops)
+    seeds = load_seeds(options['seed-path'], crops, options['years'][0])
+    daylight = Daylight(
+        options['latitude'], FilePath(options['daylight-cache']))
+    for seed in seeds:
+        seed.degree_days = options['temperatures']
+        seed.daylight = daylight
 
     options['crops'](crops)
 
+    if options['scenarios'] is not None:
+        summarize_scenarios(
+            compare_scenarios(crops, seeds, options['scenarios']))
+        return
+
+    if options['successions']:
+        summarize_successions(
+            optimize_successions(seeds, options['max-generations']))
+        return
+
+    if options['simulate'] is not None:
+        from simulation import Uncertainty, simulate, summarize_simulation
+
+        variation = {}
+        for (option, name) in [('maturity-spread', 'maturity_days'),
+                               ('failure-rate', 'failure_rate'),
+                               ('yield-spread', 'yield_deviation')]:
+            if options[option] is not None:
+                variation[name] = options[option]
+        maxManHours = None
+        if options['simulate-schedules']:
+            maxManHours = timedelta(hours=5)
+        summarize_simulation(simulate(
+                seeds, options['simulate'], Uncertainty(**variation),
+                options['random-seed'], maxManHours))
+        return
+
     order = make_order(crops, seeds)
 
     options['order'](order)
 
-    tasks = create_tasks(crops, seeds)
-    schedule = schedule_tasks(tasks)
+    if options['offers'] is not None:
+        summarize_vendor_order(make_vendor_order(
+                seeds, load_offers(options['offers'], seeds),
+                options['vendors'] or {}))
+
+    recurrence = None
+    if options['weeding'] is not None or options['picking'] is not None:
+        recurrence = Recurrence(options['weeding'], options['picking'])
+    if options['stream']:
+        tasks = iter_tasks(seeds, options['years'], recurrence)
+    else:
+        tasks = create_tasks(crops, seeds, options['years'], recurrence)
+    if options['bed-feet'] is not None:
+        tasks, unfit = fit_beds(tasks, options['bed-feet'])
+        for planting in unfit:
+            print 'No room in season for', planting
+    if options['stream']:
+        days = iter_schedule(
+            tasks, calendar=options['calendar'], flats=options['greenhouse'],
+            coalesce=options['coalesce'])
+        options['schedule'](
+            chain.from_iterable(events for (day, events) in days))
+        schedule = None
+    elif options['horizon'] is not None:
+        result = schedule_horizon(
+            tasks, options['start'] or date.today(), options['horizon'],
+            calendar=options['calendar'], flats=options['greenhouse'])
+        summarize_horizon(result.estimate)
+        if options['coalesce']:
+            schedule = coalesce_fragments(result.events, result.sources)
+        else:
+            schedule = result.events
+    elif options['deadlines']:
+        result = schedule_deadlines(tasks, calendar=options['calendar'])
+        summarize_missed(result.missed)
+        if options['coalesce']:
+            schedule = coalesce_fragments(result.events, result.sources)
+        else:
+            schedule = result.events
+    elif options['crew'] is None:
+        schedule = Schedule(
+            tasks, calendar=options['calendar'], flats=options['greenhouse'],
+            years=options['years'], recurrence=recurrence)
+        if options['optimize'] is not None:
+            schedule = optimize_schedule(
+                schedule, options['optimize'], options['coalesce'])
+        elif options['coalesce']:
+            schedule = coalesce_fragments(schedule.events, schedule.sources)
+        else:
+            schedule = schedule.events
+    else:
+        assignments = schedule_crew(tasks, options['crew'])
+        schedule_crew_plaintext(assignments)
+        schedule = [assignment.task for assignment in assignments]
     display_schedule = options['schedule']
-    if display_schedule is not None:
+    if display_schedule is not None and schedule is not None:
         display_schedule(schedule)
+    if schedule is not None:
+        summarize_overrun(schedule, options['years'])
 
     options['flats'](schedule)
     if options['beds']:
         summarize_beds(schedule)
+    if options['bed-map'] is not None:
+        placements, unplaced = assign_beds(tasks, options['bed-map'])
+        bed_timeline(placements)
+        for planting in unplaced:
+            print 'No room for', planting
     if options['yields']:
         summarize_yields(schedule)
+    if options['forecast'] is not None:
+        from forecast import FORECAST_FORMATS, forecast_yields
+        FORECAST_FORMATS[options['forecast']](forecast_yields(
+                [event for event in schedule if isinstance(event, Harvest)]))
 
 
 if __name__ == '__main__':
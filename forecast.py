@@ -0,0 +1,139 @@
+# Copyright Jean-Paul Calderone.  See LICENSE file for details.
+
+"""
+Forecasts of the pounds of each crop harvested each week.
+
+A planting is not harvested all on one day.  Each L{cropplan.Harvest} in a
+schedule is spread evenly over the harvest window of its seed variety (or, for
+one of several pickings, over the days until the next), and the pounds
+harvested each day are added up by crop and by week with NumPy, all of the
+harvests at once.
+"""
+
+import sys
+
+from csv import writer
+from json import dump
+from datetime import timedelta
+
+import numpy
+
+
+
+class YieldForecast(object):
+    """
+    The pounds of each crop expected to be harvested each week.
+
+    @ivar weeks: A C{list} of the L{datetime.date} of the Monday starting each
+        week.
+
+    @ivar crops: A C{list} of the names of the crops, in order.
+
+    @ivar pounds: An array with a row for each crop and a column for each
+        week.
+    """
+    def __init__(self, weeks, crops, pounds):
+        self.weeks = weeks
+        self.crops = crops
+        self.pounds = pounds
+
+
+
+def harvest_days(seed):
+    """
+    Find the number of days a planting of C{seed} is harvested over: its
+    C{harvest_duration}, or if that is not known, the C{harvest_weeks} of its
+    crop, or if that is not known either, one day.
+    """
+    if seed.harvest_duration:
+        return int(seed.harvest_duration)
+    if seed.crop.harvest_weeks:
+        return int(seed.crop.harvest_weeks * 7)
+    return 1
+
+
+
+def forecast_yields(harvests):
+    """
+    Forecast the pounds of each crop harvested each week of a schedule.
+
+    @param harvests: A C{list} of the scheduled L{cropplan.Harvest} tasks.
+
+    @return: A L{YieldForecast} covering every week anything is harvested.
+    """
+    if not harvests:
+        return YieldForecast([], [], numpy.zeros((0, 0)))
+
+    crops = sorted(set(task.seed.crop.name for task in harvests))
+    rows = dict((name, row) for (row, name) in enumerate(crops))
+    first = min(task.when.date() for task in harvests)
+    monday = first - timedelta(days=first.weekday())
+
+    crop = numpy.array([rows[task.seed.crop.name] for task in harvests])
+    start = numpy.array(
+        [(task.when.date() - monday).days for task in harvests])
+    length = numpy.array([
+            task.pick_days or harvest_days(task.seed) for task in harvests])
+    pounds = numpy.array([
+            (task.seed.crop.yield_lbs_per_bed_foot or 0) * task.quantity
+            for task in harvests])
+
+    # Each harvest adds its pounds per day from its first day on, and takes
+    # them away again the day after its last, so the running total across the
+    # days is the pounds harvested each day.
+    weeks = -(-(start + length).max() // 7)
+    daily = numpy.zeros((len(crops), weeks * 7 + 1))
+    rate = pounds / length
+    numpy.add.at(daily, (crop, start), rate)
+    numpy.add.at(daily, (crop, start + length), -rate)
+    daily = numpy.cumsum(daily[:, :-1], axis=1)
+    # Rounding leaves crumbs behind once a harvest is over.
+    daily[numpy.abs(daily) < 1e-9] = 0
+
+    return YieldForecast(
+        [monday + timedelta(weeks=week) for week in range(weeks)],
+        crops, daily.reshape(len(crops), weeks, 7).sum(axis=2))
+
+
+
+def forecast_text(forecast):
+    """
+    Print the pounds harvested in each week, and of each crop in it.
+    """
+    for (column, week) in enumerate(forecast.weeks):
+        pounds = forecast.pounds[:, column]
+        print 'Week of %02d/%02d: %.1f lbs' % (
+            week.month, week.day, pounds.sum())
+        for (name, harvested) in zip(forecast.crops, pounds.tolist()):
+            if harvested:
+                print '    %-20s %8.1f' % (name, harvested)
+
+
+
+def forecast_csv(forecast):
+    """
+    Write a CSV file with a row for each crop and a column for each week.
+    """
+    w = writer(sys.stdout)
+    w.writerow(
+        ['crop'] +
+        ['%02d/%02d' % (week.month, week.day) for week in forecast.weeks])
+    for (name, pounds) in zip(forecast.crops, forecast.pounds.tolist()):
+        w.writerow([name] + ['%.2f' % (harvested,) for harvested in pounds])
+
+
+
+def forecast_json(forecast):
+    """
+    Write a JSON object with the weeks (as ISO 8601 dates) and, for each crop,
+    the pounds harvested each of those weeks.
+    """
+    dump({'weeks': [week.isoformat() for week in forecast.weeks],
+          'crops': dict(zip(forecast.crops, forecast.pounds.tolist()))},
+         sys.stdout, sort_keys=True)
+    sys.stdout.write('\n')
+
+
+
+FORECAST_FORMATS = dict(
+    text=forecast_text, csv=forecast_csv, json=forecast_json)
@@ -4,12 +4,25 @@
 Bazaar plugin for automatically writing out an updated iCalendar schedule.
 """
 
-import sys, os, tempfile
+import sys, os
+
+from hashlib import sha1
+from StringIO import StringIO
 
 from bzrlib import branch
+from bzrlib.workingtree import WorkingTree
 
 from twisted.python.filepath import FilePath
 
+# The modules in the branch which the schedule is computed with, in the order
+# they must be reloaded so each sees the fresh versions of those it imports.
+PLAN_MODULES = ['cropplan', 'tasktable', 'simulation', 'forecast']
+
+# The files in the branch which determine the content of the schedule.  If none
+# of these changed, there is no need to regenerate anything.
+PLAN_INPUTS = [name + '.py' for name in PLAN_MODULES] + [
+    '2012 Crop Plan.csv', '2012 Crop Plan - Varieties.csv']
+
 
 def post_change_branch_tip(params):
     conf = params.branch.get_config()
@@ -17,49 +30,92 @@ def post_change_branch_tip(params):
     if not conf.get_user_option('farm-schedule:enabled'):
         return
     destination = conf.get_user_option('farm-schedule:destination')
-    destination = os.path.expanduser(destination)
-
+    destination = FilePath(os.path.expanduser(destination))
+
+    checkout = conf.get_user_option('farm-schedule:checkout')
+    if checkout is None:
+        checkout = '~/.farm-schedule-checkout'
+    checkout = os.path.expanduser(checkout)
+
+    digest = hash_inputs(params.branch, params.new_revid)
+    digestPath = destination.siblingExtension('.sha1')
+    if destination.exists() and digestPath.exists():
+        if digestPath.getContent() == digest:
+            sys.stderr.write('Plan inputs unchanged, not writing schedule\n')
+            return
+
+    sys.stderr.write('Updating code...\n')
+    cropplan = make_importable(params.branch, checkout)
+    sys.stderr.write('Writing schedule...\n')
+    write_schedule(cropplan, destination)
+    digestPath.setContent(digest)
+    sys.stderr.write('Done\n')
+
+
+def hash_inputs(branch, revid):
+    """
+    Compute a digest of the contents of L{PLAN_INPUTS} as of the given
+    revision, without needing a working tree for it.
+    """
+    digest = sha1()
+    tree = branch.repository.revision_tree(revid)
+    tree.lock_read()
     try:
-        checkout = tempfile.mktemp()
-        sys.stderr.write('Updating code...\n')
-        make_importable(params.branch, checkout)
-        sys.stderr.write('Writing schedule...\n')
-        write_schedule(destination)
-        sys.stderr.write('Done\n')
+        for path in PLAN_INPUTS:
+            digest.update(path + '\0')
+            fileID = tree.path2id(path)
+            if fileID is not None:
+                digest.update(tree.get_file_text(fileID))
+            digest.update('\0')
     finally:
-        FilePath(checkout).remove()
+        tree.unlock()
+    return digest.hexdigest()
 
 
 def make_importable(branch, checkout):
-    branch.create_checkout(to_location=checkout, lightweight=True)
-    sys.path.append(checkout)
-    return checkout
-
-
-def write_schedule(destination):
-    from cropplan import (
-        __file__, load_crops, load_seeds, create_tasks, schedule_tasks,
-        schedule_ical)
-
-    HERE = FilePath(__file__).realpath().parent()
+    """
+    Bring the lightweight checkout at C{checkout} up to date with C{branch},
+    creating it first if necessary, and import the version of L{cropplan} it
+    contains.  Any of L{PLAN_MODULES} imported by an earlier run are reloaded
+    too, so none of them is left stale.
+    """
+    if os.path.exists(checkout):
+        WorkingTree.open(checkout).update()
+    else:
+        branch.create_checkout(to_location=checkout, lightweight=True)
+    if checkout not in sys.path:
+        sys.path.append(checkout)
+    import cropplan
+    for name in PLAN_MODULES:
+        if name in sys.modules:
+            reload(sys.modules[name])
+    return sys.modules['cropplan']
+
+
+def write_schedule(cropplan, destination):
+    HERE = FilePath(cropplan.__file__).realpath().parent()
     CROP_PLAN = HERE.child('2012 Crop Plan.csv')
     CROP_VARIETIES = HERE.child('2012 Crop Plan - Varieties.csv')
 
-    crops = load_crops(CROP_PLAN)
+    crops = cropplan.load_crops(CROP_PLAN)
     sys.stderr.write('Loaded %d crops...\n' % (len(crops),))
-    seeds = load_seeds(CROP_VARIETIES, crops)
+    seeds = cropplan.load_seeds(CROP_VARIETIES, crops)
     sys.stderr.write('Loaded %d seeds...\n' % (len(seeds),))
-    tasks = create_tasks(crops, seeds)
-    schedule = schedule_tasks(tasks)
+    tasks = cropplan.create_tasks(crops, seeds)
+    schedule = cropplan.schedule_tasks(tasks)
 
-    output = file(destination, 'w')
+    output = StringIO()
     stdout = sys.stdout
     try:
         sys.stdout = output
-        schedule_ical(schedule)
+        cropplan.schedule_ical(schedule)
     finally:
         sys.stdout = stdout
 
+    # setContent writes to a temporary file and renames it over the
+    # destination, so readers only ever see a complete calendar.
+    destination.setContent(output.getvalue())
+
 
 branch.Branch.hooks.install_named_hook(
     'post_change_branch_tip', post_change_branch_tip, 'deployment restart')
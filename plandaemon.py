@@ -0,0 +1,118 @@
+# Copyright Jean-Paul Calderone.  See LICENSE file for details.
+
+"""
+Serve the schedule for a crop plan over HTTP, keeping the plan loaded in
+memory and reloading it whenever the plan CSVs change.
+
+Run it like::
+
+    python plandaemon.py '2012 Crop Plan.csv' '2012 Crop Plan - Varieties.csv'
+
+and then fetch C{/schedule.txt}, C{/schedule-table.txt}, C{/schedule.csv}, or
+C{/farm-schedule.ics} from it.
+
+With C{--horizon}, only the next few weeks are scheduled, which is much
+quicker for large plans, and C{/estimate.txt} gives an estimate of the work in
+each week after that.
+"""
+
+from sys import argv, stdout
+
+from twisted.python.log import startLogging
+from twisted.python.filepath import FilePath
+from twisted.python.usage import Options
+from twisted.internet.task import LoopingCall
+from twisted.internet.endpoints import serverFromString
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from cropplan import LATITUDE, DAYLIGHT_CACHE, Daylight, LivePlan
+
+# Map the URL of each kind of output to the LivePlan format which renders it
+# and the content type to serve it with.
+OUTPUTS = {
+    'schedule.txt': ('text', 'text/plain'),
+    'schedule-table.txt': ('table', 'text/plain'),
+    'schedule.csv': ('csv', 'text/csv'),
+    'farm-schedule.ics': ('ical', 'text/calendar'),
+    'estimate.txt': ('estimate', 'text/plain'),
+    }
+
+
+
+class RenderedSchedule(Resource):
+    """
+    One rendering of the schedule of a L{LivePlan}.
+    """
+    isLeaf = True
+
+    def __init__(self, plan, format, contentType):
+        Resource.__init__(self)
+        self.plan = plan
+        self.format = format
+        self.contentType = contentType
+
+
+    def render_GET(self, request):
+        request.setHeader('content-type', self.contentType)
+        return self.plan.render(self.format)
+
+
+
+def plan_resource(plan):
+    """
+    Create a resource with a child for each of the L{OUTPUTS} of C{plan}.
+    """
+    root = Resource()
+    for name, (format, contentType) in OUTPUTS.iteritems():
+        root.putChild(name, RenderedSchedule(plan, format, contentType))
+    return root
+
+
+
+class PlanDaemonOptions(Options):
+    optParameters = [
+        ('port', None, 'tcp:8080:interface=127.0.0.1',
+         'Endpoint description of the address to serve the schedule on.'),
+        ('interval', None, 5.0,
+         'Number of seconds between checks for changes to the plan.', float),
+        ('latitude', None, LATITUDE,
+         'The latitude of the farm, in degrees north, for working out day '
+         'lengths.',
+         float),
+        ('horizon', None, None,
+         'Schedule only the given number of weeks from today, and estimate '
+         'the work in each week after that.',
+         int),
+        ]
+
+    def parseArgs(self, crop, seed):
+        self['crop-path'] = FilePath(crop)
+        self['seed-path'] = FilePath(seed)
+
+
+
+def main(args=None):
+    from twisted.internet import reactor
+
+    if args is None:
+        args = argv[1:]
+
+    options = PlanDaemonOptions()
+    options.parseOptions(args)
+
+    startLogging(stdout)
+
+    plan = LivePlan(
+        options['crop-path'], options['seed-path'],
+        daylight=Daylight(options['latitude'], DAYLIGHT_CACHE),
+        horizon=options['horizon'])
+    LoopingCall(plan.poll).start(options['interval'], now=False)
+
+    endpoint = serverFromString(reactor, options['port'])
+    endpoint.listen(Site(plan_resource(plan)))
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+# Copyright Jean-Paul Calderone.  See LICENSE file for details.
+
+"""
+Monte Carlo simulation of how a crop plan might turn out, given how much the
+time plantings take to mature, whether they come up at all, and how much they
+yield vary from season to season.
+
+Each simulated season draws a maturity offset, a failure and a yield
+multiplier for every planting.  The quick way to simulate a season is to move
+the harvests of the L{TaskTable} for the plan, which is done for a whole batch
+of seasons at once with NumPy.  The exact way runs the L{Schedule} for every
+season, to account for harvests which have to wait for time to do them.
+"""
+
+from datetime import date, timedelta
+from collections import defaultdict
+
+import numpy
+
+from epsilon.structlike import record
+
+from cropplan import YEAR, Harvest, ComparableRecord, Schedule
+from tasktable import HARVEST, TaskTable, create_task_table
+
+# Seasons are simulated in batches of this many, each batch with its own
+# random number generator seeded with the simulation's seed and the number of
+# the batch.  The results are the same however many processes are used.
+BATCH = 100
+
+
+
+class Uncertainty(record('maturity_days failure_rate yield_deviation',
+                         maturity_days=7.0, failure_rate=0.05,
+                         yield_deviation=0.25),
+                  ComparableRecord):
+    """
+    How much the outcome of each planting varies.
+
+    @ivar maturity_days: The standard deviation, in days, of the time
+        plantings take to mature.  Harvests are moved by a normally
+        distributed number of days.
+
+    @ivar failure_rate: The probability that a planting fails (for example,
+        because it does not germinate) and is never harvested.
+
+    @ivar yield_deviation: The standard deviation of a normally distributed
+        multiplier of the expected yield of each planting.  Multipliers below
+        C{0} are taken as C{0}.
+    """
+
+
+
+class SimulationResult(object):
+    """
+    The harvest and labor in each week of many simulated seasons.
+
+    @ivar weeks: A C{list} of the L{datetime.date} of the Monday starting each
+        week.
+
+    @ivar harvest: An array of the pounds harvested, with a row for each
+        season and a column for each week.
+
+    @ivar labor: An array of the hours of work, shaped like C{harvest}.
+    """
+    def __init__(self, weeks, harvest, labor):
+        self.weeks = weeks
+        self.harvest = harvest
+        self.labor = labor
+
+
+    def percentiles(self, values, percentiles):
+        """
+        Find percentiles of the seasons for each week.
+
+        @param values: C{self.harvest} or C{self.labor}.
+
+        @return: An array with a row for each of C{percentiles} and a column
+            for each week.
+        """
+        return numpy.percentile(values, percentiles, axis=0)
+
+
+
+class _Plan(object):
+    """
+    The parts of a L{TaskTable} needed to simulate seasons, worked out once.
+
+    @ivar hours: An array of the hours each task takes.
+    @ivar pounds: An array of the pounds each task is expected to harvest.
+    @ivar harvests: An array of the indices of the L{Harvest} tasks.
+    @ivar plantings: The number of plantings.
+    @ivar weekday: The weekday of the first day of L{YEAR}, to find the week
+        of a day from it.
+    """
+    def __init__(self, seeds):
+        self.table = table = create_task_table(seeds)
+        tasks = table.tasks()
+        self.hours = numpy.array(
+            [task.duration.total_seconds() / 3600 for task in tasks])
+        self.pounds = numpy.array(
+            [(task.seed.crop.yield_lbs_per_bed_foot or 0) *
+             getattr(task, 'quantity', 0)
+             for task in tasks])
+        self.harvests = numpy.flatnonzero(table.kind == HARVEST)
+        self.plantings = table.planting.max() + 1 if len(table) else 0
+        self.weekday = date(YEAR, 1, 1).weekday()
+
+
+    def draw(self, uncertainty, seed, batch, seasons):
+        """
+        Draw the outcome of every planting in a batch of seasons.
+
+        @return: A two-tuple of arrays with a row for each season and a column
+            for each planting, giving the days by which each planting's
+            harvest is moved and its yield multiplier (C{0} for plantings
+            which failed).
+        """
+        random = numpy.random.RandomState([seed, batch])
+        shape = (seasons, self.plantings)
+        offsets = numpy.rint(
+            random.normal(0, uncertainty.maturity_days, shape)).astype(int)
+        failed = random.random_sample(shape) < uncertainty.failure_rate
+        multipliers = numpy.maximum(
+            random.normal(1, uncertainty.yield_deviation, shape), 0)
+        multipliers[failed] = 0
+        return offsets, multipliers
+
+
+    def quick(self, offsets, multipliers):
+        """
+        Simulate seasons by moving the harvests of the plan, without
+        scheduling.
+
+        @return: A three-tuple of the first week, and arrays of the pounds
+            harvested and hours worked in each season and week.
+        """
+        seasons = len(offsets)
+        harvests = self.harvests
+        planting = self.table.planting[harvests]
+
+        day = numpy.tile(self.table.day, (seasons, 1))
+        day[:, harvests] += offsets[:, planting]
+        hours = numpy.tile(self.hours, (seasons, 1))
+        hours[:, harvests] *= multipliers[:, planting] > 0
+        pounds = numpy.zeros(day.shape)
+        pounds[:, harvests] = self.pounds[harvests] * multipliers[:, planting]
+
+        week = (day + self.weekday) // 7
+        return _by_week(week, pounds, hours)
+
+
+    def exact(self, offsets, multipliers, maxManHours):
+        """
+        Simulate seasons by scheduling the tasks of each one.
+
+        @return: Like L{quick}.
+        """
+        table = self.table
+        epoch = date(YEAR, 1, 1)
+        harvests = self.harvests
+        planting = table.planting[harvests]
+        seasons = []
+        for (offset, multiplier) in zip(offsets, multipliers):
+            day = table.day.copy()
+            day[harvests] += offset[planting]
+            # Failed plantings are never harvested.
+            keep = numpy.ones(len(table), dtype=bool)
+            keep[harvests] = multiplier[planting] > 0
+            moved = TaskTable(
+                table.seeds, table.kind[keep], table.seed[keep], day[keep],
+                table.quantity[keep], table.planting[keep]).sorted()
+            tasks = moved.tasks()
+            yields = dict(
+                (id(task), multiplier[group])
+                for (task, group) in zip(tasks, moved.planting.tolist())
+                if isinstance(task, Harvest))
+
+            totals = defaultdict(lambda: [0.0, 0.0])
+            schedule = Schedule(tasks, maxManHours)
+            for (event, source) in zip(schedule.events, schedule.sources):
+                week = ((event.date - epoch).days + self.weekday) // 7
+                if isinstance(event, Harvest):
+                    totals[week][0] += (
+                        (event.seed.crop.yield_lbs_per_bed_foot or 0) *
+                        event.quantity * yields[id(source)])
+                totals[week][1] += event.duration.total_seconds() / 3600
+            seasons.append(totals)
+
+        weeks = [week for totals in seasons for week in totals] or [0]
+        first = min(weeks)
+        pounds = numpy.zeros((len(seasons), max(weeks) - first + 1))
+        hours = numpy.zeros(pounds.shape)
+        for (row, totals) in enumerate(seasons):
+            for (week, (harvested, worked)) in totals.iteritems():
+                pounds[row, week - first] = harvested
+                hours[row, week - first] = worked
+        return first, pounds, hours
+
+
+
+def _by_week(week, pounds, hours):
+    """
+    Total the pounds and hours of each season by week.
+
+    @param week: An array with a row for each season giving the week of each
+        task in it.
+
+    @return: A three-tuple of the first week, and arrays of the pounds and
+        hours in each season and week from that one on.
+    """
+    seasons = len(week)
+    first = week.min()
+    width = week.max() - first + 1
+    index = (week - first) + numpy.arange(seasons)[:, None] * width
+    index = index.ravel()
+    totals = []
+    for values in [pounds, hours]:
+        totals.append(numpy.bincount(
+                index, values.ravel(), seasons * width).reshape(
+                seasons, width))
+    return first, totals[0], totals[1]
+
+
+
+# The plan and parameters being simulated, set in the parent process before
+# the worker processes are started so that they share them rather than each
+# being sent a copy.
+_simulated = None
+
+def _simulate_batch(batch):
+    plan, uncertainty, seed, maxManHours, seasons = _simulated
+    return _run_batch(plan, uncertainty, seed, maxManHours, batch, seasons)
+
+
+
+def _run_batch(plan, uncertainty, seed, maxManHours, batch, seasons):
+    """
+    Simulate one batch of seasons.
+    """
+    count = min(BATCH, seasons - batch * BATCH)
+    offsets, multipliers = plan.draw(uncertainty, seed, batch, count)
+    if maxManHours is None:
+        return plan.quick(offsets, multipliers)
+    return plan.exact(offsets, multipliers, maxManHours)
+
+
+
+def simulate(seeds, seasons, uncertainty=Uncertainty(), seed=0,
+             maxManHours=None, processes=None):
+    """
+    Simulate many seasons of a crop plan.
+
+    @param seeds: The L{Seed} instances making up the plan.
+
+    @param seasons: The number of seasons to simulate.
+
+    @param uncertainty: The L{Uncertainty} of each planting.
+
+    @param seed: The seed for the random number generators.  Simulations
+        with the same seed have the same outcome.
+
+    @param maxManHours: C{None} to simulate seasons quickly by moving the
+        harvests of the plan, or the hours of work available each day to
+        schedule the tasks of every season.
+    @type maxManHours: L{datetime.timedelta}
+
+    @param processes: The number of worker processes to use, C{None} for one
+        per CPU, or C{1} to simulate in this process.
+
+    @return: A L{SimulationResult}.
+    """
+    global _simulated
+    plan = _Plan(seeds)
+    batches = range((seasons + BATCH - 1) // BATCH)
+    if processes == 1:
+        results = [
+            _run_batch(plan, uncertainty, seed, maxManHours, batch, seasons)
+            for batch in batches]
+    else:
+        from multiprocessing import Pool
+
+        _simulated = (plan, uncertainty, seed, maxManHours, seasons)
+        pool = Pool(processes)
+        try:
+            results = pool.map(_simulate_batch, batches)
+        finally:
+            pool.close()
+            pool.join()
+            _simulated = None
+
+    first = min(result[0] for result in results)
+    last = max(result[0] + result[1].shape[1] for result in results)
+    harvest = numpy.zeros((seasons, last - first))
+    labor = numpy.zeros((seasons, last - first))
+    for (batch, (start, pounds, hours)) in zip(batches, results):
+        rows = slice(batch * BATCH, batch * BATCH + len(pounds))
+        columns = slice(start - first, start - first + pounds.shape[1])
+        harvest[rows, columns] = pounds
+        labor[rows, columns] = hours
+
+    monday = date(YEAR, 1, 1) - timedelta(days=date(YEAR, 1, 1).weekday())
+    weeks = [
+        monday + timedelta(weeks=week) for week in range(first, last)]
+    return SimulationResult(weeks, harvest, labor)
+
+
+
+def summarize_simulation(result, percentiles=(10, 50, 90)):
+    """
+    Print percentiles of the harvest and labor in each week of simulated
+    seasons.
+    """
+    harvest = result.percentiles(result.harvest, percentiles)
+    labor = result.percentiles(result.labor, percentiles)
+    labels = ' '.join(['%6s' % ('%dth' % (p,),) for p in percentiles])
+    print 'Week  Harvest (lbs) %s  Labor (hours) %s' % (labels, labels)
+    for (index, week) in enumerate(result.weeks):
+        print '%02d/%02d %13s %s  %13s %s' % (
+            week.month, week.day, '',
+            ' '.join(['%6.1f' % (value,) for value in harvest[:, index]]),
+            '',
+            ' '.join(['%6.1f' % (value,) for value in labor[:, index]]))
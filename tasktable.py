@@ -0,0 +1,305 @@
+# Copyright Jean-Paul Calderone.  See LICENSE file for details.
+
+"""
+A columnar representation of the tasks of a crop plan, for plans with very
+many varieties and successions.
+
+Instead of an L{ITask} provider for each task, a L{TaskTable} keeps one NumPy
+array for each attribute of the tasks.  L{create_task_table} fills these in
+for all of the generations of all of the seed varieties at once, and
+L{TaskTable.tasks} and L{task_table} convert to and from the L{ITask}
+providers the rest of L{cropplan} works with.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy
+
+from cropplan import (
+    YEAR, FinishPlanning, BedPreparation, SeedFlats, DirectSeed, Transplant,
+    Harvest, Weed, _plantings)
+
+# The task classes, indexed by the kind codes used in a TaskTable.
+KINDS = [
+    FinishPlanning, BedPreparation, SeedFlats, DirectSeed, Transplant, Harvest,
+    Weed]
+
+(FINISH_PLANNING, BED_PREPARATION, SEED_FLATS, DIRECT_SEED, TRANSPLANT,
+ HARVEST, WEED) = range(len(KINDS))
+
+# The order of the tasks of one planting made by cropplan.create_tasks, used
+# to break ties between tasks on the same day the same way it does.
+_RANKS = numpy.array([0, 0, 1, 2, 2, 3, 3])
+
+
+
+class TaskTable(object):
+    """
+    Tasks stored as parallel arrays, one element per task.
+
+    @ivar seeds: The C{list} of L{Seed} instances the tasks are for.
+
+    @ivar kind: An array of the index in L{KINDS} of the class of each task.
+
+    @ivar seed: An array of the index in C{seeds} of the seed variety of each
+        task.
+
+    @ivar day: An array of the day each task may first be done, counted from
+        the first day of L{YEAR}.
+
+    @ivar quantity: An array of the bed feet of each task.
+
+    @ivar planting: An array identifying the planting each task is part of.
+        The tasks of one planting depend on each other the same way as the
+        ones L{create_tasks} makes, including any weedings and pickings of a
+        L{cropplan.Recurrence}.  C{-1} for tasks which are not part of any
+        planting.
+    """
+    def __init__(self, seeds, kind, seed, day, quantity, planting):
+        self.seeds = seeds
+        self.kind = kind
+        self.seed = seed
+        self.day = day
+        self.quantity = quantity
+        self.planting = planting
+
+
+    def __len__(self):
+        return len(self.kind)
+
+
+    def sorted(self):
+        """
+        Put the tasks in the order L{cropplan.create_tasks} would.
+
+        @return: A new L{TaskTable}.
+        """
+        order = numpy.lexsort((
+                _RANKS[self.kind], self.planting, self.seed, self.day))
+        return TaskTable(
+            self.seeds, self.kind[order], self.seed[order], self.day[order],
+            self.quantity[order], self.planting[order])
+
+
+    def tasks(self):
+        """
+        Create an L{ITask} provider for each task, linked together by their
+        C{dependents}.
+
+        @return: A C{list} of L{ITask} providers in the order of the table.
+        """
+        epoch = datetime(YEAR, 1, 1)
+        seeds = self.seeds
+        tasks = []
+        byPlanting = {}
+        rows = zip(
+            self.kind.tolist(), self.seed.tolist(), self.day.tolist(),
+            self.quantity.tolist(), self.planting.tolist())
+        for (kind, seed, day, quantity, planting) in rows:
+            if kind == FINISH_PLANNING:
+                task = FinishPlanning(seeds[seed])
+            else:
+                task = KINDS[kind](
+                    epoch + timedelta(days=day), seeds[seed], quantity)
+            if planting != -1:
+                byPlanting.setdefault(planting, {}).setdefault(
+                    kind, []).append(task)
+            tasks.append(task)
+
+        for planting in byPlanting.itervalues():
+            _link(planting)
+        return tasks
+
+
+
+def _link(planting):
+    """
+    Set the C{dependents} of the tasks of one planting.
+
+    Weedings and harvests which recur (see L{cropplan.Recurrence}) each depend
+    on the one before, and several harvests are given the C{pick_days} they
+    were created with.
+
+    @param planting: A C{dict} mapping kind codes to C{list}s of the tasks of
+        that kind in a planting, in chronological order.
+    """
+    def first(kind):
+        return planting.get(kind, [None])[0]
+
+    preparation = first(BED_PREPARATION)
+    flats = first(SEED_FLATS)
+    sowing = first(TRANSPLANT) or first(DIRECT_SEED)
+    weeds = planting.get(WEED, [])
+    harvests = planting.get(HARVEST, [])
+    for recurring in [weeds, harvests]:
+        for (task, following) in zip(recurring, recurring[1:]):
+            task.dependents = (following,)
+    if len(harvests) > 1:
+        end = harvests[0].when + timedelta(
+            days=max(1, harvests[0].seed.harvest_duration or 0))
+        for (task, following) in zip(harvests, harvests[1:] + [None]):
+            if following is None:
+                until = end
+            else:
+                until = following.when
+            task.pick_days = max(1, (until - task.when).days)
+    if sowing is not None:
+        if preparation is not None:
+            preparation.dependents = (sowing,)
+        if flats is not None:
+            flats.dependents = (sowing,)
+        sowing.dependents = tuple(weeds[:1] + harvests[:1])
+
+
+
+def _column(seeds, name, dtype=int):
+    """
+    Gather one attribute of many seed varieties into an array, with C{None}
+    replaced by C{0}.
+    """
+    values = [getattr(seed, name) for seed in seeds]
+    return numpy.array(
+        [0 if value is None else value for value in values], dtype=dtype)
+
+
+
+def create_task_table(seeds):
+    """
+    Create the tasks for every generation of every seed variety, like
+    L{cropplan.create_tasks}.
+
+    Only the seed attributes are gathered one variety at a time.  The tasks
+    themselves are computed for all of the generations at once.
+
+    @return: A L{TaskTable} in the order L{cropplan.create_tasks} gives.
+    """
+    seeds = list(seeds)
+    unplanned = [
+        index for (index, seed) in enumerate(seeds)
+        if seed.beginning_of_season is None or seed.greenhouse_days is None]
+    unplannedSet = set(unplanned)
+    planted = [
+        index for (index, seed) in enumerate(seeds)
+        if index not in unplannedSet and seed.bed_feet != 0]
+    plantedSeeds = [seeds[index] for index in planted]
+
+    for seed in plantedSeeds:
+        if seed.intergenerational_days is None and (
+            (seed.fresh_generations or 0) > 1 or
+            (seed.storage_generations or 0) > 1):
+            raise ValueError(
+                "Cannot have multiple generations without defining "
+                "intergenerational time.")
+
+    # One element per seed variety being planted.
+    seedIndex = numpy.array(planted, dtype=int)
+    beginning = _column(plantedSeeds, 'beginning_of_season')
+    greenhouse = _column(plantedSeeds, 'greenhouse_days')
+    maturity = _column(plantedSeeds, 'maturity_days')
+    end = _column(plantedSeeds, 'end_of_season')
+    interval = _column(plantedSeeds, 'intergenerational_days')
+    fresh = _column(plantedSeeds, 'fresh_generations')
+    storage = _column(plantedSeeds, 'storage_generations')
+    # Without any generations given, there is one fresh generation.
+    fresh[numpy.array(
+            [seed.fresh_generations is None and
+             seed.storage_generations is None
+             for seed in plantedSeeds], dtype=bool)] = 1
+    generations = fresh + storage
+    bedFeet = _column(plantedSeeds, 'bed_feet', float)
+    quantity = bedFeet / numpy.maximum(generations, 1)
+
+    # One element per generation.
+    variety = numpy.repeat(numpy.arange(len(planted)), generations)
+    first = numpy.cumsum(generations) - generations
+    generation = numpy.arange(len(variety)) - first[variety]
+    offset = generation * interval[variety]
+    # Storage generations are pegged to the end of the season instead.
+    isStorage = generation >= fresh[variety]
+    storageStart = (
+        end - maturity - beginning - (storage + fresh - 1) * interval)
+    offset[isStorage] += storageStart[variety][isStorage]
+
+    sowing = offset + beginning[variety]
+    inGreenhouse = greenhouse[variety] != 0
+    plantingKind = numpy.where(inGreenhouse, TRANSPLANT, DIRECT_SEED)
+    planting = numpy.arange(len(variety))
+
+    harvest = sowing + maturity[variety] - greenhouse[variety]
+    # Maturity worked out from temperatures differs from one generation to
+    # the next, so it is worked out for each of them.
+    warming = numpy.array(
+        [seed.degree_days is not None and
+         seed.crop.base_temperature is not None
+         for seed in plantedSeeds], dtype=bool)
+    epoch = datetime(YEAR, 1, 1)
+    for generation in numpy.flatnonzero(warming[variety]).tolist():
+        outside = epoch + timedelta(days=int(sowing[generation]))
+        harvest[generation] = sowing[generation] + plantedSeeds[
+            variety[generation]].days_outside_from(outside)
+
+    flats = numpy.flatnonzero(inGreenhouse)
+    columns = [
+        (numpy.full(len(variety), BED_PREPARATION), variety, sowing - 14,
+         planting),
+        (numpy.full(len(flats), SEED_FLATS), variety[flats],
+         (sowing - greenhouse[variety])[flats], flats),
+        (plantingKind, variety, sowing, planting),
+        (numpy.full(len(variety), HARVEST), variety, harvest, planting)]
+
+    kinds = [numpy.full(len(unplanned), FINISH_PLANNING)]
+    varieties = [numpy.array(unplanned, dtype=int)]
+    days = [numpy.zeros(len(unplanned), dtype=int)]
+    plantings = [numpy.full(len(unplanned), -1)]
+    quantities = [numpy.zeros(len(unplanned))]
+    for (kind, which, day, group) in columns:
+        kinds.append(kind)
+        varieties.append(seedIndex[which])
+        days.append(day)
+        plantings.append(group)
+        quantities.append(quantity[which])
+
+    table = TaskTable(
+        seeds,
+        numpy.concatenate(kinds).astype(numpy.int8),
+        numpy.concatenate(varieties).astype(numpy.int32),
+        numpy.concatenate(days).astype(numpy.int32),
+        numpy.concatenate(quantities).astype(numpy.float64),
+        numpy.concatenate(plantings).astype(numpy.int32))
+    return table.sorted()
+
+
+
+def task_table(tasks, seeds):
+    """
+    Convert L{ITask} providers (such as L{cropplan.create_tasks} makes) to a
+    L{TaskTable}.
+
+    @param seeds: A C{list} of the L{Seed} instances the tasks are for.
+
+    @return: A L{TaskTable} with the tasks in the same order.
+    """
+    epoch = datetime(YEAR, 1, 1)
+    indices = dict((id(seed), index) for (index, seed) in enumerate(seeds))
+    kinds = dict((cls, index) for (index, cls) in enumerate(KINDS))
+    planting = {}
+    for (index, group) in enumerate(_plantings(tasks)):
+        if len(group) > 1:
+            for task in group:
+                planting[id(task)] = index
+
+    table = TaskTable(
+        seeds,
+        numpy.array(
+            [kinds[task.__class__] for task in tasks], dtype=numpy.int8),
+        numpy.array(
+            [indices[id(task.seed)] for task in tasks], dtype=numpy.int32),
+        numpy.array(
+            [(task.when - epoch).days for task in tasks], dtype=numpy.int32),
+        numpy.array(
+            [getattr(task, 'quantity', 0) for task in tasks],
+            dtype=numpy.float64),
+        numpy.array(
+            [planting.get(id(task), -1) for task in tasks],
+            dtype=numpy.int32))
+    return table
@@ -4,7 +4,14 @@
 Unit tests for the crop planning and scheduling module, L{cropplan}.
 """
 
+import os
+import sys
+
+from StringIO import StringIO
+from random import Random
 from datetime import date, datetime, timedelta
+from itertools import islice
+from collections import defaultdict
 
 from zope.interface.verify import verifyObject
 
@@ -15,7 +22,21 @@ from cropplan import (
     UnsplittableTask, MissingInformation,
     ITask, FinishPlanning, SeedFlats, DirectSeed, BedPreparation, Weed,
     Transplant, Harvest, Order, Price, Crop, Seed,
-    load_crops, load_seeds, create_tasks, schedule_tasks)
+    LivePlan, Schedule, ScheduleOptimizer, Occupancy, CapacityCalendar, Worker,
+    DegreeDays, Daylight, load_crops, load_seeds, load_workers, load_calendar,
+    load_temperatures, create_tasks,
+    iter_tasks, _create_seed_tasks, _keyed_seed_tasks, _rescheduled,
+    Recurrence, parse_rule, _recurring,
+    schedule_tasks, iter_schedule, schedule_ical, coalesce_fragments,
+    schedule_crew,
+    task_window, schedule_deadlines, MissedDeadline, schedule_horizon,
+    WeekEstimate, parse_years, make_order,
+    Scenario, evaluate_scenario, compare_scenarios, load_scenarios,
+    Succession, HarvestCurves, optimize_succession, optimize_successions,
+    BedSpace, fit_beds, Bed, Placement, assign_beds, load_beds,
+    SEED_VENDOR, Vendor, Offer, choose_packages, make_vendor_order,
+    _choose_vendors, load_vendors, load_offers)
+import cropplan
 
 
 # TODO
@@ -55,6 +76,23 @@ def dummySeed(crop, **kw):
     return Seed(crop, **args)
 
 
+def unpricedSeed(crop, **kw):
+    """
+    A version of L{dummySeed} which removes all default price information.
+    """
+    args = dict(
+        dollars_per_packet=None, dollars_per_hundred=None,
+        dollars_per_two_fifty=None, dollars_per_five_hundred=None,
+        dollars_per_thousand=None, dollars_per_five_thousand=None,
+        dollars_per_quarter_oz=None, dollars_per_half_oz=None,
+        dollars_per_oz=None, dollars_per_eighth_lb=None,
+        dollars_per_quarter_lb=None, dollars_per_half_lb=None,
+        dollars_per_lb=None, dollars_per_mini=None,
+        )
+    args.update(kw)
+    return dummySeed(crop, **args)
+
+
 class ComparisonTestsMixin(object):
     def test_identicalEquality(self):
         """
@@ -178,6 +216,23 @@ class LoadCropsTests(TestCase):
         self.assertEqual({"apples": apples}, crops)
 
 
+    def test_base_temperature(self):
+        """
+        L{Crop.base_temperature} is populated from the C{"Base Temperature"}
+        column.
+        """
+        apples = Crop(
+            "apples", 5.5, 3, 10, 5, "", 2, 100, 250, 1, 120, None,
+            base_temperature=50)
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "garbage\n%s\n%s\n" % (
+                self.HEADER + ",Base Temperature",
+                self._serialize(apples) + ",,50"))
+        crops = load_crops(path)
+        self.assertEqual({"apples": apples}, crops)
+
+
 
 class LoadSeedsTests(TestCase):
     """
@@ -277,6 +332,30 @@ class LoadSeedsTests(TestCase):
         self.assertEqual([wealthy], seeds)
 
 
+    def test_load_degree_days(self):
+        """
+        L{Seed.maturity_degree_days} is populated from the C{"Maturity (GDD)"}
+        column.
+        """
+        apples = Crop(
+            "apples", 5.5, 3, 10, 5, "", 2, 100, 250, 1, 120, 1000)
+        crops = {'apples': apples}
+
+        wealthy = Seed(
+            apples, 'wealthy', 1, None, None, 91, 25, 150, 100, 10,
+            1000, 1.50, 2.50, 3.50, 4.50, 5.50, 6.50, 7.50, 8.50, 9.50, 10.50,
+            11.50, 12.50, 13.50, 25, 0.50, 15, 3, 14, None,
+            maturity_degree_days=1200.0)
+
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "%s,Maturity (GDD)\n%s,1200\n" % (
+                self.HEADER, self._serialize(wealthy)))
+
+        seeds = load_seeds(path, crops)
+        self.assertEqual([wealthy], seeds)
+
+
 
 class CropTests(TestCase, ComparisonTestsMixin):
     """
@@ -388,17 +467,7 @@ class SeedOrderTests(TestCase):
         """
         A version of L{dummySeed} which removes all default price information.
         """
-        args = dict(
-            dollars_per_packet=None, dollars_per_hundred=None,
-            dollars_per_two_fifty=None, dollars_per_five_hundred=None,
-            dollars_per_thousand=None, dollars_per_five_thousand=None,
-            dollars_per_quarter_oz=None, dollars_per_half_oz=None,
-            dollars_per_oz=None, dollars_per_eighth_lb=None,
-            dollars_per_quarter_lb=None, dollars_per_half_lb=None,
-            dollars_per_lb=None, dollars_per_mini=None,
-            )
-        args.update(kw)
-        return dummySeed(crop, **args)
+        return unpricedSeed(crop, **kw)
 
 
     def test_missingPrices(self):
@@ -425,6 +494,18 @@ class SeedOrderTests(TestCase):
         self.assertEqual([Order(seed, 70, price)], order)
 
 
+    def test_overrun(self):
+        """
+        L{Seed.order} orders as much extra seed as the given minimum overrun.
+        """
+        crop = dummyCrop(rows_per_bed=2)
+        seed = self.dummySeed(
+            crop, dollars_per_packet=2.0, row_foot_per_packet=10)
+        price = Price('packet', 2.0, 10)
+        self.assertEqual([Order(seed, 50, price)], seed.order(25, 0))
+        self.assertEqual([Order(seed, 100, price)], seed.order(25, 1))
+
+
 
 class PriceTests(TestCase, ComparisonTestsMixin):
     """
@@ -458,6 +539,277 @@ class OrderTests(TestCase, ComparisonTestsMixin):
 
 
 
+class VendorTests(TestCase, ComparisonTestsMixin):
+    """
+    Tests for L{Vendor}, representing the terms a seed vendor sells on.
+    """
+    def createFirst(self):
+        return Vendor('Fedco', 25, 10, 100)
+
+
+    def createSecond(self):
+        return Vendor('Fedco', 25, 10, None)
+
+
+    def test_fees(self):
+        """
+        L{Vendor.fees} is what an order is made up to the minimum by, plus the
+        shipping charge unless the order is big enough to ship free.
+        """
+        vendor = self.createFirst()
+        self.assertEqual(25.0, vendor.fees(10))
+        self.assertEqual(10.0, vendor.fees(50))
+        self.assertEqual(0.0, vendor.fees(100))
+        self.assertEqual(10.0, self.createSecond().fees(1000))
+
+
+    def test_noOrder(self):
+        """
+        Nothing is charged for buying nothing.
+        """
+        self.assertEqual(0.0, self.createFirst().fees(0))
+
+
+
+class VendorOrderTests(TestCase):
+    """
+    Tests for L{choose_packages}, L{make_vendor_order} and L{_choose_vendors},
+    which choose the packets and vendors to buy seeds from.
+    """
+    def seed(self, name, dollars):
+        """
+        Make a seed variety of its own crop, of which 10 bed feet of one row
+        are planted, sold by L{SEED_VENDOR} in 10 row foot packets for
+        C{dollars}.
+        """
+        crop = dummyCrop(
+            name=name, rows_per_bed=1, yield_lbs_per_bed_foot=None,
+            _bed_feet=10)
+        return unpricedSeed(
+            crop, dollars_per_packet=dollars, row_foot_per_packet=10)
+
+
+    def offer(self, vendor, seed, dollars):
+        """
+        Offer C{seed} from C{vendor} in 10 row foot packets for C{dollars}.
+        """
+        return Offer(vendor, seed, 'x', Price('packet', dollars, 10))
+
+
+    def total(self, result):
+        """
+        Find the total cost of a L{make_vendor_order} result.
+        """
+        orders, fees, complete = result
+        return sum(order.cost() for order in orders) + sum(fees.values())
+
+
+    def test_choosePackages(self):
+        """
+        L{choose_packages} buys whichever packet is cheapest per row foot of
+        what is still needed, ignoring those without a known size.
+        """
+        big = Price('ounce', 10.0, 100.0)
+        small = Price('packet', 2.0, 10.0)
+        unknown = Price('mini', 1.0, None)
+        self.assertEqual(
+            {big: 1, small: 1}, choose_packages([small, big, unknown], 105))
+        self.assertEqual({small: 2}, choose_packages([small, big], 15))
+
+
+    def test_cheapest(self):
+        """
+        Without any fees, each variety is bought from the vendor selling it
+        for least.
+        """
+        carrots = self.seed('carrots', 3)
+        beets = self.seed('beets', 3)
+        offers = [self.offer('Fedco', carrots, 2),
+                  self.offer('Fedco', beets, 4)]
+        orders, fees, complete = make_vendor_order(
+            [carrots, beets], offers, {}, 0)
+        self.assertEqual(
+            [('carrots', 'Fedco', 'x', 2), ('beets', SEED_VENDOR, '1234g', 3)],
+            [(order.seed.crop.name, order.vendor, order.product_id,
+              order.cost())
+             for order in sorted(orders, key=lambda order: order.vendor)])
+        self.assertEqual({'Fedco': 0.0, SEED_VENDOR: 0.0}, fees)
+        self.assertTrue(complete)
+
+
+    def test_freeShipping(self):
+        """
+        Varieties are bought from a vendor they cost more from if that makes
+        an order big enough to ship free.
+        """
+        carrots = self.seed('carrots', 20)
+        beets = self.seed('beets', 40)
+        offers = [self.offer('Fedco', carrots, 21)]
+        vendors = {
+            SEED_VENDOR: Vendor(SEED_VENDOR, 0, 10, 50),
+            'Fedco': Vendor('Fedco', 0, 10, 50)}
+        orders, fees, complete = make_vendor_order(
+            [carrots, beets], offers, vendors, 0)
+        self.assertEqual(
+            [SEED_VENDOR, SEED_VENDOR], [order.vendor for order in orders])
+        self.assertEqual({SEED_VENDOR: 0.0}, fees)
+
+
+    def test_minimum(self):
+        """
+        Varieties are not bought from a vendor with a minimum order if making
+        the order up to it costs more than buying them elsewhere.
+        """
+        carrots = self.seed('carrots', 5)
+        beets = self.seed('beets', 5)
+        offers = [self.offer('Fedco', carrots, 3),
+                  self.offer('Fedco', beets, 3)]
+        vendors = {'Fedco': Vendor('Fedco', 15)}
+        result = make_vendor_order([carrots, beets], offers, vendors, 0)
+        self.assertEqual(
+            [SEED_VENDOR, SEED_VENDOR],
+            [order.vendor for order in result[0]])
+        self.assertEqual(10.0, self.total(result))
+
+
+    def test_cheapestMix(self):
+        """
+        L{_choose_vendors} finds the cheapest choice of vendors, counting their
+        fees.
+        """
+        random = Random(7)
+        names = ['a', 'b', 'c']
+        for trial in range(100):
+            vendors = dict(
+                (name, Vendor(name, random.choice([0, 10, 30]),
+                              random.choice([0, 5, 12]),
+                              random.choice([None, 20, 60])))
+                for name in names)
+            costs = [
+                dict((name, random.randint(1, 15))
+                     for name in random.sample(names, random.randint(1, 3)))
+                for item in range(random.randint(1, 6))]
+
+            def total(chosen):
+                subtotals = dict((name, 0) for name in names)
+                for (item, name) in zip(costs, chosen):
+                    subtotals[name] += item[name]
+                return sum(subtotals.values()) + sum(
+                    vendors[name].fees(subtotal)
+                    for (name, subtotal) in subtotals.items())
+
+            everything = [[]]
+            for item in costs:
+                everything = [
+                    chosen + [name]
+                    for chosen in everything for name in item]
+            chosen, complete = _choose_vendors(costs, vendors)
+            self.assertTrue(complete)
+            self.assertEqual(
+                min(total(chosen) for chosen in everything), total(chosen))
+
+
+    def test_limit(self):
+        """
+        L{_choose_vendors} says when its search is cut short by its limit, and
+        still gives a choice of vendors for every item.
+        """
+        vendors = dict(
+            (name, Vendor(name, 10, 5, 30)) for name in ['a', 'b', 'c'])
+        costs = [{'a': 5, 'b': 6, 'c': 7}, {'a': 7, 'b': 5, 'c': 6},
+                 {'a': 6, 'b': 7, 'c': 5}, {'a': 5, 'b': 5, 'c': 5}]
+        chosen, complete = _choose_vendors(costs, vendors, limit=1)
+        self.assertFalse(complete)
+        self.assertEqual(len(costs), len(chosen))
+        for (item, name) in zip(costs, chosen):
+            self.assertIn(name, item)
+        chosen, complete = _choose_vendors(costs, vendors)
+        self.assertTrue(complete)
+
+
+    def test_manyVarieties(self):
+        """
+        L{make_vendor_order} chooses vendors for hundreds of varieties, for no
+        more than buying each from the vendor selling it for least.
+        """
+        random = Random(11)
+        names = ['Fedco', 'High Mowing', 'Baker Creek']
+        vendors = dict(
+            (name, Vendor(name, 25, 8, 150)) for name in names + [SEED_VENDOR])
+        seeds = []
+        offers = []
+        for variety in range(300):
+            seed = self.seed(str(variety), random.randint(2, 12))
+            seeds.append(seed)
+            for name in random.sample(names, random.randint(0, 3)):
+                offers.append(self.offer(name, seed, random.randint(2, 12)))
+        cheapest = defaultdict(float)
+        for seed in seeds:
+            vendor, dollars = SEED_VENDOR, seed.prices[0].dollars
+            for offer in offers:
+                if offer.seed is seed and offer.price.dollars < dollars:
+                    vendor, dollars = offer.vendor, offer.price.dollars
+            cheapest[vendor] += dollars
+        greedy = sum(
+            subtotal + vendors[vendor].fees(subtotal)
+            for (vendor, subtotal) in cheapest.items())
+
+        result = make_vendor_order(seeds, offers, vendors, 0)
+        self.assertEqual(300, len(result[0]))
+        self.assertTrue(self.total(result) <= greedy)
+
+
+    def test_loadVendors(self):
+        """
+        L{load_vendors} loads a C{dict} of L{Vendor} instances by name from a
+        CSV file, with fees left out taken as none.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "Vendor,Minimum Order,Shipping,Free Shipping Over\n"
+            "Fedco,25,10,100\n"
+            "High Mowing,,7.5,\n")
+        self.assertEqual(
+            {'Fedco': Vendor('Fedco', 25.0, 10.0, 100.0),
+             'High Mowing': Vendor('High Mowing', 0.0, 7.5, None)},
+            load_vendors(path))
+
+
+    def test_loadOffers(self):
+        """
+        L{load_offers} loads L{Offer} instances for the seed varieties they
+        name from a CSV file, with packet sizes given in row feet or in seeds.
+        """
+        carrots = self.seed('carrots', 3)
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "Vendor,Type,Variety,Product ID,Packet,Price,Row Feet,Seeds\n"
+            "Fedco,carrots,bar,123A,packet,2.50,15,\n"
+            "Fedco,carrots,bar,123B,ounce,9,,1000\n")
+        self.assertEqual(
+            [Offer('Fedco', carrots, '123A', Price('packet', 2.5, 15.0)),
+             Offer('Fedco', carrots, '123B',
+                   Price('ounce', 9.0, carrots._count_to_feet(1000.0)))],
+            load_offers(path, [carrots]))
+
+
+    def test_loadOffersUnknown(self):
+        """
+        L{load_offers} skips rows for seed varieties it was not given.
+        """
+        carrots = self.seed('carrots', 3)
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "Vendor,Type,Variety,Product ID,Packet,Price,Row Feet,Seeds\n"
+            "Fedco,carrots,baz,123A,packet,2.50,15,\n"
+            "Fedco,parsnips,bar,123B,packet,3,15,\n"
+            "Fedco,carrots,bar,123C,packet,2.50,15,\n")
+        self.assertEqual(
+            [Offer('Fedco', carrots, '123C', Price('packet', 2.5, 15.0))],
+            load_offers(path, [carrots]))
+
+
+
 class TaskTestsMixin(object):
     """
     L{TaskTestsMixin} is a mixin for L{TestCase} subclasses which defines
@@ -810,6 +1162,17 @@ class CreateTasksTests(TestCase):
         self.assertEqual([FinishPlanning(seed)], tasks)
 
 
+    def test_noGenerations(self):
+        """
+        L{create_tasks} creates no tasks for a seed whose fresh and storage
+        generations are both explicitly C{0}.
+        """
+        crop = dummyCrop()
+        crops = {'foo': crop}
+        seed = dummySeed(crop, fresh_generations=0, storage_generations=0)
+        self.assertEqual([], create_tasks(crops, [seed]))
+
+
     def test_tasksForDirectSeeding(self):
         """
         For a seed variety with C{greenhouse_days} set to C{0}, L{create_tasks}
@@ -852,6 +1215,25 @@ class CreateTasksTests(TestCase):
         self.assertEqual(expected, tasks)
 
 
+    def test_dependents(self):
+        """
+        The tasks L{create_tasks} creates for one planting are linked by their
+        C{dependents}: the bed preparation and the flat seeding must precede the
+        transplanting, which must precede the harvest.
+        """
+        crop = dummyCrop()
+        seed = dummySeed(crop)
+        preparation, flats, transplant, harvest = create_tasks(
+            {'foo': crop}, [seed])
+        self.assertEqual(1, len(preparation.dependents))
+        self.assertIdentical(transplant, preparation.dependents[0])
+        self.assertEqual(1, len(flats.dependents))
+        self.assertIdentical(transplant, flats.dependents[0])
+        self.assertEqual(1, len(transplant.dependents))
+        self.assertIdentical(harvest, transplant.dependents[0])
+        self.assertEqual((), harvest.dependents)
+
+
     def test_severalFreshGenerations(self):
         """
         For a variety with multiple succession plantings planned for fresh
@@ -982,6 +1364,214 @@ class CreateTasksTests(TestCase):
 
 
 
+    def test_years(self):
+        """
+        L{create_tasks} creates the tasks for each of the years it is given,
+        the same as for each year on its own, with dependents linking the
+        tasks of each year.
+        """
+        crop = dummyCrop()
+        seed = dummySeed(crop)
+        tasks = create_tasks({'foo': crop}, [seed], [2012, 2013])
+        self.assertEqual(8, len(tasks))
+        self.assertEqual(
+            [key[-1] for key in _keyed_seed_tasks(seed, 2012)], tasks[:4])
+        self.assertEqual(
+            [key[-1] for key in _keyed_seed_tasks(seed, 2013)], tasks[4:])
+        self.assertEqual(
+            [(tasks[6],), (tasks[6],), (tasks[7],), ()],
+            [task.dependents for task in tasks[4:]])
+
+
+    def test_perennial(self):
+        """
+        A perennial is only planted again once its lifetime has passed.  In
+        the years between, only its harvest is repeated.  Planting is only
+        finished once, at the start of the first year.
+        """
+        crop = dummyCrop()
+        perennial = dummySeed(crop, greenhouse_days=0, lifetime_years=2)
+        unknown = dummySeed(crop, beginning_of_season=None)
+        tasks = create_tasks(
+            {'foo': crop}, [perennial, unknown], [2013, 2014, 2015])
+        self.assertEqual(
+            [(FinishPlanning, 2013), (BedPreparation, 2013),
+             (DirectSeed, 2013), (Harvest, 2013), (Harvest, 2014),
+             (BedPreparation, 2015), (DirectSeed, 2015), (Harvest, 2015)],
+            [(task.__class__, task.when.year) for task in tasks])
+        self.assertEqual(datetime(2013, 1, 1), tasks[0].when)
+
+
+    def test_yearsLazily(self):
+        """
+        L{iter_tasks} creates the tasks of each year from that year's season,
+        taking each of them only as it is needed.
+        """
+        crop = dummyCrop()
+        seed = dummySeed(crop)
+        taken = []
+        def create(seed, year, recurrence=None):
+            for key in _keyed_seed_tasks(seed, year, recurrence):
+                taken.append(year)
+                yield key
+        self.patch(cropplan, '_keyed_seed_tasks', create)
+        tasks = iter_tasks([seed], range(2012, 2032))
+        self.assertEqual(2012, tasks.next().when.year)
+        # Only the first task of each year has been created.
+        self.assertEqual(range(2012, 2032), taken)
+        self.assertEqual(
+            [2012] * 3 + [2013] * 4,
+            [task.when.year for task in islice(tasks, 7)])
+
+
+    def test_parseYears(self):
+        """
+        L{parse_years} parses a single year or an inclusive range of them.
+        """
+        self.assertEqual([2013], parse_years('2013'))
+        self.assertEqual([2013, 2014, 2015], parse_years('2013-2015'))
+        self.assertRaises(ValueError, parse_years, '2015-2013')
+
+
+    def test_iterTasks(self):
+        """
+        L{iter_tasks} generates the same tasks as L{create_tasks}, in the same
+        order, while creating the tasks for each seed variety only as they
+        are needed.
+        """
+        crop = dummyCrop()
+        early = dummySeed(crop, variety='early', greenhouse_days=0,
+                          fresh_generations=3, intergenerational_weeks=1)
+        late = dummySeed(crop, variety='late', greenhouse_days=0,
+                         beginning_of_season=early.beginning_of_season + 60)
+        seeds = [late, early]
+        self.assertEqual(
+            [(task.__class__, task.seed, task.when, task.quantity)
+             for task in create_tasks({'foo': crop}, seeds)],
+            [(task.__class__, task.seed, task.when, task.quantity)
+             for task in iter_tasks(seeds)])
+
+        created = []
+        def create(seed, year, recurrence=None):
+            created.append(seed)
+            return _keyed_seed_tasks(seed, year, recurrence)
+        self.patch(cropplan, '_keyed_seed_tasks', create)
+        tasks = iter_tasks([late, early])
+        self.assertEqual([], created)
+        self.assertIdentical(early, tasks.next().seed)
+        self.assertEqual([late, early], created)
+
+
+    def test_generationsInterleaved(self):
+        """
+        The tasks of overlapping generations of a seed variety are created in
+        chronological order, and each with its share of the variety's bed feet.
+        """
+        crop = dummyCrop()
+        seed = dummySeed(
+            crop, greenhouse_days=0, fresh_generations=2,
+            intergenerational_weeks=1)
+        tasks = _create_seed_tasks(seed)
+        self.assertEqual(
+            sorted(task.when for task in tasks), [task.when for task in tasks])
+        self.assertEqual(
+            [BedPreparation, BedPreparation, DirectSeed, DirectSeed, Harvest,
+             Harvest],
+            [task.__class__ for task in tasks])
+        self.assertEqual(
+            [seed.bed_feet / 2] * 6, [task.quantity for task in tasks])
+
+
+    def test_weeding(self):
+        """
+        With a L{Recurrence} giving a weeding rule, each planting is weeded on
+        the days matching it from the day after it is planted until it is
+        ready to harvest, each weeding depending on the one before.
+        """
+        seed = dummySeed(dummyCrop(), greenhouse_days=0)
+        tasks = create_tasks(
+            {}, [seed], recurrence=Recurrence(weeding='FREQ=WEEKLY'))
+        planting = [task for task in tasks if isinstance(task, DirectSeed)][0]
+        weeds = [task for task in tasks if isinstance(task, Weed)]
+        harvest = tasks[-1]
+        self.assertEqual(datetime(2012, 3, 31), planting.when)
+        self.assertEqual(datetime(2012, 4, 20), harvest.when)
+        self.assertEqual(
+            [datetime(2012, 4, 1), datetime(2012, 4, 8),
+             datetime(2012, 4, 15)],
+            [weed.when for weed in weeds])
+        self.assertEqual([seed.bed_feet] * 3, [weed.quantity for weed in weeds])
+        self.assertEqual((weeds[0], harvest), planting.dependents)
+        self.assertEqual((weeds[1],), weeds[0].dependents)
+        self.assertEqual((weeds[2],), weeds[1].dependents)
+        self.assertEqual((), weeds[2].dependents)
+
+
+    def test_picking(self):
+        """
+        With a L{Recurrence} giving a picking rule, each planting is harvested
+        on the days matching it over its harvest duration, an equal share of
+        it each time, instead of all at once.
+        """
+        seed = dummySeed(dummyCrop(), greenhouse_days=0)
+        tasks = create_tasks(
+            {}, [seed],
+            recurrence=Recurrence(picking='FREQ=WEEKLY;BYDAY=MO,TH'))
+        planting = [task for task in tasks if isinstance(task, DirectSeed)][0]
+        picks = [task for task in tasks if isinstance(task, Harvest)]
+        self.assertEqual(
+            [datetime(2012, 4, 23), datetime(2012, 4, 26),
+             datetime(2012, 4, 30), datetime(2012, 5, 3)],
+            [pick.when for pick in picks])
+        self.assertEqual(
+            [seed.bed_feet / 4] * 4, [pick.quantity for pick in picks])
+        self.assertEqual([3, 4, 3, 1], [pick.pick_days for pick in picks])
+        self.assertEqual((picks[0],), planting.dependents)
+        self.assertEqual((picks[3],), picks[2].dependents)
+
+
+    def test_noPicking(self):
+        """
+        A planting with no day matching the picking rule in its harvest
+        duration is harvested all at once, as usual.
+        """
+        seed = dummySeed(dummyCrop(), greenhouse_days=0, harvest_duration=2)
+        tasks = create_tasks(
+            {}, [seed], recurrence=Recurrence(picking='FREQ=WEEKLY;BYDAY=MO'))
+        self.assertEqual(
+            [(BedPreparation, datetime(2012, 3, 17), seed.bed_feet),
+             (DirectSeed, datetime(2012, 3, 31), seed.bed_feet),
+             (Harvest, datetime(2012, 4, 20), seed.bed_feet)],
+            [(type(task), task.when, task.quantity) for task in tasks])
+        self.assertEqual((tasks[2],), tasks[1].dependents)
+
+
+    def test_recurringLazily(self):
+        """
+        L{_recurring} creates each task only just before the one before it is
+        given out, so that it can be made that task's dependent.
+        """
+        seed = dummySeed(dummyCrop())
+        weeds = _recurring(
+            Weed, 'FREQ=DAILY', datetime(2012, 5, 1), datetime(9999, 1, 1),
+            seed, 10)
+        first = weeds.next()
+        second = weeds.next()
+        self.assertEqual(datetime(2012, 5, 1), first.when)
+        self.assertEqual((second,), first.dependents)
+        self.assertEqual(datetime(2012, 5, 2), second.when)
+        self.assertEqual(datetime(2012, 5, 3), second.dependents[0].when)
+
+
+    def test_parseRule(self):
+        """
+        L{parse_rule} accepts recurrence rules and rejects anything else.
+        """
+        self.assertEqual('FREQ=WEEKLY', parse_rule('FREQ=WEEKLY'))
+        self.assertRaises(ValueError, parse_rule, 'every tuesday')
+
+
+
 class ScheduleTasksTests(TestCase):
     """
     Tests for L{schedule_tasks}
@@ -1075,3 +1665,1953 @@ class ScheduleTasksTests(TestCase):
              SeedFlats(datetime(2012, 5, 1, 10, 0, 0), seedB, 30),
              SeedFlats(datetime(2012, 5, 2, 8, 0, 0), seedB, 35)],
             schedule)
+
+
+
+    def test_notMutated(self):
+        """
+        L{schedule_tasks} does not change the list of tasks passed to it, or
+        the tasks in it.
+        """
+        crop = dummyCrop()
+        seedA = dummySeed(crop)
+        seedB = dummySeed(crop)
+        tasks = [SeedFlats(datetime(2012, 5, 1), seedA, 90),
+                 SeedFlats(datetime(2012, 5, 1), seedB, 90)]
+        expected = [SeedFlats(datetime(2012, 5, 1), seedA, 90),
+                    SeedFlats(datetime(2012, 5, 1), seedB, 90)]
+        schedule_tasks(tasks, maxManHours=timedelta(hours=3))
+        self.assertEqual(expected, tasks)
+
+
+
+    def test_calendarBlackout(self):
+        """
+        L{schedule_tasks} schedules nothing on days which the L{CapacityCalendar}
+        gives no time to, and no more than the calendar's hours on other days.
+        """
+        crop = dummyCrop()
+        seed = dummySeed(crop)
+        calendar = CapacityCalendar(timedelta(hours=3), {
+                date(2012, 5, 1): timedelta(hours=1),
+                date(2012, 5, 2): timedelta(),
+                date(2012, 5, 3): timedelta()})
+        tasks = [SeedFlats(datetime(2012, 5, 1), seed, 60)]
+        schedule = schedule_tasks(tasks, calendar=calendar)
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 1, 8, 0, 0), seed, 30),
+             SeedFlats(datetime(2012, 5, 4, 8, 0, 0), seed, 30)],
+            schedule)
+
+
+
+    def test_delayDependents(self):
+        """
+        When a task is postponed, the tasks which depend on it are postponed by
+        the same amount, but other tasks for the same seed are not.
+        """
+        crop = dummyCrop()
+        seedA = dummySeed(crop)
+        seedB = dummySeed(crop)
+        transplant = Transplant(datetime(2012, 5, 3), seedB, 10)
+        flats = SeedFlats(datetime(2012, 5, 1), seedB, 90)
+        flats.dependents = (transplant,)
+        tasks = [SeedFlats(datetime(2012, 5, 1), seedA, 90),
+                 flats,
+                 BedPreparation(datetime(2012, 5, 3), seedB, 10),
+                 transplant]
+        schedule = schedule_tasks(tasks, maxManHours=timedelta(hours=3))
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 1, 8, 0, 0), seedA, 90),
+             SeedFlats(datetime(2012, 5, 2, 8, 0, 0), seedB, 90),
+             BedPreparation(datetime(2012, 5, 3, 8, 0, 0), seedB, 10),
+             Transplant(datetime(2012, 5, 4, 8, 0, 0), seedB, 10)],
+            schedule)
+
+
+    def test_delayTransitive(self):
+        """
+        A postponement is passed along a chain of dependent tasks, even to
+        tasks which are not themselves directly postponed by any conflict.
+        """
+        crop = dummyCrop()
+        seedA = dummySeed(crop)
+        seedB = dummySeed(crop)
+        harvest = Harvest(datetime(2012, 5, 5), seedB, 10)
+        transplant = Transplant(datetime(2012, 5, 2), seedB, 10)
+        transplant.dependents = (harvest,)
+        flats = SeedFlats(datetime(2012, 5, 1), seedB, 80)
+        flats.dependents = (transplant,)
+        preparation = BedPreparation(datetime(2012, 5, 1), seedB, 10)
+        preparation.dependents = (transplant,)
+        tasks = [SeedFlats(datetime(2012, 5, 1), seedA, 90),
+                 preparation, flats, transplant, harvest]
+        schedule = schedule_tasks(tasks, maxManHours=timedelta(hours=3))
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 1, 8, 0, 0), seedA, 90),
+             BedPreparation(datetime(2012, 5, 2, 8, 0, 0), seedB, 10),
+             SeedFlats(datetime(2012, 5, 2, 8, 20, 0), seedB, 80),
+             Transplant(datetime(2012, 5, 3, 8, 0, 0), seedB, 10),
+             Harvest(datetime(2012, 5, 6, 8, 0, 0), seedB, 10)],
+            schedule)
+
+
+    def test_delayChain(self):
+        """
+        When only the first task of a chain of three is delayed, the whole
+        delay is passed along to the last task, and neither later task begins
+        before the one it depends on is finished.
+        """
+        crop = dummyCrop()
+        seedA = dummySeed(crop)
+        seedB = dummySeed(crop)
+        harvest = Harvest(datetime(2012, 5, 2), seedB, 10)
+        transplant = Transplant(datetime(2012, 5, 1), seedB, 10)
+        transplant.dependents = (harvest,)
+        flats = SeedFlats(datetime(2012, 5, 1), seedB, 120)
+        flats.dependents = (transplant,)
+        tasks = [SeedFlats(datetime(2012, 5, 1), seedA, 60),
+                 flats, transplant, harvest]
+        schedule = schedule_tasks(tasks, maxManHours=timedelta(hours=3))
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 1, 8, 0, 0), seedA, 60),
+             SeedFlats(datetime(2012, 5, 1, 10, 0, 0), seedB, 30),
+             SeedFlats(datetime(2012, 5, 2, 8, 0, 0), seedB, 90),
+             Transplant(datetime(2012, 5, 3, 8, 0, 0), seedB, 10),
+             Harvest(datetime(2012, 5, 4, 8, 0, 0), seedB, 10)],
+            schedule)
+
+
+
+class IterScheduleTests(TestCase):
+    """
+    Tests for L{iter_schedule}.
+    """
+    def setUp(self):
+        crop = dummyCrop()
+        self.seedA = dummySeed(crop)
+        self.seedB = dummySeed(crop)
+        self.tasks = [
+            SeedFlats(datetime(2012, 5, 1), self.seedA, 90),
+            SeedFlats(datetime(2012, 5, 1), self.seedB, 90),
+            DirectSeed(datetime(2012, 5, 4), self.seedA, 10)]
+
+
+    def test_days(self):
+        """
+        L{iter_schedule} produces the same events as L{schedule_tasks},
+        grouped by the day they are scheduled on.
+        """
+        maxManHours = timedelta(hours=3)
+        days = list(iter_schedule(self.tasks, maxManHours))
+        self.assertEqual(
+            [(date(2012, 5, 1),
+              [SeedFlats(datetime(2012, 5, 1, 8), self.seedA, 90)]),
+             (date(2012, 5, 2),
+              [SeedFlats(datetime(2012, 5, 2, 8), self.seedB, 90)]),
+             (date(2012, 5, 4),
+              [DirectSeed(datetime(2012, 5, 4, 8), self.seedA, 10)])],
+            days)
+        self.assertEqual(
+            schedule_tasks(self.tasks, maxManHours),
+            [event for (day, events) in days for event in events])
+
+
+    def test_lazy(self):
+        """
+        L{iter_schedule} only takes tasks from the iterator it is given as the
+        days they may be done on are reached.
+        """
+        later = Harvest(datetime(2012, 6, 1), self.seedA, 10)
+        taken = []
+        def tasks():
+            for task in self.tasks + [later]:
+                taken.append(task)
+                yield task
+        days = iter_schedule(tasks(), timedelta(hours=3))
+        self.assertEqual([], taken)
+        days.next()
+        # The task for the next day with work has been looked at, but no more.
+        self.assertEqual(self.tasks, taken)
+        self.assertEqual(date(2012, 5, 2), days.next()[0])
+        self.assertEqual(date(2012, 5, 4), days.next()[0])
+        self.assertEqual(self.tasks + [later], taken)
+        self.assertEqual(date(2012, 6, 1), days.next()[0])
+        self.assertRaises(StopIteration, days.next)
+
+
+    def test_empty(self):
+        """
+        L{iter_schedule} produces nothing for no tasks.
+        """
+        self.assertEqual([], list(iter_schedule([])))
+
+
+    def test_icalStreamed(self):
+        """
+        L{schedule_ical} writes out each event of a schedule as soon as it is
+        produced, so the calendar of a streamed schedule is written as it
+        goes.
+        """
+        output = StringIO()
+        self.patch(sys, 'stdout', output)
+        written = []
+        def events():
+            for (day, events) in iter_schedule(
+                    self.tasks, timedelta(hours=3)):
+                for event in events:
+                    written.append(output.getvalue().count('BEGIN:VEVENT'))
+                    yield event
+        schedule_ical(events())
+        self.assertEqual([0, 1, 2], written)
+        self.assertEqual(3, output.getvalue().count('END:VEVENT'))
+        self.assertTrue(
+            output.getvalue().rstrip().endswith('END:VCALENDAR'))
+
+
+
+class CapacityCalendarTests(TestCase):
+    """
+    Tests for L{CapacityCalendar} and L{load_calendar}.
+    """
+    def test_nextAvailable(self):
+        """
+        L{CapacityCalendar.next_available} returns the first day, starting
+        with the given day, with any time available.
+        """
+        calendar = CapacityCalendar(timedelta(hours=5), dict.fromkeys(
+                [date(2012, 6, 1) + timedelta(days=n) for n in range(30)],
+                timedelta()))
+        self.assertEqual(
+            date(2012, 5, 31), calendar.next_available(date(2012, 5, 31)))
+        self.assertEqual(
+            date(2012, 7, 1), calendar.next_available(date(2012, 6, 1)))
+        self.assertEqual(
+            date(2012, 7, 1), calendar.next_available(date(2012, 6, 20)))
+
+
+    def test_noneAvailable(self):
+        """
+        L{CapacityCalendar.next_available} raises L{ValueError} if there is no
+        time available on or after the given day.
+        """
+        calendar = CapacityCalendar(timedelta(), {
+                date(2012, 6, 1): timedelta(hours=2)})
+        self.assertEqual(
+            date(2012, 6, 1), calendar.next_available(date(2012, 5, 1)))
+        self.assertRaises(
+            ValueError, calendar.next_available, date(2012, 6, 2))
+
+
+    def test_load(self):
+        """
+        L{load_calendar} reads the hours available on particular dates and on
+        days matching recurrence rules from a CSV file, with later rows taking
+        precedence.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "Date,Hours\n"
+            "RRULE:FREQ=WEEKLY;BYDAY=SU,0\n"
+            "7/4/12,1.5\n"
+            "7/8/12,3\n")
+        calendar = load_calendar(path, timedelta(hours=6))
+        # Sundays
+        self.assertEqual(timedelta(), calendar.hours(date(2012, 7, 1)))
+        self.assertEqual(timedelta(), calendar.hours(date(2012, 12, 30)))
+        self.assertEqual(timedelta(hours=3), calendar.hours(date(2012, 7, 8)))
+        self.assertEqual(
+            timedelta(hours=1.5), calendar.hours(date(2012, 7, 4)))
+        self.assertEqual(timedelta(hours=6), calendar.hours(date(2012, 7, 5)))
+
+
+    def test_loadYears(self):
+        """
+        L{load_calendar} expands recurrence rules without an end over all of
+        the years it is given.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "Date,Hours\n"
+            "RRULE:FREQ=WEEKLY;BYDAY=SU,0\n")
+        calendar = load_calendar(path, timedelta(hours=6), [2013, 2014])
+        self.assertEqual(timedelta(hours=6), calendar.hours(date(2012, 7, 1)))
+        self.assertEqual(timedelta(), calendar.hours(date(2013, 7, 7)))
+        self.assertEqual(timedelta(), calendar.hours(date(2014, 12, 28)))
+
+
+class DegreeDaysTests(TestCase):
+    """
+    Tests for L{DegreeDays}, L{load_temperatures} and
+    L{Seed.days_outside_from}.
+    """
+    def setUp(self):
+        # 10 degree days a day above 50 until the summer, and 20 after.
+        temperatures = {}
+        day = date(2011, 1, 1)
+        while day.year == 2011:
+            if day.month < 6:
+                temperatures[day.month, day.day] = (50, 70)
+            else:
+                temperatures[day.month, day.day] = (60, 80)
+            day += timedelta(days=1)
+        self.degreeDays = DegreeDays(temperatures)
+
+
+    def test_accumulated(self):
+        """
+        L{DegreeDays.accumulated} adds up how far the average temperature of
+        each day is above the base temperature, ignoring days below it.
+        """
+        self.assertEqual(
+            30, self.degreeDays.accumulated(50, datetime(2012, 5, 1), 3))
+        self.assertEqual(
+            10 + 2 * 20,
+            self.degreeDays.accumulated(50, datetime(2012, 5, 31), 3))
+        self.assertEqual(
+            0, self.degreeDays.accumulated(70, datetime(2012, 5, 1), 3))
+
+
+    def test_daysTo(self):
+        """
+        L{DegreeDays.days_to} finds how many days it takes to accumulate some
+        number of degree days, or C{None} if they never are.
+        """
+        self.assertEqual(
+            3, self.degreeDays.days_to(50, datetime(2012, 5, 1), 30))
+        self.assertEqual(
+            3, self.degreeDays.days_to(50, datetime(2012, 5, 1), 25))
+        self.assertEqual(
+            2, self.degreeDays.days_to(50, datetime(2012, 7, 1), 30))
+        self.assertEqual(
+            0, self.degreeDays.days_to(50, datetime(2012, 7, 1), 0))
+        self.assertIdentical(
+            None, self.degreeDays.days_to(80, datetime(2012, 7, 1), 1))
+
+
+    def test_missingDays(self):
+        """
+        Days missing from the temperatures are like the last day before them
+        which is there.  Leap days are missing from non-leap years.
+        """
+        self.assertEqual(
+            20 + 20 + 10,
+            self.degreeDays.accumulated(50, datetime(2012, 2, 28), 2) +
+            self.degreeDays.accumulated(50, datetime(2012, 3, 1), 3))
+
+
+    def test_load(self):
+        """
+        L{load_temperatures} reads daily low and high temperatures from a CSV
+        file, averaging the same day in different years.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "Date,Low,High\n"
+            "5/1/2010,40,60\n"
+            "5/1/2011,50,70\n"
+            "5/2/2011,55,75\n")
+        degreeDays = load_temperatures(path)
+        self.assertEqual(
+            {(5, 1): (45, 65), (5, 2): (55, 75)}, degreeDays.temperatures)
+
+
+    def test_daysOutside(self):
+        """
+        Without L{DegreeDays}, L{Seed.days_outside_from} is the days to
+        maturity less the days in the greenhouse.  With them, a planting put
+        outside later in the season, when it is warmer, matures sooner.
+        """
+        crop = dummyCrop(base_temperature=50)
+        seed = dummySeed(
+            crop, beginning_of_season=120, greenhouse_days=10,
+            maturity_days=40)
+        self.assertEqual(30, seed.days_outside_from(datetime(2012, 7, 1)))
+
+        seed.degree_days = self.degreeDays
+        self.assertEqual(30, seed.days_outside_from(datetime(2012, 4, 30)))
+        self.assertEqual(15, seed.days_outside_from(datetime(2012, 7, 1)))
+
+        seed.maturity_degree_days = 100
+        self.assertEqual(5, seed.days_outside_from(datetime(2012, 7, 1)))
+
+
+    def test_createTasks(self):
+        """
+        L{create_tasks} harvests each generation of a seed variety when it
+        matures according to L{Seed.days_outside_from}.
+        """
+        crop = dummyCrop(base_temperature=50)
+        seed = dummySeed(
+            crop, greenhouse_days=0, beginning_of_season=110,
+            maturity_days=20, fresh_generations=3, intergenerational_weeks=6)
+        seed.degree_days = self.degreeDays
+        harvests = [
+            task.when for task in create_tasks({}, [seed])
+            if isinstance(task, Harvest)]
+        self.assertEqual(
+            [datetime(2012, 4, 20) + timedelta(days=20),
+             datetime(2012, 6, 1) + timedelta(days=10),
+             datetime(2012, 7, 13) + timedelta(days=10)],
+            harvests)
+
+
+
+class DaylightTests(TestCase):
+    """
+    Tests for L{Daylight} and the sunlight model of L{Seed}.
+    """
+    def test_seasons(self):
+        """
+        L{Daylight.on} gives the length of the day, which is longer in the
+        summer than in the winter, except on the equator.
+        """
+        daylight = Daylight(45)
+        summer = daylight.on(date(2012, 6, 21))
+        winter = daylight.on(datetime(2012, 12, 21, 15))
+        self.assertTrue(timedelta(hours=15) < summer < timedelta(hours=16))
+        self.assertTrue(timedelta(hours=8) < winter < timedelta(hours=9))
+
+        equator = Daylight(0)
+        self.assertTrue(
+            abs(equator.on(date(2012, 6, 21)) - timedelta(hours=12)) <
+            timedelta(minutes=10))
+
+
+    def test_polar(self):
+        """
+        Near the poles, the sun may not rise or set at all.
+        """
+        daylight = Daylight(85)
+        self.assertEqual(timedelta(hours=24), daylight.on(date(2012, 6, 21)))
+        self.assertEqual(timedelta(), daylight.on(date(2012, 12, 21)))
+
+
+    def test_cache(self):
+        """
+        Day lengths are written to the cache directory, named for the latitude
+        and the year, and read from it instead of being computed again.
+        """
+        cache = FilePath(self.mktemp()).child('daylight')
+        first = Daylight(44.5, cache)
+        length = first.on(date(2013, 5, 1))
+        self.assertEqual(['daylight-44.5000-2013'], cache.listdir())
+
+        second = Daylight(44.5, cache)
+        def compute(year):
+            self.fail("Computed day lengths which are cached.")
+        second._compute = compute
+        self.assertEqual(length, second.on(date(2013, 5, 1)))
+        self.assertEqual(
+            first.on(date(2013, 12, 31)), second.on(date(2013, 12, 31)))
+
+
+    def test_sunlight(self):
+        """
+        L{Seed.maturity_sunlight_duration} adds up the day lengths from
+        C{beginning_of_season} over C{maturity_days}, and
+        L{Seed.days_to_maturity_from} finds how long it takes to get that much
+        sunlight from another day, both using L{Seed.daylight}.
+        """
+        seed = dummySeed(
+            dummyCrop(), beginning_of_season=100, maturity_days=30)
+        seed.daylight = Daylight(45)
+        spring = seed.days_to_maturity_from(datetime(2012, 4, 10))
+        summer = seed.days_to_maturity_from(datetime(2012, 6, 10))
+        autumn = seed.days_to_maturity_from(datetime(2012, 9, 10))
+        self.assertEqual(30, spring)
+        self.assertTrue(summer < spring < autumn)
+
+        seed.daylight = Daylight(0)
+        self.assertTrue(
+            abs(seed.maturity_sunlight_duration - timedelta(hours=12 * 30)) <
+            timedelta(minutes=10 * 30))
+
+
+
+class ScheduleChangeTests(TestCase):
+    """
+    Tests for L{Schedule.change} and the other methods of L{Schedule} which
+    schedule a variation of an existing schedule's tasks.
+    """
+    def setUp(self):
+        crop = dummyCrop()
+        self.seedA = dummySeed(crop, greenhouse_days=0)
+        self.seedB = dummySeed(crop, beginning_of_season=100)
+        self.seedC = dummySeed(crop, variety='baz', beginning_of_season=120)
+        self.seeds = [self.seedA, self.seedB, self.seedC]
+        self.crops = {'foo': crop}
+        self.maxManHours = timedelta(hours=1)
+        self.schedule = Schedule(
+            create_tasks(self.crops, self.seeds), self.maxManHours)
+
+
+    def _summary(self, events):
+        return [(type(event), event.seed.variety, event.when, event.quantity)
+                for event in events]
+
+
+    def test_added(self):
+        """
+        L{Schedule.change} with an added task returns a L{Schedule} with the
+        same events as scheduling all of the tasks from scratch.
+        """
+        added = SeedFlats(datetime(2012, 4, 20), self.seedA, 45)
+        changed = self.schedule.change(added=[added])
+        expected = Schedule(
+            sorted(self.schedule.tasks + [added], key=lambda t: t.when),
+            self.maxManHours)
+        self.assertEqual(
+            self._summary(expected.events), self._summary(changed.events))
+
+
+    def test_earlierDaysReused(self):
+        """
+        The events of the result of L{Schedule.change} for days before the
+        change are the same objects as in the original schedule.
+        """
+        added = SeedFlats(datetime(2012, 4, 20), self.seedA, 45)
+        changed = self.schedule.change(added=[added])
+        before = [event for event in self.schedule.events
+                  if event.date < added.date]
+        self.assertTrue(before)
+        for old, new in zip(before, changed.events):
+            self.assertIdentical(old, new)
+
+
+    def test_changedAgain(self):
+        """
+        Scheduling a variation of a L{Schedule} leaves the state it keeps for
+        each day as it was, so the same L{Schedule} can be changed again, and
+        so can the result.
+        """
+        # Both are added on a day which starts with tasks waiting for others
+        # to be done.
+        first = SeedFlats(datetime(2012, 5, 1), self.seedA, 45)
+        second = SeedFlats(datetime(2012, 5, 1), self.seedB, 30)
+        self.schedule.change(added=[first])
+        changed = self.schedule.change(added=[second])
+        expected = Schedule(
+            sorted(self.schedule.tasks + [second], key=lambda t: t.when),
+            self.maxManHours)
+        self.assertEqual(
+            self._summary(expected.events), self._summary(changed.events))
+
+        changed = changed.change(added=[first])
+        expected = Schedule(
+            sorted(self.schedule.tasks + [second, first],
+                   key=lambda t: t.when),
+            self.maxManHours)
+        self.assertEqual(
+            self._summary(expected.events), self._summary(changed.events))
+
+
+    def test_rescheduleSeed(self):
+        """
+        L{Schedule.reschedule_seed} re-creates the tasks for a seed which has
+        been changed and returns a L{Schedule} with the same events as
+        scheduling tasks for the changed seeds from scratch.
+        """
+        self.seedC.beginning_of_season = 110
+        changed = self.schedule.reschedule_seed(self.seedC)
+        expected = Schedule(
+            create_tasks(self.crops, self.seeds), self.maxManHours)
+        self.assertEqual(
+            self._summary(expected.events), self._summary(changed.events))
+
+
+    def test_rescheduleSeedYears(self):
+        """
+        L{Schedule.reschedule_seed} re-creates the tasks of the seed for every
+        one of the L{Schedule}'s C{years}, with its C{recurrence}.
+        """
+        years = [2012, 2013]
+        recurrence = Recurrence(weeding='FREQ=WEEKLY')
+        schedule = Schedule(
+            create_tasks(self.crops, self.seeds, years, recurrence),
+            self.maxManHours, years=years, recurrence=recurrence)
+        self.seedC.beginning_of_season = 110
+        changed = schedule.reschedule_seed(self.seedC)
+        expected = Schedule(
+            create_tasks(self.crops, self.seeds, years, recurrence),
+            self.maxManHours)
+        self.assertEqual(
+            self._summary(expected.events), self._summary(changed.events))
+        rescheduled = [
+            event for event in changed.events if event.seed is self.seedC]
+        self.assertEqual(
+            set([2012, 2013]), set(event.when.year for event in rescheduled))
+        self.assertIn(Weed, [type(event) for event in rescheduled])
+
+
+    def test_complete(self):
+        """
+        L{Schedule.complete} returns a L{Schedule} which does not include the
+        given task.
+        """
+        done = self.schedule.tasks[3]
+        changed = self.schedule.complete(done)
+        expected = Schedule(
+            [task for task in self.schedule.tasks if task is not done],
+            self.maxManHours)
+        self.assertEqual(
+            self._summary(expected.events), self._summary(changed.events))
+        self.assertNotIn(done, changed.tasks)
+
+
+class OccupancyTests(TestCase):
+    """
+    Tests for L{Occupancy}.
+    """
+    def test_empty(self):
+        """
+        Nothing is in use anywhere in a new L{Occupancy}.
+        """
+        self.assertEqual(0, Occupancy().peak(0, 100))
+
+
+    def test_peak(self):
+        """
+        L{Occupancy.peak} gives the largest total of the amounts added with
+        L{Occupancy.add} on any one day in the given range.
+        """
+        occupancy = Occupancy()
+        occupancy.add(10, 20, 2)
+        occupancy.add(15, 40, 3)
+        self.assertEqual(5, occupancy.peak(0, 100))
+        self.assertEqual(2, occupancy.peak(10, 15))
+        self.assertEqual(3, occupancy.peak(20, 21))
+        self.assertEqual(0, occupancy.peak(40, 50))
+        self.assertEqual(0, occupancy.peak(0, 10))
+
+
+    def test_grow(self):
+        """
+        L{Occupancy} keeps track of amounts added to days before and after any
+        it covered before.
+        """
+        occupancy = Occupancy()
+        occupancy.add(100, 101, 1)
+        occupancy.add(50, 60, 4)
+        occupancy.add(500, 600, 2)
+        occupancy.add(55, 550, 1)
+        self.assertEqual(5, occupancy.peak(0, 1000))
+        self.assertEqual(1, occupancy.peak(60, 100))
+        self.assertEqual(2, occupancy.peak(100, 500))
+        self.assertEqual(3, occupancy.peak(500, 501))
+        self.assertEqual(2, occupancy.peak(550, 600))
+
+
+    def test_firstFit(self):
+        """
+        L{Occupancy.first_fit} finds the earliest day on or after the one
+        given which begins a range of days with no more than the limit in use.
+        """
+        occupancy = Occupancy()
+        occupancy.add(10, 20, 2)
+        occupancy.add(25, 30, 3)
+        self.assertEqual(0, occupancy.first_fit(0, 10, 1))
+        self.assertEqual(20, occupancy.first_fit(8, 5, 1))
+        self.assertEqual(30, occupancy.first_fit(5, 6, 1))
+        self.assertEqual(5, occupancy.first_fit(5, 100, 3))
+        self.assertEqual(12, occupancy.first_fit(12, 3, 2))
+        self.assertRaises(ValueError, occupancy.first_fit, 0, 1, -1)
+
+
+
+class BedSpaceTests(TestCase):
+    """
+    Tests for L{BedSpace}.
+    """
+    def test_free(self):
+        """
+        L{BedSpace.free} gives the number of bed feet free on every day of a
+        range.
+        """
+        beds = BedSpace(100)
+        beds.reserve(date(2012, 5, 1), date(2012, 6, 1), 30)
+        beds.reserve(date(2012, 5, 15), date(2012, 7, 1), 50)
+        self.assertEqual(100, beds.free(date(2012, 4, 1), date(2012, 5, 1)))
+        self.assertEqual(70, beds.free(date(2012, 5, 1), date(2012, 5, 15)))
+        self.assertEqual(20, beds.free(date(2012, 4, 1), date(2012, 8, 1)))
+
+
+    def test_earliest(self):
+        """
+        L{BedSpace.earliest} finds the first day on which there is room for a
+        planting for as long as it is in the ground.
+        """
+        beds = BedSpace(100)
+        beds.reserve(date(2012, 5, 1), date(2012, 6, 1), 60)
+        self.assertEqual(
+            date(2012, 4, 1), beds.earliest(date(2012, 4, 1), 10, 50))
+        self.assertEqual(
+            date(2012, 6, 1), beds.earliest(date(2012, 4, 1), 31, 50))
+        self.assertEqual(
+            date(2012, 5, 10), beds.earliest(date(2012, 5, 10), 30, 40))
+        self.assertRaises(
+            ValueError, beds.earliest, date(2012, 4, 1), 10, 101)
+
+
+
+class FitBedsTests(TestCase):
+    """
+    Tests for L{fit_beds}.
+    """
+    def setUp(self):
+        self.crop = dummyCrop()
+        self.seedA = dummySeed(self.crop, greenhouse_days=0)
+        self.seedB = dummySeed(self.crop, greenhouse_days=0, variety='baz')
+        self.tasks = create_tasks(
+            {'foo': self.crop}, [self.seedA, self.seedB])
+
+
+    def test_room(self):
+        """
+        If there are enough bed feet for every planting, L{fit_beds} leaves the
+        tasks alone.
+        """
+        self.assertEqual((self.tasks, []), fit_beds(self.tasks, 1000))
+
+
+    def test_shift(self):
+        """
+        A planting which would need more bed feet than are free is moved, with
+        all of its tasks, to the first day there is room for it.
+        """
+        fitted, unfit = fit_beds(self.tasks, 30)
+        self.assertEqual([], unfit)
+        first = [task for task in self.tasks if task.seed is self.seedA]
+        self.assertEqual(
+            first, [task for task in fitted if task.seed is self.seedA])
+
+        # The first planting is in the ground until the end of its harvest.
+        harvest = first[-1]
+        shift = (
+            harvest.when + timedelta(days=self.seedA.harvest_duration)
+            - first[1].when)
+        moved = [task for task in fitted if task.seed is self.seedB]
+        self.assertEqual(
+            [_rescheduled(task, task.when + shift)
+             for task in self.tasks if task.seed is self.seedB],
+            moved)
+
+        # The moved tasks depend on each other, not on the originals.
+        preparation, planting, harvest = moved
+        self.assertIdentical(planting, preparation.dependents[0])
+        self.assertIdentical(harvest, planting.dependents[0])
+
+
+    def test_endOfSeason(self):
+        """
+        A planting which could only be fitted in too late to be harvested by
+        the C{end_of_season} of its seed variety is left out and reported.
+        """
+        late = dummySeed(
+            self.crop, greenhouse_days=0, variety='late', end_of_season=120)
+        tasks = create_tasks({'foo': self.crop}, [self.seedA, late])
+        fitted, unfit = fit_beds(tasks, 20)
+        self.assertEqual(
+            [task for task in tasks if task.seed is self.seedA], fitted)
+        self.assertEqual(
+            [task for task in tasks
+             if task.seed is late and isinstance(task, DirectSeed)],
+            unfit)
+
+
+    def test_tooLong(self):
+        """
+        A planting which needs more bed feet than there are at all is left out
+        and reported.
+        """
+        fitted, unfit = fit_beds(self.tasks, 10)
+        self.assertEqual([], fitted)
+        self.assertEqual(
+            [task for task in self.tasks if isinstance(task, DirectSeed)],
+            unfit)
+
+
+    def test_notMutated(self):
+        """
+        L{fit_beds} does not change the tasks passed to it.
+        """
+        expected = [_rescheduled(task, task.when) for task in self.tasks]
+        fit_beds(self.tasks, 30)
+        self.assertEqual(expected, self.tasks)
+
+
+
+class AssignBedsTests(TestCase):
+    """
+    Tests for L{assign_beds} and L{load_beds}.
+    """
+    def setUp(self):
+        self.crop = dummyCrop()
+        self.seed = dummySeed(self.crop, harvest_duration=10)
+        self.small = Bed('small', 10)
+        self.large = Bed('large', 30)
+        self.beds = [self.large, self.small]
+
+
+    def _planting(self, start, feet):
+        """
+        Make the tasks for a planting which is in the ground for 20 days from
+        C{start}.
+        """
+        planting = DirectSeed(start, self.seed, feet)
+        harvest = Harvest(start + timedelta(days=10), self.seed, feet)
+        planting.dependents = (harvest,)
+        return [planting, harvest]
+
+
+    def test_bestFit(self):
+        """
+        A planting goes in the shortest free stretch long enough for it.
+        """
+        tasks = self._planting(datetime(2012, 5, 1), 8)
+        placements, unplaced = assign_beds(tasks, self.beds)
+        self.assertEqual(
+            [Placement(tasks[0], self.small, 0, 8,
+                       date(2012, 5, 1), date(2012, 5, 21))],
+            placements)
+        self.assertEqual([], unplaced)
+
+
+    def test_sideBySide(self):
+        """
+        Plantings in the ground at the same time go side by side in a bed.
+        """
+        first = self._planting(datetime(2012, 5, 1), 15)
+        second = self._planting(datetime(2012, 5, 2), 12)
+        placements, unplaced = assign_beds(first + second, self.beds)
+        self.assertEqual(
+            [(self.large, 0, 15), (self.large, 15, 12)],
+            [(placement.bed, placement.offset, placement.feet)
+             for placement in placements])
+
+
+    def test_reuse(self):
+        """
+        A stretch of a bed is used again once the planting in it is out of the
+        ground.
+        """
+        first = self._planting(datetime(2012, 5, 1), 20)
+        second = self._planting(datetime(2012, 5, 10), 20)
+        third = self._planting(datetime(2012, 5, 30), 30)
+        placements, unplaced = assign_beds(
+            first + second + third, self.beds)
+        self.assertEqual(
+            [(self.large, 0, 20), (self.small, 0, 10), (self.large, 20, 10),
+             (self.large, 0, 30)],
+            [(placement.bed, placement.offset, placement.feet)
+             for placement in placements])
+        self.assertEqual([], unplaced)
+
+
+    def test_split(self):
+        """
+        A planting longer than any free stretch is split up between the
+        longest ones.
+        """
+        tasks = self._planting(datetime(2012, 5, 1), 35)
+        placements, unplaced = assign_beds(tasks, self.beds)
+        self.assertEqual(
+            [(self.large, 0, 30), (self.small, 0, 5)],
+            [(placement.bed, placement.offset, placement.feet)
+             for placement in placements])
+
+
+    def test_makeRoom(self):
+        """
+        Rather than split up a planting, a planting already in the ground is
+        moved to another stretch which was free when it went in, if that
+        leaves a stretch long enough for the new planting.
+        """
+        north = Bed('north', 10)
+        south = Bed('south', 5)
+        first = self._planting(datetime(2012, 5, 1), 6)
+        second = self._planting(datetime(2012, 5, 10), 3)
+        third = self._planting(datetime(2012, 5, 22), 9)
+        placements, unplaced = assign_beds(
+            first + second + third, [north, south])
+        self.assertEqual(
+            [(first[0], north, 0, 6), (second[0], south, 0, 3),
+             (third[0], north, 0, 9)],
+            [(placement.planting, placement.bed, placement.offset,
+              placement.feet)
+             for placement in placements])
+        self.assertEqual([], unplaced)
+
+
+    def test_makeRoomOnlyIfFree(self):
+        """
+        A planting already in the ground is not moved to a stretch which was
+        taken when it went in, even if it is free now.
+        """
+        north = Bed('north', 10)
+        south = Bed('south', 5)
+        first = self._planting(datetime(2012, 5, 1), 6)
+        second = self._planting(datetime(2012, 5, 10), 3)
+        # In the ground from 5/2 until 5/22, so south is not free on 5/10.
+        blocking = self._planting(datetime(2012, 5, 2), 5)
+        third = self._planting(datetime(2012, 5, 22), 9)
+        placements, unplaced = assign_beds(
+            first + blocking + second + third, [north, south])
+        self.assertEqual(
+            [(first[0], north, 0, 6), (blocking[0], south, 0, 5),
+             (second[0], north, 6, 3), (third[0], north, 0, 6),
+             (third[0], south, 0, 3)],
+            [(placement.planting, placement.bed, placement.offset,
+              placement.feet)
+             for placement in placements])
+
+
+    def test_noRoom(self):
+        """
+        A planting which needs more feet than are free is not placed, and is
+        returned as unplaced instead.
+        """
+        first = self._planting(datetime(2012, 5, 1), 30)
+        second = self._planting(datetime(2012, 5, 2), 20)
+        placements, unplaced = assign_beds(first + second, self.beds)
+        self.assertEqual([first[0]], [p.planting for p in placements])
+        self.assertEqual([second[0]], unplaced)
+
+
+    def test_loadBeds(self):
+        """
+        L{load_beds} reads L{Bed} instances from a CSV file with a header row.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "Name,Length\n"
+            "North 1,50\n"
+            "Hoop house,32.5\n")
+        self.assertEqual(
+            [Bed('North 1', 50), Bed('Hoop house', 32.5)], load_beds(path))
+
+
+
+class ScheduleGreenhouseTests(TestCase):
+    """
+    Tests for L{Schedule} with a limited number of flats in the greenhouse.
+    """
+    def test_deferSeeding(self):
+        """
+        Flat seeding which would need more flats than the greenhouse has free
+        is put off until the flats it needs are free, without holding up other
+        tasks.
+        """
+        crop = dummyCrop()
+        seedA = dummySeed(crop)
+        seedB = dummySeed(crop)
+        # 48 bed feet is two flats.
+        tasks = [SeedFlats(datetime(2012, 5, 1), seedA, 48),
+                 SeedFlats(datetime(2012, 5, 1), seedB, 48),
+                 BedPreparation(datetime(2012, 5, 1), seedB, 10)]
+        schedule = schedule_tasks(tasks, flats=3)
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 1, 8, 0, 0), seedA, 48),
+             BedPreparation(datetime(2012, 5, 1, 9, 36, 0), seedB, 10),
+             SeedFlats(datetime(2012, 5, 11, 8, 0, 0), seedB, 48)],
+            schedule)
+
+
+    def test_lateTransplant(self):
+        """
+        If transplanting is put off for lack of time, flats are not seeded
+        until the transplanting has actually made room for them.
+        """
+        crop = dummyCrop()
+        seedA = dummySeed(crop)
+        seedB = dummySeed(crop)
+        transplant = Transplant(datetime(2012, 5, 5), seedA, 48)
+        flats = SeedFlats(datetime(2012, 5, 1), seedA, 48)
+        flats.dependents = (transplant,)
+        tasks = [flats,
+                 BedPreparation(datetime(2012, 5, 5), seedB, 90),
+                 SeedFlats(datetime(2012, 5, 5), seedB, 48),
+                 transplant]
+        schedule = schedule_tasks(
+            tasks, maxManHours=timedelta(hours=3), flats=3)
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 1, 8, 0, 0), seedA, 48),
+             BedPreparation(datetime(2012, 5, 5, 8, 0, 0), seedB, 90),
+             Transplant(datetime(2012, 5, 6, 8, 0, 0), seedA, 48),
+             SeedFlats(datetime(2012, 5, 7, 8, 0, 0), seedB, 48)],
+            schedule)
+
+
+    def test_neverExceeded(self):
+        """
+        However the seeding of a whole plan is put off, no more flats than the
+        greenhouse holds are ever in use.
+        """
+        crop = dummyCrop()
+        seeds = [
+            dummySeed(crop, variety=str(i), beginning_of_season=90 + i)
+            for i in range(10)]
+        tasks = create_tasks({'foo': crop}, seeds)
+        schedule = Schedule(tasks, flats=5)
+
+        transplanted = {}
+        for event, source in zip(schedule.events, schedule.sources):
+            if isinstance(event, Transplant):
+                transplanted[id(source)] = event.date
+        inUse = defaultdict(int)
+        for event, source in zip(schedule.events, schedule.sources):
+            if isinstance(event, SeedFlats):
+                day = event.date
+                while day <= transplanted[id(source.dependents[0])]:
+                    inUse[day] += event.required_flats()
+                    day += timedelta(days=1)
+        self.assertEqual(5, max(inUse.values()))
+
+
+    def test_change(self):
+        """
+        L{Schedule.change} on a schedule with a limited number of flats gives
+        the same result as scheduling the changed tasks from scratch.
+        """
+        crop = dummyCrop()
+        seeds = [
+            dummySeed(crop, variety=str(i), beginning_of_season=90 + i)
+            for i in range(10)]
+        tasks = create_tasks({'foo': crop}, seeds)
+        schedule = Schedule(tasks, flats=5)
+        added = SeedFlats(datetime(2012, 3, 25), seeds[0], 24)
+        changed = schedule.change(added=[added])
+        expected = Schedule(
+            sorted(tasks + [added], key=lambda task: task.when), flats=5)
+        self.assertEqual(expected.events, changed.events)
+
+
+    def test_tooBig(self):
+        """
+        L{Schedule} raises L{ValueError} if there is flat seeding which needs
+        more flats than the greenhouse holds.
+        """
+        crop = dummyCrop()
+        seed = dummySeed(crop)
+        tasks = [SeedFlats(datetime(2012, 5, 1), seed, 48)]
+        self.assertRaises(ValueError, schedule_tasks, tasks, flats=1)
+
+
+
+class CoalesceFragmentsTests(TestCase):
+    """
+    Tests for L{coalesce_fragments}.
+    """
+    def setUp(self):
+        self.seed = dummySeed(dummyCrop())
+        self.source = SeedFlats(datetime(2012, 5, 1), self.seed, 100)
+
+
+    def test_merge(self):
+        """
+        Fragments of the same task done one after another on the same day are
+        merged into one, done when the first of them is, with all of their
+        footage.
+        """
+        events = [
+            SeedFlats(datetime(2012, 5, 1, 8), self.seed, 30),
+            SeedFlats(datetime(2012, 5, 1, 9), self.seed, 70)]
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 1, 8), self.seed, 100)],
+            coalesce_fragments(events, [self.source] * 2))
+
+
+    def test_differentDays(self):
+        """
+        Fragments of the same task done on different days are left alone.
+        """
+        events = [
+            SeedFlats(datetime(2012, 5, 1, 8), self.seed, 30),
+            SeedFlats(datetime(2012, 5, 2, 8), self.seed, 70)]
+        self.assertEqual(
+            events, coalesce_fragments(events, [self.source] * 2))
+
+
+    def test_differentTasks(self):
+        """
+        Events made from different tasks are not merged, even when they are
+        alike.
+        """
+        other = SeedFlats(datetime(2012, 5, 1), self.seed, 100)
+        events = [
+            SeedFlats(datetime(2012, 5, 1, 8), self.seed, 30),
+            SeedFlats(datetime(2012, 5, 1, 9), self.seed, 70)]
+        self.assertEqual(
+            events, coalesce_fragments(events, [self.source, other]))
+
+
+    def test_empty(self):
+        """
+        Fragments with no footage are dropped, and the fragments on either
+        side of them may then be merged.
+        """
+        finish = FinishPlanning(self.seed)
+        events = [
+            finish,
+            SeedFlats(datetime(2012, 5, 1, 8), self.seed, 30),
+            SeedFlats(datetime(2012, 5, 1, 9), self.seed, 0),
+            SeedFlats(datetime(2012, 5, 1, 9), self.seed, 70)]
+        self.assertEqual(
+            [finish, SeedFlats(datetime(2012, 5, 1, 8), self.seed, 100)],
+            coalesce_fragments(events, [finish] + [self.source] * 3))
+
+
+    def test_dependents(self):
+        """
+        A merged fragment has the dependents of the task it was made from.
+        """
+        harvest = Harvest(datetime(2012, 6, 1), self.seed, 100)
+        first, second = DirectSeed(datetime(2012, 5, 1), self.seed, 100).split(
+            timedelta(minutes=25))
+        first.dependents = second.dependents = (harvest,)
+        [merged] = coalesce_fragments([first, second], [self.source] * 2)
+        self.assertEqual((harvest,), merged.dependents)
+
+
+    def test_scheduleTasks(self):
+        """
+        L{schedule_tasks} and L{iter_schedule} leave out fragments with no
+        footage if asked to coalesce them, and days with nothing else to do.
+        """
+        tasks = [
+            SeedFlats(datetime(2012, 5, 1), self.seed, 0),
+            SeedFlats(datetime(2012, 5, 2), self.seed, 10)]
+        expected = [SeedFlats(datetime(2012, 5, 2, 8), self.seed, 10)]
+        self.assertEqual(expected, schedule_tasks(tasks, coalesce=True))
+        self.assertEqual(
+            [(date(2012, 5, 2), expected)],
+            list(iter_schedule(tasks, coalesce=True)))
+        self.assertEqual(2, len(schedule_tasks(tasks)))
+
+
+
+class TaskWindowTests(TestCase):
+    """
+    Tests for L{task_window}.
+    """
+    def test_transplanted(self):
+        """
+        Transplanting must be done before seedlings have waited half as long
+        again as their greenhouse days, and so must preparing the bed; flats
+        must be seeded the greenhouse days before that; and harvesting must
+        be done within the harvest duration.
+        """
+        seed = dummySeed(dummyCrop())
+        tasks = create_tasks({}, [seed])
+        self.assertEqual(
+            [(BedPreparation, datetime(2012, 3, 17), datetime(2012, 4, 5)),
+             (SeedFlats, datetime(2012, 3, 21), datetime(2012, 3, 26)),
+             (Transplant, datetime(2012, 3, 31), datetime(2012, 4, 5)),
+             (Harvest, datetime(2012, 4, 10), datetime(2012, 4, 23))],
+            [(type(task),) + task_window(task) for task in tasks])
+
+
+    def test_directSeeded(self):
+        """
+        Direct seeding must be done in time for the planting to mature by the
+        end of the season.
+        """
+        seed = dummySeed(dummyCrop(), greenhouse_days=0)
+        planting = create_tasks({}, [seed])[1]
+        self.assertEqual(
+            (datetime(2012, 3, 31), datetime(2012, 6, 29)),
+            task_window(planting))
+
+
+    def test_endOfSeason(self):
+        """
+        Harvesting must be done by the end of the season, but a task planned
+        for after its deadline may still be done on the day it was planned
+        for.
+        """
+        seed = dummySeed(dummyCrop(), harvest_duration=None)
+        harvest = Harvest(datetime(2012, 7, 1), seed, 10)
+        self.assertEqual(
+            (datetime(2012, 7, 1), datetime(2012, 7, 19)),
+            task_window(harvest))
+        late = Harvest(datetime(2012, 8, 1), seed, 10)
+        self.assertEqual(
+            (datetime(2012, 8, 1), datetime(2012, 8, 1)), task_window(late))
+
+
+    def test_noDeadline(self):
+        """
+        Planning and weeding have no deadline.
+        """
+        seed = dummySeed(dummyCrop())
+        weed = Weed(datetime(2012, 5, 1), seed, 10)
+        self.assertEqual((datetime(2012, 5, 1), None), task_window(weed))
+        self.assertEqual(
+            (datetime(2012, 1, 1), None), task_window(FinishPlanning(seed)))
+
+
+
+class ScheduleDeadlinesTests(TestCase):
+    """
+    Tests for L{schedule_deadlines}.
+    """
+    def setUp(self):
+        crop = dummyCrop()
+        self.urgent = dummySeed(crop, variety='urgent', harvest_duration=1)
+        self.relaxed = dummySeed(crop, variety='relaxed')
+
+
+    def test_earliestDeadlineFirst(self):
+        """
+        Of the tasks which may be done on a day, the one with the earliest
+        deadline is done first.
+        """
+        weed = Weed(datetime(2012, 5, 1), self.relaxed, 6)
+        harvest = Harvest(datetime(2012, 5, 1), self.urgent, 30)
+        result = schedule_deadlines(
+            [weed, harvest], maxManHours=timedelta(hours=1))
+        self.assertEqual(
+            [Harvest(datetime(2012, 5, 1, 8), self.urgent, 30),
+             Weed(datetime(2012, 5, 2, 8), self.relaxed, 6)],
+            result.events)
+        self.assertEqual([harvest, weed], result.sources)
+        self.assertEqual([], result.missed)
+
+
+    def test_missed(self):
+        """
+        A task which cannot be done by its deadline is left out of the
+        schedule and reported, along with the tasks which depend on it.
+        """
+        first = Harvest(datetime(2012, 5, 1), self.urgent, 30)
+        second = Harvest(datetime(2012, 5, 1), self.urgent, 30)
+        weed = Weed(datetime(2012, 5, 3), self.relaxed, 6)
+        second.dependents = (weed,)
+        result = schedule_deadlines(
+            [first, second, weed], maxManHours=timedelta(hours=1))
+        self.assertEqual(
+            [Harvest(datetime(2012, 5, 1, 8), self.urgent, 30)],
+            result.events)
+        self.assertEqual(
+            [MissedDeadline(second, datetime(2012, 5, 1)),
+             MissedDeadline(weed, None, second)],
+            result.missed)
+
+
+    def test_delayedDependents(self):
+        """
+        When a task is put off, the deadlines of the tasks depending on it
+        which are counted from the day they are ready move along with them.
+        """
+        harvest = Harvest(datetime(2012, 5, 1), self.urgent, 30)
+        planting = DirectSeed(datetime(2012, 5, 1), self.urgent, 120)
+        following = Harvest(datetime(2012, 5, 3), self.urgent, 30)
+        planting.dependents = (following,)
+        result = schedule_deadlines(
+            [harvest, planting, following], maxManHours=timedelta(hours=1))
+        self.assertEqual(
+            [Harvest(datetime(2012, 5, 1, 8), self.urgent, 30),
+             DirectSeed(datetime(2012, 5, 2, 8), self.urgent, 120),
+             Harvest(datetime(2012, 5, 4, 8), self.urgent, 30)],
+            result.events)
+        self.assertEqual([], result.missed)
+
+
+    def test_waitForSplit(self):
+        """
+        A task is not done while a task it depends on is still being done over
+        several days, even if its own deadline is earlier, and its deadline
+        moves along with the one it depends on.
+        """
+        transplant = Transplant(datetime(2012, 5, 1), self.urgent, 150)
+        harvest = Harvest(datetime(2012, 5, 2), self.urgent, 15)
+        transplant.dependents = (harvest,)
+        result = schedule_deadlines(
+            [transplant, harvest], maxManHours=timedelta(hours=1))
+        self.assertEqual(
+            [Transplant(datetime(2012, 5, 1, 8), self.urgent, 60),
+             Transplant(datetime(2012, 5, 2, 8), self.urgent, 60),
+             Transplant(datetime(2012, 5, 3, 8), self.urgent, 30),
+             Harvest(datetime(2012, 5, 4, 8), self.urgent, 15)],
+            result.events)
+        self.assertEqual([], result.missed)
+
+
+    def test_empty(self):
+        """
+        Without any tasks, the schedule is empty.
+        """
+        result = schedule_deadlines([])
+        self.assertEqual(([], [], []), (
+                result.events, result.sources, result.missed))
+
+
+
+class ScheduleHorizonTests(TestCase):
+    """
+    Tests for L{schedule_horizon}.
+    """
+    def setUp(self):
+        self.seed = dummySeed(dummyCrop())
+
+
+    def test_window(self):
+        """
+        The weeks before the horizon are scheduled just as they are by
+        L{schedule_tasks}, leaving out the tasks planned before the first
+        day.
+        """
+        tasks = [
+            SeedFlats(datetime(2012, 4, 20 + i), self.seed, 60 + 10 * i)
+            for i in range(10)]
+        maxManHours = timedelta(hours=3)
+        result = schedule_horizon(tasks, date(2012, 4, 22), 1, maxManHours)
+        self.assertEqual(date(2012, 4, 29), result.end)
+        expected = schedule_tasks(tasks[2:], maxManHours)
+        self.assertEqual(
+            [event for event in expected if event.date < result.end],
+            result.events)
+
+
+    def test_estimate(self):
+        """
+        The work past the horizon is estimated a week at a time, each week
+        doing as much of it (and of the backlog from earlier weeks) as there
+        is time for.
+        """
+        tasks = [
+            SeedFlats(datetime(2012, 5, 1), self.seed, 30),
+            SeedFlats(datetime(2012, 5, 9), self.seed, 300),
+            SeedFlats(datetime(2012, 5, 20), self.seed, 60)]
+        result = schedule_horizon(
+            tasks, date(2012, 5, 1), 1, timedelta(hours=1))
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 1, 8), self.seed, 30)],
+            result.events)
+        self.assertEqual(
+            [WeekEstimate(date(2012, 5, 8), timedelta(hours=10),
+                          timedelta(hours=7), timedelta(hours=3)),
+             WeekEstimate(date(2012, 5, 15), timedelta(hours=2),
+                          timedelta(hours=5), timedelta())],
+            result.estimate)
+
+
+    def test_unfinished(self):
+        """
+        Work which is still waiting to be done at the horizon is part of the
+        estimate.
+        """
+        tasks = [SeedFlats(datetime(2012, 5, 1), self.seed, 600)]
+        result = schedule_horizon(
+            tasks, date(2012, 5, 1), 1, timedelta(hours=2))
+        self.assertEqual(7, len(result.events))
+        # The fragments can be told apart from separate tasks, so they can be
+        # coalesced.
+        self.assertEqual(tasks * 7, result.sources)
+        self.assertEqual(
+            [WeekEstimate(date(2012, 5, 8), timedelta(hours=6),
+                          timedelta(hours=6), timedelta())],
+            result.estimate)
+
+
+    def test_withinHorizon(self):
+        """
+        If all of the work is done before the horizon, there is nothing to
+        estimate.
+        """
+        tasks = [SeedFlats(datetime(2012, 5, 1), self.seed, 30)]
+        result = schedule_horizon(tasks, date(2012, 4, 1), 8)
+        self.assertEqual(1, len(result.events))
+        self.assertEqual([], result.estimate)
+        self.assertEqual([], schedule_horizon([], date(2012, 4, 1), 8).events)
+
+
+
+class ScheduleOptimizerTests(TestCase):
+    """
+    Tests for L{ScheduleOptimizer}.
+    """
+    def _optimizer(self, tasks, maxManHours=timedelta(hours=3)):
+        # A clock which advances by a tenth of a second each time it is asked,
+        # so a run lasts a fixed number of moves.
+        ticks = iter(xrange(10 ** 6))
+        clock = lambda: ticks.next() / 10.0
+        return ScheduleOptimizer(
+            Schedule(tasks, maxManHours), Random(1234), clock)
+
+
+    def test_harvestGaps(self):
+        """
+        L{ScheduleOptimizer.run} spreads out harvests of a crop which the
+        greedy scheduler leaves bunched together, when that makes the schedule
+        cheaper.
+        """
+        crop = dummyCrop()
+        seed = dummySeed(crop)
+        tasks = [Harvest(datetime(2012, 5, 1), seed, 5),
+                 Harvest(datetime(2012, 5, 1), seed, 5),
+                 Harvest(datetime(2012, 5, 21), seed, 5)]
+        optimizer = self._optimizer(tasks)
+        before = optimizer.cost
+        events = optimizer.run(10)
+        self.assertTrue(optimizer._cost() < before)
+        days = [event.date for event in events]
+        self.assertEqual(date(2012, 5, 1), days[0])
+        self.assertTrue(date(2012, 5, 1) < days[1] < date(2012, 5, 21))
+        self.assertEqual(date(2012, 5, 21), days[2])
+
+
+    def test_constraints(self):
+        """
+        L{ScheduleOptimizer.run} never moves a task before the day it was
+        planned for, before a task it depends on, or onto a day without
+        enough time for it, and it schedules all of the work.
+        """
+        crop = dummyCrop()
+        seed = dummySeed(crop)
+        tasks = create_tasks({'foo': crop}, [seed])
+        tasks.extend(
+            SeedFlats(tasks[1].when, dummySeed(crop), 40) for i in range(4))
+        tasks.sort(key=lambda task: task.when)
+        optimizer = self._optimizer(tasks)
+        events = optimizer.run(10)
+
+        self.assertEqual(
+            sum(task.quantity for task in tasks),
+            sum(event.quantity for event in events))
+
+        days = defaultdict(timedelta)
+        for event in events:
+            days[event.date] += event.duration
+        self.assertTrue(max(days.values()) <= timedelta(hours=3))
+
+        order = [event.__class__ for event in events if event.seed is seed]
+        self.assertTrue(
+            order.index(Transplant) > order.index(BedPreparation)
+            and order.index(Transplant) > order.index(SeedFlats))
+        self.assertEqual(Harvest, order[-1])
+        for event in events:
+            if event.seed is seed:
+                planned = [
+                    task for task in tasks if task.__class__ is event.__class__
+                    and task.seed is seed][0]
+                self.assertTrue(event.date >= planned.date)
+
+
+    def test_incrementalCost(self):
+        """
+        The cost L{ScheduleOptimizer} keeps up to date as it moves tasks is the
+        same as the cost of the resulting schedule computed from scratch.
+        """
+        crop = dummyCrop()
+        tasks = [
+            SeedFlats(datetime(2012, 5, 1 + i % 3), dummySeed(crop), 50)
+            for i in range(10)]
+        optimizer = self._optimizer(tasks)
+        optimizer.run(10)
+        self.assertAlmostEqual(optimizer._cost(), optimizer.cost)
+
+
+    def test_cheapest(self):
+        """
+        L{ScheduleOptimizer.run} gives the cheapest schedule it found, even if
+        the search went on to more expensive ones afterwards.
+        """
+        seed = dummySeed(dummyCrop())
+        tasks = [Harvest(datetime(2012, 5, 1), seed, 5),
+                 Harvest(datetime(2012, 5, 1), seed, 5),
+                 Harvest(datetime(2012, 5, 21), seed, 5)]
+        optimizer = self._optimizer(tasks)
+        moves = [(1, date(2012, 5, 11).toordinal()),
+                 (1, date(2012, 5, 12).toordinal())]
+        optimizer._step = lambda temperature: optimizer._move(*moves.pop(0))
+        optimizer.movesPerCheck = 1
+        events = optimizer.run(0.2)
+        self.assertEqual([], moves)
+        self.assertEqual(
+            [date(2012, 5, 1), date(2012, 5, 11), date(2012, 5, 21)],
+            [event.date for event in events])
+
+
+    def test_coalesce(self):
+        """
+        Fragments of a task split over several days by the greedy scheduler
+        and moved onto the same day by the optimizer are merged if it is asked
+        to coalesce them.
+        """
+        seed = dummySeed(dummyCrop())
+        optimizer = self._optimizer(
+            [SeedFlats(datetime(2012, 5, 1), seed, 170)])
+        day = date(2012, 5, 3).toordinal()
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 3, 8), seed, 90),
+             SeedFlats(datetime(2012, 5, 3, 11), seed, 80)],
+            optimizer._events_for([day, day]))
+        self.assertEqual(
+            [SeedFlats(datetime(2012, 5, 3, 8), seed, 170)],
+            optimizer._events_for([day, day], coalesce=True))
+
+
+
+class ScheduleCrewTests(TestCase):
+    """
+    Tests for L{schedule_crew}, a scheduler which spreads tasks out amongst
+    several workers.
+    """
+    def setUp(self):
+        crop = dummyCrop()
+        self.seedA = dummySeed(crop)
+        self.seedB = dummySeed(crop)
+        self.alice = Worker('alice', timedelta(hours=3))
+        self.bob = Worker('bob', timedelta(hours=2))
+
+
+    def _summary(self, assignments):
+        return [(a.worker.name, a.task.seed, a.task.when, a.task.quantity)
+                for a in assignments]
+
+
+    def test_concurrent(self):
+        """
+        Tasks which would have to be done one after another by a single worker
+        are done at the same time by different workers.
+        """
+        tasks = [
+            SeedFlats(datetime(2012, 5, 1), self.seedA, 10),
+            SeedFlats(datetime(2012, 5, 1), self.seedB, 10)]
+        assignments = schedule_crew(tasks, [self.alice, self.bob])
+        self.assertEqual(
+            [('alice', self.seedA, datetime(2012, 5, 1, 8, 0, 0), 10),
+             ('bob', self.seedB, datetime(2012, 5, 1, 8, 0, 0), 10)],
+            self._summary(assignments))
+
+
+    def test_split(self):
+        """
+        A task which takes longer than a worker has left in the day is split
+        up, with the remainder going to whoever is free next.
+        """
+        tasks = [SeedFlats(datetime(2012, 5, 1), self.seedA, 120)]
+        assignments = schedule_crew(tasks, [self.alice, self.bob])
+        self.assertEqual(
+            [('alice', self.seedA, datetime(2012, 5, 1, 8, 0, 0), 90),
+             ('bob', self.seedA, datetime(2012, 5, 1, 8, 0, 0), 30)],
+            self._summary(assignments))
+
+
+    def test_shortDay(self):
+        """
+        A worker whose hours are no more than L{Schedule.endOfDayWaste} still
+        does a fragment of a task which does not fit in their day, rather than
+        putting it off forever.
+        """
+        tiny = Worker('tiny', Schedule.endOfDayWaste)
+        tasks = [SeedFlats(datetime(2012, 5, 1), self.seedA, 100)]
+        assignments = schedule_crew(tasks, [tiny])
+        self.assertEqual(
+            [datetime(2012, 5, day, 8, 0, 0) for day in range(1, 8)],
+            [assignment.task.when for assignment in assignments])
+        self.assertEqual(
+            100, sum(assignment.task.quantity for assignment in assignments))
+        for assignment in assignments:
+            self.assertTrue(assignment.task.duration <= tiny.hours)
+
+
+    def test_dependents(self):
+        """
+        A task which depends on another is not started by a free worker until
+        the other task is finished.
+        """
+        transplant = Transplant(datetime(2012, 5, 1), self.seedA, 30)
+        flats = SeedFlats(datetime(2012, 5, 1), self.seedA, 30)
+        flats.dependents = (transplant,)
+        assignments = schedule_crew([flats, transplant], [self.alice, self.bob])
+        self.assertEqual(
+            [('alice', self.seedA, datetime(2012, 5, 1, 8, 0, 0), 30),
+             ('alice', self.seedA, datetime(2012, 5, 1, 9, 0, 0), 30)],
+            self._summary(assignments))
+
+
+    def test_daysOff(self):
+        """
+        A worker is not given any tasks on their days off or on days they are
+        unavailable.
+        """
+        # 2012-05-05 is a Saturday
+        alice = Worker(
+            'alice', timedelta(hours=3), days_off=frozenset([5]),
+            unavailable=frozenset([date(2012, 5, 6)]))
+        tasks = [SeedFlats(datetime(2012, 5, 5), self.seedA, 10)]
+        assignments = schedule_crew(tasks, [alice])
+        self.assertEqual(
+            [('alice', self.seedA, datetime(2012, 5, 7, 8, 0, 0), 10)],
+            self._summary(assignments))
+
+
+    def test_loadWorkers(self):
+        """
+        L{load_workers} reads L{Worker} instances from a CSV file with a
+        header row.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "Name,Hours,Days Off,Unavailable\n"
+            "alice,3,Sat Sun,7/4/12\n"
+            "bob,2.5,,\n")
+        self.assertEqual(
+            [Worker('alice', timedelta(hours=3), frozenset([5, 6]),
+                    frozenset([date(2012, 7, 4)])),
+             Worker('bob', timedelta(hours=2.5), frozenset(), frozenset())],
+            load_workers(path))
+
+
+class ScenarioTests(TestCase):
+    """
+    Tests for L{evaluate_scenario}, L{compare_scenarios} and
+    L{load_scenarios}.
+    """
+    def setUp(self):
+        # A low yield, to make for a lot of bed feet and so a lot of work.
+        self.crop = dummyCrop(yield_lbs_per_bed_foot=0.2)
+        self.crops = {'foo': self.crop}
+        # Only sold by the packet, so the order is easy to work out.
+        prices = dict.fromkeys([
+                'dollars_per_hundred', 'dollars_per_two_fifty',
+                'dollars_per_five_hundred', 'dollars_per_thousand',
+                'dollars_per_five_thousand', 'dollars_per_quarter_oz',
+                'dollars_per_half_oz', 'dollars_per_oz',
+                'dollars_per_eighth_lb', 'dollars_per_quarter_lb',
+                'dollars_per_half_lb', 'dollars_per_lb', 'dollars_per_mini'])
+        self.seed = dummySeed(
+            self.crop, variety='bar', greenhouse_days=0,
+            intergenerational_weeks=1, **prices)
+        self.seeds = [self.seed]
+
+
+    def test_base(self):
+        """
+        L{evaluate_scenario} with no overrides reports on the plan as it is:
+        the cost of the seed order, the most work on any day and in any week,
+        the most flats in use, and the pounds harvested each week.
+        """
+        result = evaluate_scenario(self.crops, self.seeds, Scenario('base'))
+        self.assertEqual(
+            sum(item.cost() for item in make_order(self.crops, self.seeds)),
+            result.order_cost)
+        self.assertEqual(0, result.peak_flats)
+        events = schedule_tasks(create_tasks(self.crops, self.seeds))
+        self.assertEqual(
+            max(event.duration for event in events), result.peak_day_hours)
+        harvest = defaultdict(float)
+        for event in events:
+            if isinstance(event, Harvest):
+                monday = event.date - timedelta(days=event.date.weekday())
+                harvest[monday] += 0.2 * event.quantity
+        self.assertEqual(sorted(harvest.items()), result.harvest)
+        self.assertAlmostEqual(
+            0.2 * self.seed.bed_feet,
+            sum(pounds for (week, pounds) in result.harvest))
+
+
+    def test_overrides(self):
+        """
+        The hours, overrun and generations of a L{Scenario} replace those of
+        the plan, without changing the plan itself.
+        """
+        base = evaluate_scenario(self.crops, self.seeds, Scenario('base'))
+        result = evaluate_scenario(
+            self.crops, self.seeds,
+            Scenario('changed', timedelta(hours=1), 2.0, {'bar': (2, 0)}))
+        self.assertTrue(result.order_cost > base.order_cost)
+        self.assertTrue(base.peak_day_hours > timedelta(hours=1))
+        self.assertTrue(result.peak_day_hours <= timedelta(hours=1))
+        self.assertTrue(len(result.harvest) > len(base.harvest))
+        self.assertEqual(None, self.seed.fresh_generations)
+        self.assertEqual([self.seed], self.crop.varieties)
+
+
+    def test_parallel(self):
+        """
+        L{compare_scenarios} gives the same results using worker processes as
+        it does in this process.
+        """
+        scenarios = [
+            Scenario('base'), Scenario('short', timedelta(hours=1)),
+            Scenario('successions', generations={'bar': (3, 1)})]
+        self.assertEqual(
+            compare_scenarios(self.crops, self.seeds, scenarios, 1),
+            compare_scenarios(self.crops, self.seeds, scenarios, 2))
+
+
+    def test_load(self):
+        """
+        L{load_scenarios} reads L{Scenario}s from a CSV file with a header row,
+        leaving anything not given as it is in the plan.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(
+            "Name,Hours,Overrun,Generations\n"
+            "base,,,\n"
+            "busy,8,0.5,bar=2/1; baz=3\n")
+        self.assertEqual(
+            [Scenario('base', None, None, {}),
+             Scenario('busy', timedelta(hours=8), 0.5,
+                      {'bar': (2, 1), 'baz': (3, 0)})],
+            load_scenarios(path))
+
+
+
+class HarvestCurvesTests(TestCase):
+    """
+    Tests for L{HarvestCurves}.
+    """
+    def test_single(self):
+        """
+        One generation yields a pound spread evenly over the days it is
+        harvested.
+        """
+        curves = HarvestCurves()
+        self.assertEqual((0.7, 0.3), curves.curve(10, 3, 1))
+        self.assertEqual((1.0,), curves.curve(7, 3, 1))
+
+
+    def test_succession(self):
+        """
+        Each later generation yields the same as the first, the given number
+        of weeks later.
+        """
+        curves = HarvestCurves()
+        self.assertEqual((0.7, 1.0, 0.3), curves.curve(10, 1, 2))
+        self.assertEqual(
+            (0.7, 0.3, 0.7, 0.3, 0.7, 0.3), curves.curve(10, 2, 3))
+
+
+    def test_remembered(self):
+        """
+        Each curve is worked out once.
+        """
+        curves = HarvestCurves()
+        curve = curves.curve(10, 2, 3)
+        self.assertIdentical(curve, curves.curve(10, 2, 3))
+
+
+
+class OptimizeSuccessionTests(TestCase):
+    """
+    Tests for L{optimize_succession} and L{optimize_successions}.
+    """
+    def setUp(self):
+        # 4 pounds a week for 5 weeks, grown in 10 bed feet.
+        self.crop = dummyCrop(fresh_eating_lbs=4, storage_eating_lbs=0)
+        self.seed = dummySeed(self.crop, harvest_duration=7)
+
+
+    def test_even(self):
+        """
+        The best succession harvests exactly the pounds wanted each week, if
+        there is one.  The succession planted now is compared with it.
+        """
+        current, best = optimize_succession(self.seed, HarvestCurves())
+        self.assertEqual(Succession(self.seed, 1, None, 16 ** 2 + 4 * 4 ** 2),
+                         current)
+        self.assertEqual(Succession(self.seed, 5, 1, 0), best)
+
+
+    def test_endOfSeason(self):
+        """
+        Every generation must be ready to harvest by the end of the season.
+        """
+        self.seed.end_of_season = 110
+        current, best = optimize_succession(self.seed, HarvestCurves())
+        self.assertEqual(
+            Succession(self.seed, 2, 1, 2 * 6 ** 2 + 3 * 4 ** 2), best)
+
+
+    def test_improvement(self):
+        """
+        More generations are only chosen if they reduce the error enough.
+        """
+        current, best = optimize_succession(
+            self.seed, HarvestCurves(), improvement=1)
+        self.assertEqual(current, best)
+
+
+    def test_unsearchable(self):
+        """
+        Seed varieties with no known yield or season, or only planted for
+        storage, are not searched.
+        """
+        seeds = [
+            self.seed,
+            dummySeed(dummyCrop(yield_lbs_per_bed_foot=None, _bed_feet=10)),
+            dummySeed(self.crop, beginning_of_season=None),
+            dummySeed(self.crop, fresh_generations=0, storage_generations=1)]
+        curves = HarvestCurves()
+        for seed in seeds[1:]:
+            self.assertIdentical(None, optimize_succession(seed, curves))
+        self.assertEqual(
+            [optimize_succession(self.seed, curves)],
+            optimize_successions(seeds))
+
+
+
+class LivePlanTests(TestCase):
+    """
+    Tests for L{LivePlan}, a crop plan which is reloaded when its input files
+    change.
+    """
+    CROPS = (
+        "garbage\n"
+        "Crop,Eating lb/wk,Fresh Eating Weeks,Storage Pounds Per Week,"
+        "Storage Eating Weeks,Variety,Harvest wks,Row Feet Per Ounce Seed,"
+        "Yield Pounds Per Foot,Rows / Bed,Spacing (inches),Bed Feet\n"
+        "carrots,2,10,0,0,,2,280,1,3,2,\n"
+        "beets,3,10,0,0,,2,160,1,3,6,\n")
+
+    def _seeds(self, beet_greenhouse):
+        """
+        Construct the contents of a seed variety CSV file with one carrot and
+        one beet variety.
+        """
+        header = LoadSeedsTests.HEADER.split(",")
+        rows = [
+            {"Type": "carrots", "Variety": "Bolero", "Product ID": "216",
+             "Greenhouse (days)": "0", "Outside": "04/14/12",
+             "Maturity (total days from seeding)": "75",
+             "End of season": "10/15/12"},
+            {"Type": "beets", "Variety": "Red Ace", "Product ID": "300",
+             "Greenhouse (days)": str(beet_greenhouse), "Outside": "05/01/12",
+             "Maturity (total days from seeding)": "50",
+             "End of season": "10/15/12"}]
+        lines = [",".join(header)]
+        for row in rows:
+            lines.append(",".join([row.get(column, "") for column in header]))
+        return "\n".join(lines) + "\n"
+
+
+    def setUp(self):
+        self.cropPath = FilePath(self.mktemp())
+        self.cropPath.setContent(self.CROPS)
+        self.seedPath = FilePath(self.mktemp())
+        self.seedPath.setContent(self._seeds(21))
+        self.created = []
+        def create(seed):
+            self.created.append(seed.variety)
+            return _create_seed_tasks(seed)
+        self.patch(cropplan, '_create_seed_tasks', create)
+
+
+    def _touch(self, path):
+        """
+        Move the modification time of C{path} forward, so the change is noticed
+        even on filesystems with coarse timestamps.
+        """
+        when = path.getModificationTime() + 10
+        os.utime(path.path, (when, when))
+
+
+    def test_schedule(self):
+        """
+        L{LivePlan.schedule} is the schedule for the tasks created from the
+        crops and seeds in the input files.
+        """
+        plan = LivePlan(self.cropPath, self.seedPath)
+        crops = load_crops(self.cropPath)
+        seeds = load_seeds(self.seedPath, crops)
+        expected = schedule_tasks(create_tasks(crops, seeds))
+        self.assertEqual(
+            [(type(task), task.when, task.quantity) for task in expected],
+            [(type(task), task.when, task.quantity) for task in plan.schedule])
+
+
+    def test_horizon(self):
+        """
+        With a horizon, L{LivePlan.schedule} only covers that many weeks from
+        today, and is scheduled again when the day changes.
+        """
+        today = [date(2012, 4, 14)]
+        plan = LivePlan(
+            self.cropPath, self.seedPath, horizon=2, today=lambda: today[0])
+        days = set(task.date for task in plan.schedule)
+        self.assertTrue(days)
+        self.assertTrue(
+            date(2012, 4, 14) <= min(days) <= max(days) < date(2012, 4, 28))
+        self.assertTrue(plan.estimate)
+        self.assertIn('Backlog', plan.render('estimate'))
+
+        today[0] = date(2012, 5, 1)
+        plan.render('text')
+        self.assertTrue(
+            min(task.date for task in plan.schedule) >= date(2012, 5, 1))
+
+
+    def test_daylight(self):
+        """
+        The seed varieties of a L{LivePlan} use the L{Daylight} of the plan.
+        """
+        daylight = Daylight(10)
+        plan = LivePlan(self.cropPath, self.seedPath, daylight=daylight)
+        self.assertEqual(
+            [daylight, daylight], [seed.daylight for seed in plan.seeds])
+
+
+    def test_unchanged(self):
+        """
+        L{LivePlan.poll} returns C{False} and leaves the existing rendering of
+        the schedule in place if the input files have not changed.
+        """
+        plan = LivePlan(self.cropPath, self.seedPath)
+        rendered = plan.render('ical')
+        self.assertFalse(plan.poll())
+        self.assertIdentical(rendered, plan.render('ical'))
+
+
+    def test_changedSeed(self):
+        """
+        When one seed variety changes, L{LivePlan.poll} returns C{True} and
+        only the tasks for the changed variety are created again.
+        """
+        plan = LivePlan(self.cropPath, self.seedPath)
+        self.assertEqual(['Bolero', 'Red Ace'], self.created)
+        del self.created[:]
+
+        self.seedPath.setContent(self._seeds(28))
+        self._touch(self.seedPath)
+        self.assertTrue(plan.poll())
+        self.assertEqual(['Red Ace'], self.created)
+
+        flats = [task for task in plan.schedule
+                 if isinstance(task, SeedFlats)]
+        self.assertEqual(datetime(2012, 4, 3, 8, 0, 0), flats[0].when)
+
+
+    def test_loadError(self):
+        """
+        If a changed input file cannot be loaded, L{LivePlan.poll} logs the
+        error, returns C{False}, and keeps the previous plan.  Loading is tried
+        again on the next poll, so fixing the file is noticed.
+        """
+        plan = LivePlan(self.cropPath, self.seedPath)
+        schedule = plan.schedule
+        rendered = plan.render('ical')
+
+        self.seedPath.setContent(self._seeds('2x'))
+        self._touch(self.seedPath)
+        self.assertFalse(plan.poll())
+        self.assertEqual(1, len(self.flushLoggedErrors(ValueError)))
+        self.assertIdentical(schedule, plan.schedule)
+        self.assertIdentical(rendered, plan.render('ical'))
+
+        self.assertFalse(plan.poll())
+        self.assertEqual(1, len(self.flushLoggedErrors(ValueError)))
+
+        # Keep the modification time of the broken file, so only the retry
+        # can notice the fix.
+        when = self.seedPath.getModificationTime()
+        self.seedPath.setContent(self._seeds(28))
+        os.utime(self.seedPath.path, (when, when))
+        self.assertTrue(plan.poll())
+        flats = [task for task in plan.schedule
+                 if isinstance(task, SeedFlats)]
+        self.assertEqual(datetime(2012, 4, 3, 8, 0, 0), flats[0].when)
+        self.assertFalse(plan.poll())
@@ -0,0 +1,152 @@
+# Copyright Jean-Paul Calderone.  See LICENSE file for details.
+
+"""
+Tests for L{forecast}.
+"""
+
+import sys
+
+from json import loads
+from StringIO import StringIO
+from datetime import date, datetime
+
+from twisted.trial.unittest import TestCase
+
+from cropplan import Harvest, Recurrence, create_tasks, schedule_tasks
+from forecast import (
+    harvest_days, forecast_yields, forecast_text, forecast_csv,
+    forecast_json)
+from test_cropplan import dummyCrop, dummySeed
+
+
+class ForecastYieldsTests(TestCase):
+    """
+    Tests for L{forecast_yields} and L{harvest_days}.
+    """
+    def setUp(self):
+        self.carrots = dummyCrop(name='carrots', yield_lbs_per_bed_foot=2)
+        self.beets = dummyCrop(name='beets', yield_lbs_per_bed_foot=1)
+
+
+    def test_harvestDays(self):
+        """
+        A planting is harvested over the C{harvest_duration} of its seed
+        variety, or the C{harvest_weeks} of its crop if that is not known.
+        """
+        self.assertEqual(14, harvest_days(dummySeed(self.carrots)))
+        self.assertEqual(
+            28, harvest_days(dummySeed(self.carrots, harvest_duration=None)))
+        self.assertEqual(1, harvest_days(dummySeed(
+                    dummyCrop(harvest_weeks=0), harvest_duration=None)))
+
+
+    def test_spread(self):
+        """
+        The pounds of each harvest are spread evenly over its harvest window,
+        and added up for each week starting on a Monday.
+        """
+        seed = dummySeed(self.carrots, harvest_duration=7)
+        # A Thursday, so the harvest falls in two weeks.
+        forecast = forecast_yields([Harvest(datetime(2012, 6, 7), seed, 7)])
+        self.assertEqual(
+            [date(2012, 6, 4), date(2012, 6, 11)], forecast.weeks)
+        self.assertEqual(['carrots'], forecast.crops)
+        self.assertEqual([[8.0, 6.0]], forecast.pounds.tolist())
+
+
+    def test_crops(self):
+        """
+        Each crop has its own row, with the harvests of all of its varieties
+        added up.
+        """
+        harvests = [
+            Harvest(datetime(2012, 6, 4), dummySeed(
+                    self.carrots, harvest_duration=14), 7),
+            Harvest(datetime(2012, 6, 11), dummySeed(
+                    self.carrots, harvest_duration=7), 7),
+            Harvest(datetime(2012, 6, 25), dummySeed(
+                    self.beets, harvest_duration=1), 3)]
+        forecast = forecast_yields(harvests)
+        self.assertEqual(['beets', 'carrots'], forecast.crops)
+        self.assertEqual(
+            [[0, 0, 0, 3], [7, 21, 0, 0]], forecast.pounds.tolist())
+
+
+    def test_picking(self):
+        """
+        When a planting is picked several times, each picking is spread over
+        only the days until the next one, so the planting's yield stays within
+        its harvest window.
+        """
+        seed = dummySeed(self.carrots, greenhouse_days=0)
+        tasks = create_tasks(
+            {}, [seed],
+            recurrence=Recurrence(picking='FREQ=WEEKLY;BYDAY=MO,TH'))
+        forecast = forecast_yields([
+                event for event in schedule_tasks(tasks)
+                if isinstance(event, Harvest)])
+        # Picked on 4/23, 4/26, 4/30 and 5/3, with the harvest window ending
+        # on 5/4.
+        self.assertEqual(
+            [date(2012, 4, 23), date(2012, 4, 30)], forecast.weeks)
+        self.assertEqual(
+            [[seed.bed_feet, seed.bed_feet]], forecast.pounds.tolist())
+
+
+    def test_empty(self):
+        """
+        Without any harvests, the forecast is empty.
+        """
+        forecast = forecast_yields([])
+        self.assertEqual([], forecast.weeks)
+        self.assertEqual([], forecast.crops)
+
+
+
+class ForecastFormatTests(TestCase):
+    """
+    Tests for L{forecast_text}, L{forecast_csv} and L{forecast_json}.
+    """
+    def setUp(self):
+        seed = dummySeed(dummyCrop(name='carrots'), harvest_duration=7)
+        self.forecast = forecast_yields(
+            [Harvest(datetime(2012, 6, 7), seed, 7)])
+        self.output = StringIO()
+        self.patch(sys, 'stdout', self.output)
+
+
+    def test_text(self):
+        """
+        L{forecast_text} writes the pounds harvested each week, and of each
+        crop that week.
+        """
+        forecast_text(self.forecast)
+        self.assertEqual(
+            "Week of 06/04: 8.0 lbs\n"
+            "    carrots                   8.0\n"
+            "Week of 06/11: 6.0 lbs\n"
+            "    carrots                   6.0\n",
+            self.output.getvalue())
+
+
+    def test_csv(self):
+        """
+        L{forecast_csv} writes a row for each crop and a column for each week.
+        """
+        forecast_csv(self.forecast)
+        self.assertEqual(
+            "crop,06/04,06/11\r\n"
+            "carrots,8.00,6.00\r\n",
+            self.output.getvalue())
+
+
+    def test_json(self):
+        """
+        L{forecast_json} writes the weeks and the pounds of each crop
+        harvested in them.
+        """
+        forecast_json(self.forecast)
+        self.assertEqual(
+            {'weeks': ['2012-06-04', '2012-06-11'],
+             'crops': {'carrots': [8.0, 6.0]}},
+            loads(self.output.getvalue()))
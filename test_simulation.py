@@ -0,0 +1,117 @@
+# Copyright Jean-Paul Calderone.  See LICENSE file for details.
+
+"""
+Tests for L{simulation}.
+"""
+
+from datetime import date, timedelta
+
+from twisted.trial.unittest import TestCase
+
+from simulation import Uncertainty, simulate
+from test_cropplan import dummyCrop, dummySeed
+
+
+class SimulateTests(TestCase):
+    """
+    Tests for L{simulate}.
+    """
+    def setUp(self):
+        crop = dummyCrop(_bed_feet=100)
+        self.seeds = [
+            dummySeed(crop, variety='early'),
+            dummySeed(crop, variety='late', greenhouse_days=0,
+                      beginning_of_season=120, fresh_generations=3,
+                      intergenerational_weeks=2)]
+        self.expected = sum(
+            seed.bed_feet * crop.yield_lbs_per_bed_foot for seed in self.seeds)
+
+
+    def test_certain(self):
+        """
+        Without any uncertainty, every simulated season harvests what the
+        plan expects, in the same weeks.
+        """
+        certain = Uncertainty(0, 0, 0)
+        result = simulate(self.seeds, 3, certain, processes=1)
+        self.assertEqual(
+            [self.expected] * 3, result.harvest.sum(axis=1).tolist())
+        self.assertEqual(result.harvest[0].tolist(),
+                         result.harvest[2].tolist())
+        self.assertEqual(result.labor[0].tolist(), result.labor[2].tolist())
+
+
+    def test_weeks(self):
+        """
+        The weeks of the result start on Mondays and follow each other.
+        """
+        result = simulate(self.seeds, 2, processes=1)
+        self.assertEqual(result.harvest.shape[1], len(result.weeks))
+        self.assertEqual(result.labor.shape, result.harvest.shape)
+        self.assertEqual(0, result.weeks[0].weekday())
+        for (week, following) in zip(result.weeks, result.weeks[1:]):
+            self.assertEqual(week + timedelta(weeks=1), following)
+        self.assertTrue(result.weeks[0] <= date(2012, 3, 19))
+
+
+    def test_failures(self):
+        """
+        When every planting fails nothing is harvested, and less time is
+        spent working.
+        """
+        failing = Uncertainty(failure_rate=1.0)
+        result = simulate(self.seeds, 5, failing, processes=1)
+        self.assertEqual(0, result.harvest.sum())
+        certain = simulate(
+            self.seeds, 5, Uncertainty(0, 0, 0), processes=1)
+        self.assertTrue(result.labor.sum() < certain.labor.sum())
+
+
+    def test_reproducible(self):
+        """
+        Simulations with the same seed have the same outcome, and ones with
+        different seeds do not.
+        """
+        first = simulate(self.seeds, 250, seed=3, processes=1)
+        second = simulate(self.seeds, 250, seed=3, processes=1)
+        third = simulate(self.seeds, 250, seed=4, processes=1)
+        self.assertEqual(first.harvest.tolist(), second.harvest.tolist())
+        self.assertNotEqual(first.harvest.tolist(), third.harvest.tolist())
+
+
+    def test_processes(self):
+        """
+        The outcome is the same however many processes simulate it.
+        """
+        alone = simulate(self.seeds, 250, seed=7, processes=1)
+        shared = simulate(self.seeds, 250, seed=7, processes=2)
+        self.assertEqual(alone.weeks, shared.weeks)
+        self.assertEqual(alone.harvest.tolist(), shared.harvest.tolist())
+        self.assertEqual(alone.labor.tolist(), shared.labor.tolist())
+
+
+    def test_scheduled(self):
+        """
+        Given the hours available each day, L{simulate} schedules the tasks
+        of each season, which harvests as much as moving the harvests does.
+        """
+        certain = Uncertainty(0, 0, 0)
+        quick = simulate(self.seeds, 2, certain, processes=1)
+        exact = simulate(
+            self.seeds, 2, certain, maxManHours=timedelta(hours=5),
+            processes=1)
+        self.assertEqual(
+            quick.harvest.sum(axis=1).tolist(),
+            exact.harvest.sum(axis=1).tolist())
+        self.assertAlmostEqual(quick.labor.sum(), exact.labor.sum())
+
+
+    def test_percentiles(self):
+        """
+        L{SimulationResult.percentiles} gives a row for each percentile, with
+        a column for each week.
+        """
+        result = simulate(self.seeds, 20, processes=1)
+        low, high = result.percentiles(result.harvest, [10, 90])
+        self.assertEqual(len(result.weeks), len(low))
+        self.assertTrue((low <= high).all())
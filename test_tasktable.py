@@ -0,0 +1,138 @@
+# Copyright Jean-Paul Calderone.  See LICENSE file for details.
+
+"""
+Tests for L{tasktable}.
+"""
+
+from twisted.trial.unittest import TestCase
+
+from cropplan import (
+    FinishPlanning, SeedFlats, DegreeDays, Recurrence, create_tasks)
+from tasktable import (
+    SEED_FLATS, TRANSPLANT, HARVEST, WEED, create_task_table, task_table)
+from test_cropplan import dummyCrop, dummySeed
+
+
+def describe(tasks):
+    """
+    Reduce tasks to something which can be compared, including their
+    dependencies.
+    """
+    return [
+        (task.__class__, task.seed.variety, task.when,
+         getattr(task, 'quantity', None),
+         [(dependent.__class__, dependent.when)
+          for dependent in task.dependents])
+        for task in tasks]
+
+
+
+class CreateTaskTableTests(TestCase):
+    """
+    Tests for L{create_task_table}.
+    """
+    def setUp(self):
+        crop = dummyCrop()
+        self.seeds = [
+            dummySeed(crop, variety='flats'),
+            dummySeed(crop, variety='direct', greenhouse_days=0,
+                      beginning_of_season=100),
+            dummySeed(crop, variety='succession', fresh_generations=2,
+                      storage_generations=3, intergenerational_weeks=2),
+            dummySeed(crop, variety='unknown', beginning_of_season=None),
+            dummySeed(dummyCrop(_bed_feet=0), variety='unplanted')]
+
+
+    def test_sameAsCreateTasks(self):
+        """
+        L{create_task_table} makes the same tasks as L{create_tasks}, in the
+        same order.
+        """
+        table = create_task_table(self.seeds)
+        self.assertEqual(
+            describe(create_tasks({}, self.seeds)), describe(table.tasks()))
+
+
+    def test_degreeDays(self):
+        """
+        L{create_task_table} harvests seed varieties which mature by growing
+        degree days when L{create_tasks} does.
+        """
+        degreeDays = DegreeDays({(1, 1): (40, 60), (6, 1): (60, 80)})
+        crop = dummyCrop(base_temperature=50)
+        seeds = [
+            dummySeed(crop, variety='warm', fresh_generations=3,
+                      intergenerational_weeks=3, beginning_of_season=130),
+            dummySeed(crop, variety='cool')]
+        seeds[0].degree_days = degreeDays
+        table = create_task_table(seeds)
+        self.assertEqual(
+            describe(create_tasks({}, seeds)), describe(table.tasks()))
+
+
+    def test_columns(self):
+        """
+        Each task is described by its kind, the index of its seed variety, its
+        day of the year, and its quantity.
+        """
+        seed = self.seeds[0]
+        table = create_task_table([seed])
+        self.assertEqual(4, len(table))
+        flats = list(table.kind).index(SEED_FLATS)
+        self.assertEqual(0, table.seed[flats])
+        self.assertEqual(
+            seed.beginning_of_season - seed.greenhouse_days,
+            table.day[flats])
+        self.assertEqual(seed.bed_feet, table.quantity[flats])
+        self.assertEqual(
+            [TRANSPLANT, HARVEST], list(table.kind[-2:]))
+        self.assertEqual(1, len(set(table.planting)))
+
+
+    def test_missingInterval(self):
+        """
+        L{create_task_table} raises L{ValueError} for a seed variety with
+        several generations but no time between them.
+        """
+        seed = dummySeed(dummyCrop(), fresh_generations=2)
+        self.assertRaises(ValueError, create_task_table, [seed])
+
+
+
+class TaskTableTests(TestCase):
+    """
+    Tests for L{task_table} and L{TaskTable.tasks}.
+    """
+    def test_roundTrip(self):
+        """
+        Tasks converted to a L{TaskTable} and back are the same as the
+        original ones, including their dependencies.
+        """
+        crop = dummyCrop()
+        seeds = [
+            dummySeed(crop),
+            dummySeed(crop, variety='baz', beginning_of_season=None)]
+        tasks = create_tasks({}, seeds)
+        self.assertEqual(FinishPlanning, tasks[0].__class__)
+        self.assertIn(SeedFlats, [task.__class__ for task in tasks])
+        self.assertEqual(
+            describe(tasks), describe(task_table(tasks, seeds).tasks()))
+
+
+    def test_recurring(self):
+        """
+        Recurring weedings and pickings are converted to a L{TaskTable} and
+        back with their dependencies and C{pick_days}.
+        """
+        seed = dummySeed(dummyCrop(), harvest_duration=10)
+        tasks = create_tasks(
+            {}, [seed], recurrence=Recurrence(
+                weeding='FREQ=WEEKLY', picking='FREQ=DAILY;INTERVAL=3'))
+        table = task_table(tasks, [seed])
+        self.assertIn(WEED, list(table.kind))
+        self.assertEqual(4, list(table.kind).count(HARVEST))
+        converted = table.tasks()
+        self.assertEqual(describe(tasks), describe(converted))
+        self.assertEqual(
+            [getattr(task, 'pick_days', None) for task in tasks],
+            [getattr(task, 'pick_days', None) for task in converted])